@@ -1,23 +1,73 @@
 """The Polen Madrid integration."""
+import asyncio
 import logging
+from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
-from homeassistant.helpers.update_coordinator import ConfigEntryNotReady
-
-from .const import DOMAIN, CONF_STATIONS
-from .sensor import PolenMadridDataUpdateCoordinator  # Import the coordinator
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
+
+from .const import (
+    DOMAIN,
+    CONF_AIR_QUALITY,
+    CONF_CAPTURE,
+    CONF_HEAT_MAPS,
+    CONF_PROVIDERS,
+    CONF_REFRESH_MIN_AGE,
+    CONF_STALE_AFTER,
+    CONF_STALE_POLICY,
+    CONF_STATIONS,
+    DEFAULT_REFRESH_MIN_AGE,
+    DEFAULT_STALE_AFTER,
+    STALE_POLICY_FLAG,
+)
+
+# The modules below are imported when first needed rather than here, as
+# Home Assistant imports every configured integration during startup.
 
 _LOGGER = logging.getLogger(__name__)
 
-# List of platforms to support. There is only one platform (sensor) in
-# this case.
-PLATFORMS: list[Platform] = [Platform.SENSOR]
+# List of platforms to support.
+PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.CALENDAR]
+
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+def _platforms(entry: ConfigEntry) -> list[Platform]:
+    """Return the platforms of an entry; heat maps are opt-in."""
+    if entry.options.get(CONF_HEAT_MAPS):
+        return [*PLATFORMS, Platform.IMAGE]
+    return PLATFORMS
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the Polen Madrid services, websocket commands and views."""
+    from .http_api import async_setup_http_api  # pylint: disable=import-outside-toplevel
+    from .services import async_setup_services  # pylint: disable=import-outside-toplevel
+    from .websocket_api import async_setup_websocket_api  # pylint: disable=import-outside-toplevel
+
+    # Services are registered once for the domain so they remain available
+    # (and give a clear error) while no config entry is loaded.
+    async_setup_services(hass)
+    async_setup_websocket_api(hass)
+    async_setup_http_api(hass)
+    return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Polen Madrid from a config entry."""
+    from .capture import CAPTURE_DIRECTORY, PayloadRecorder  # pylint: disable=import-outside-toplevel
+    from .coordinator import (  # pylint: disable=import-outside-toplevel
+        PolenMadridAirQualityCoordinator,
+        PolenMadridDataUpdateCoordinator,
+        stations_store,
+    )
+    from .long_term_statistics import PolenMadridStatisticsImporter  # pylint: disable=import-outside-toplevel
+    from .providers import providers_from_options  # pylint: disable=import-outside-toplevel
+    from .websocket_api import async_close_subscriptions  # pylint: disable=import-outside-toplevel
+
     # Initial data is stored in entry.data (from async_step_user)
     # Options are stored in entry.options (from options flow)
     # The sensor platform will read from entry.options or entry.data for
@@ -25,17 +75,58 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     # Create and refresh the coordinator
     coordinator = PolenMadridDataUpdateCoordinator(hass)
-
-    # Perform the first refresh. If this fails, ConfigEntryNotReady will be raised
-    # and setup will be retried later. This prevents forwarding to platforms
-    # on failure.
-    await coordinator.async_config_entry_first_refresh()
+    coordinator.providers = providers_from_options(
+        entry.options.get(CONF_PROVIDERS))
+    # Zero days disables the staleness policy
+    stale_after = entry.options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER)
+    coordinator.stale_after = timedelta(days=stale_after) if stale_after else None
+    coordinator.stale_policy = entry.options.get(
+        CONF_STALE_POLICY, STALE_POLICY_FLAG)
+    stations = entry.options.get(CONF_STATIONS, entry.data.get(CONF_STATIONS)) or []
+    coordinator.selected_stations = {str(station_id) for station_id in stations}
+    await coordinator.async_load_stations(stations_store(hass, entry.entry_id))
+    # Zero minutes fetches on every requested refresh
+    coordinator.refresh_min_age = timedelta(minutes=entry.options.get(
+        CONF_REFRESH_MIN_AGE, DEFAULT_REFRESH_MIN_AGE))
+
+    if entry.options.get(CONF_CAPTURE):
+        # Store raw responses for offline replay
+        coordinator.client.recorder = PayloadRecorder(
+            hass.config.path(CAPTURE_DIRECTORY))
+
+    refreshes = [coordinator.async_config_entry_first_refresh()]
+    if entry.options.get(CONF_AIR_QUALITY):
+        # The air quality layers share the pollen client's connection pool
+        coordinator.air_quality_coordinator = PolenMadridAirQualityCoordinator(
+            hass, coordinator.client)
+        coordinator.air_quality_coordinator.refresh_min_age = (
+            coordinator.refresh_min_age)
+        # Air quality is optional: a failure here does not block setup
+        refreshes.append(coordinator.air_quality_coordinator.async_refresh())
+
+    # Perform the first refresh of all layers concurrently. If the pollen
+    # layer fails, ConfigEntryNotReady will be raised and setup will be
+    # retried later. This prevents forwarding to platforms on failure.
+    results = await asyncio.gather(*refreshes, return_exceptions=True)
+    if isinstance(results[0], BaseException):
+        await coordinator.client.async_close()
+        raise results[0]
 
     # Store the coordinator instance in hass.data for platforms to use
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
 
+    # Import each day's readings into long-term statistics
+    importer = PolenMadridStatisticsImporter(hass, coordinator, stations)
+    importer.async_import()
+    entry.async_on_unload(coordinator.async_add_listener(importer.async_import))
+    # Subscribers resubscribe to the coordinator replacing this one
+    entry.async_on_unload(lambda: async_close_subscriptions(coordinator))
+
     # Now forward the setup to the sensor platform
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # Remember the platforms set up, as the options may change before unload
+    coordinator.platforms = _platforms(entry)
+    await hass.config_entries.async_forward_entry_setups(
+        entry, coordinator.platforms)
 
     # Add an options listener to reload the entry when options change.
     entry.add_update_listener(async_options_update_listener)
@@ -47,15 +138,28 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     # Home Assistant automatically removes listeners associated with the entry
     # upon unload.
-    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    unload_ok = await hass.config_entries.async_unload_platforms(
+        entry, hass.data[DOMAIN][entry.entry_id].platforms)
 
     # Remove the coordinator from hass.data if unload was successful
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.client.async_close()
+        # A reload reads the catalog back before a delayed save would run
+        await coordinator.async_save_stations()
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the data stored for a config entry."""
+    from .coordinator import stations_store  # pylint: disable=import-outside-toplevel
+    from .seasons import seasons_store  # pylint: disable=import-outside-toplevel
+
+    await stations_store(hass, entry.entry_id).async_remove()
+    await seasons_store(hass, entry.entry_id).async_remove()
+
+
 async def async_options_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Handle options update."""
     _LOGGER.debug(
@@ -0,0 +1,423 @@
+"""API client for the Comunidad de Madrid pollen WFS service."""
+from __future__ import annotations
+
+import logging
+import re
+import zlib
+from dataclasses import dataclass
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+import orjson
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    AIR_QUALITY_DATA_PAYLOAD,
+    AIR_QUALITY_TYPE_NAMES,
+    API_BASE_URL,
+    API_DATA_PAYLOAD,
+    API_HEADERS,
+    API_PAGE_SIZE,
+    API_POOL_HOSTS,
+    API_POOL_SIZE,
+    API_QUEUE_TIMEOUT,
+    API_URL,
+    FIELD_MAPPING,
+)
+from .helpers import fix_encoding_issue
+from .profiler import async_add_profiled_job
+from .ratelimit import async_get_request_limiter
+
+_LOGGER = logging.getLogger(__name__)
+
+API_TIMEOUT = 10
+# Size of the chunks read from the socket while decompressing
+CHUNK_SIZE = 64 * 1024
+# Bytes searched for numberMatched at each end of a response body
+NUMBER_MATCHED_SCAN = 1024
+# Separates a layer name from the start index of one of its pages
+PAGE_SEPARATOR = "."
+_NUMBER_MATCHED = re.compile(rb'numberMatched"?\s*[:=]\s*"?(\d+)')
+
+
+class PolenMadridApiError(Exception):
+    """Error raised when the pollen API cannot be queried."""
+
+
+class WfsLayer(NamedTuple):
+    """A GetFeature query against one layer of the geoserver.
+
+    Layers with a `page_size` are fetched in pages of that many features,
+    ordered by the `sort_by` properties so pages neither overlap nor skip
+    features between requests.
+    """
+
+    name: str
+    url: str
+    data: str
+    page_size: int | None = None
+    sort_by: str | None = None
+
+
+def key_sort_by(field_mapping: dict[str, str]) -> str:
+    """Return the WFS sortBy ordering features by station and pollen type."""
+    properties = {target: source for source, target in field_mapping.items()}
+    return ",".join(
+        properties[target] for target in ("station_id", "pollen_code")
+        if target in properties)
+
+
+POLLEN_LAYER = WfsLayer(
+    "pollen", API_URL, API_DATA_PAYLOAD, API_PAGE_SIZE,
+    key_sort_by(FIELD_MAPPING))
+AIR_QUALITY_LAYERS = {
+    code: WfsLayer(
+        code, f"{API_BASE_URL}&typeName={type_name}", AIR_QUALITY_DATA_PAYLOAD)
+    for code, type_name in AIR_QUALITY_TYPE_NAMES.items()
+}
+
+
+def page_layer(layer: WfsLayer, start: int, count: int | None = None) -> WfsLayer:
+    """Return the query of the page of a layer starting at `start`.
+
+    The first page keeps the layer's name, so its cached response and
+    captures are shared with unpaged requests.
+    """
+    name = layer.name if start == 0 else f"{layer.name}{PAGE_SEPARATOR}{start}"
+    data = f"{layer.data}&count={count or layer.page_size}&startIndex={start}"
+    if layer.sort_by:
+        data = f"{data}&{urlencode({'sortBy': layer.sort_by})}"
+    return WfsLayer(name, layer.url, data)
+
+
+def number_matched(payload: bytes) -> int | None:
+    """Return the numberMatched of a WFS response, if it reports one.
+
+    GeoJSON responses report it next to the features array, before or
+    after it, and resultType=hits responses as an XML attribute; only both
+    ends of the body are searched.
+    """
+    for part in (payload[:NUMBER_MATCHED_SCAN], payload[-NUMBER_MATCHED_SCAN:]):
+        if match := _NUMBER_MATCHED.search(part):
+            return int(match.group(1))
+    return None
+
+
+@dataclass
+class TransferStats:
+    """Transfer metrics of the API client."""
+
+    requests: int = 0
+    not_modified: int = 0
+    content_encoding: str | None = None
+    # Last response
+    bytes_on_wire: int = 0
+    decompressed_bytes: int = 0
+    # Since the client was created
+    total_bytes_on_wire: int = 0
+    total_decompressed_bytes: int = 0
+
+
+def decode_payload(payload: bytes) -> dict:
+    """Decode a raw API response body.
+
+    orjson decodes straight from bytes, avoiding the intermediate str that
+    response.json() builds for multi-megabyte FeatureCollections.
+    """
+    try:
+        return orjson.loads(payload)
+    except orjson.JSONDecodeError as j_err:
+        _LOGGER.error("Failed to decode JSON response: %s", j_err)
+        _LOGGER.debug(
+            "Response text that failed to parse: %s",
+            bytes(payload[:1000]).decode('utf-8', 'replace'))
+        raise PolenMadridApiError(
+            f"Invalid JSON response from API: {j_err}") from j_err
+
+
+def _get_raw_key_for_value(value_to_find: str) -> str | None:
+    for raw_key, mapped_value in FIELD_MAPPING.items():
+        if mapped_value == value_to_find:
+            return raw_key
+    return None
+
+
+RAW_STATION_ID_KEY = _get_raw_key_for_value("station_id")
+RAW_STATION_NAME_KEY = _get_raw_key_for_value("location_name")
+
+
+def parse_stations(json_data: dict) -> dict[str, str]:
+    """Return the station names found in the raw API data, keyed by id."""
+    stations: dict[str, str] = {}
+    for feature in json_data.get('features', []):
+        properties = feature.get('properties', {})
+        station_id = properties.get(RAW_STATION_ID_KEY)
+        station_name = properties.get(RAW_STATION_NAME_KEY)
+        if station_id and station_name:
+            # Ensure station_id is string for dict keys/HA select options
+            stations[str(station_id)] = fix_encoding_issue(station_name)
+    return stations
+
+
+def _brotli():
+    """Return the brotli module if it is installed."""
+    try:
+        import brotli  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return brotli
+
+
+def accept_encoding() -> str:
+    """Return the encodings the client can decompress."""
+    return "gzip, deflate, br" if _brotli() else "gzip, deflate"
+
+
+def _decompressor(content_encoding: str):
+    """Return a streaming decompress function for a Content-Encoding."""
+    if content_encoding in ("gzip", "x-gzip", "deflate"):
+        # 32 + MAX_WBITS auto-detects the gzip and zlib headers
+        decompress = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        return decompress.decompress, decompress.flush
+    if content_encoding == "br" and (brotli := _brotli()):
+        decompress = brotli.Decompressor()
+        return decompress.process, lambda: b""
+    return None
+
+
+def read_body(chunks, content_encoding: str) -> tuple[bytearray, int]:
+    """Decompress a response body chunk by chunk.
+
+    Returns the decompressed body and the number of bytes received. The
+    body is accumulated in a single buffer that is handed to the decoder
+    as is, so the compressed and decompressed payloads are never both
+    held in full.
+    """
+    functions = _decompressor(content_encoding)
+    body = bytearray()
+    bytes_on_wire = 0
+    try:
+        for chunk in chunks:
+            bytes_on_wire += len(chunk)
+            body += functions[0](chunk) if functions else chunk
+        if functions:
+            body += functions[1]()
+    except zlib.error as err:
+        raise PolenMadridApiError(
+            f"Invalid {content_encoding} response from API: {err}") from err
+    return body, bytes_on_wire
+
+
+class PolenMadridApiClient:
+    """Fetch the pollen FeatureCollection from the geoserver."""
+
+    def __init__(self, hass: HomeAssistant, transport=None) -> None:
+        """Initialize the client.
+
+        `transport` replaces the pooled requests.Session, e.g. with a
+        capture ReplayTransport; such requests do not reach the geoserver
+        and are not rate limited.
+        """
+        self._hass = hass
+        self.stats = TransferStats()
+        self.transport = transport
+        # Set to a capture PayloadRecorder to store every fresh response
+        self.recorder = None
+        # Set by the coordinator while an update is profiled
+        self.profiler = None
+        self._limiter = async_get_request_limiter(hass)
+        # Validators and body of the last response per layer, for
+        # conditional requests and for callers over the request budget
+        self._validators: dict[str, dict[str, str]] = {}
+        self._last_payload: dict[str, bytearray] = {}
+        self._session = None
+
+    async def async_close(self) -> None:
+        """Close the pooled connections."""
+        if self._session is not None:
+            session, self._session = self._session, None
+            await self._hass.async_add_executor_job(session.close)
+
+    async def async_get_payload(
+            self,
+            cache_control: str | None = None,
+            conditional: bool = False,
+            layer: WfsLayer = POLLEN_LAYER) -> bytearray:
+        """Return the raw FeatureCollection response body.
+
+        `cache_control` is sent as the Cache-Control request header, letting
+        each call site state how stale a cached response it accepts. With
+        `conditional`, the validators of the previous response are sent and
+        an unchanged dataset is answered from memory on 304 Not Modified.
+        On such a response the very same buffer object is returned, so
+        callers can detect an unchanged layer by identity.
+
+        Requests draw from the integration's shared request budget. Over
+        budget, the last payload of the layer is returned as is; without
+        one, the call queues for its token, up to API_QUEUE_TIMEOUT.
+        """
+        if self.transport is not None:
+            return await async_add_profiled_job(
+                self._hass, self.profiler,
+                self._get_payload, cache_control, conditional, layer)
+        limiter = self._limiter
+        if not limiter.try_acquire():
+            if (cached := self._last_payload.get(layer.name)) is not None:
+                _LOGGER.debug(
+                    "Request budget exhausted, reusing last %s payload.",
+                    layer.name)
+                limiter.stats.served_from_cache += 1
+                return cached
+            if not await limiter.async_acquire(
+                    API_QUEUE_TIMEOUT.total_seconds()):
+                _LOGGER.warning(
+                    "Request budget exhausted, not fetching %s data.",
+                    layer.name)
+                raise PolenMadridApiError(
+                    "Too many requests to the API, try again later")
+        async with limiter.concurrency:
+            return await async_add_profiled_job(
+                self._hass, self.profiler,
+                self._get_payload, cache_control, conditional, layer)
+
+    async def async_get_hits(self, layer: WfsLayer) -> int | None:
+        """Return the number of features of a layer (resultType=hits).
+
+        Returns None if the server does not report it.
+        """
+        hits_layer = WfsLayer(
+            f"{layer.name}{PAGE_SEPARATOR}hits",
+            layer.url,
+            f"{layer.data}&resultType=hits")
+        try:
+            payload = await self.async_get_payload(layer=hits_layer)
+        except PolenMadridApiError as err:
+            _LOGGER.warning("Could not size %s data: %s", layer.name, err)
+            return None
+        return number_matched(payload)
+
+    async def async_get_features(
+            self, cache_control: str | None = None) -> dict:
+        """Return the decoded FeatureCollection."""
+        payload = await self.async_get_payload(cache_control)
+        return await self._hass.async_add_executor_job(decode_payload, payload)
+
+    async def async_get_stations(
+            self, cache_control: str | None = None) -> dict[str, str]:
+        """Return the available stations, keyed by station id."""
+        return parse_stations(await self.async_get_features(cache_control))
+
+    def _get_session(self):
+        """Return the pooled session, creating it on first use."""
+        if self.transport is not None:
+            return self.transport
+        if self._session is None:
+            import requests  # pylint: disable=import-outside-toplevel
+            from requests.adapters import HTTPAdapter  # pylint: disable=import-outside-toplevel
+
+            session = requests.Session()
+            # Keep a pool of connections per provider host, each large
+            # enough for the layers of that host fetched concurrently.
+            adapter = HTTPAdapter(
+                pool_connections=API_POOL_HOSTS, pool_maxsize=API_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def _get_payload(
+            self,
+            cache_control: str | None,
+            conditional: bool,
+            layer: WfsLayer) -> bytearray:
+        """Download a layer's FeatureCollection. Runs in the executor."""
+        # requests is only needed once data is actually fetched; importing it
+        # here keeps it out of the integration's import time.
+        import requests  # pylint: disable=import-outside-toplevel
+        from urllib3.exceptions import HTTPError as TransportError  # pylint: disable=import-outside-toplevel
+
+        headers = {**API_HEADERS, "accept-encoding": accept_encoding()}
+        if cache_control:
+            headers["cache-control"] = cache_control
+        last_payload = self._last_payload.get(layer.name)
+        if conditional and last_payload is not None:
+            headers.update(self._validators[layer.name])
+
+        _LOGGER.debug("Attempting to fetch %s data from API.", layer.name)
+        try:
+            response = self._get_session().post(
+                layer.url,
+                headers=headers,
+                data=layer.data,
+                timeout=API_TIMEOUT,
+                stream=True)
+            try:
+                self.stats.requests += 1
+                if response.status_code == 304 and last_payload is not None:
+                    _LOGGER.debug(
+                        "API %s data not modified, reusing last payload.",
+                        layer.name)
+                    self.stats.not_modified += 1
+                    self.stats.bytes_on_wire = 0
+                    return last_payload
+                response.raise_for_status()
+
+                content_encoding = response.headers.get(
+                    "content-encoding", "identity").lower()
+                # Read undecoded bytes to measure the transfer size
+                payload, bytes_on_wire = read_body(
+                    response.raw.stream(CHUNK_SIZE, decode_content=False),
+                    content_encoding)
+                self._remember(layer, response.headers, payload)
+            finally:
+                response.close()
+        except requests.exceptions.HTTPError as errh:
+            _LOGGER.error("Http Error: %s", errh)
+            raise PolenMadridApiError(
+                f"Error communicating with API: {errh}") from errh
+        except requests.exceptions.ConnectionError as errc:
+            _LOGGER.error("Error Connecting: %s", errc)
+            raise PolenMadridApiError(
+                f"Error connecting to API: {errc}") from errc
+        except requests.exceptions.Timeout as errt:
+            _LOGGER.error("Timeout Error: %s", errt)
+            raise PolenMadridApiError(
+                f"Timeout connecting to API: {errt}") from errt
+        except requests.exceptions.RequestException as err:
+            _LOGGER.error("Request Error: %s", err)
+            raise PolenMadridApiError(
+                f"An unexpected error occurred with the request: {err}") from err
+        except TransportError as err:
+            _LOGGER.error("Error reading response: %s", err)
+            raise PolenMadridApiError(
+                f"Error reading response from API: {err}") from err
+
+        self.stats.content_encoding = content_encoding
+        self.stats.bytes_on_wire = bytes_on_wire
+        self.stats.decompressed_bytes = len(payload)
+        self.stats.total_bytes_on_wire += bytes_on_wire
+        self.stats.total_decompressed_bytes += len(payload)
+        _LOGGER.debug(
+            "Received %s bytes of %s data (%s), %s bytes decompressed.",
+            bytes_on_wire, layer.name, content_encoding, len(payload))
+        if self.recorder is not None:
+            try:
+                self.recorder.record(layer.name, payload)
+            except OSError as err:
+                _LOGGER.warning(
+                    "Could not capture %s response: %s", layer.name, err)
+        return payload
+
+    def _remember(
+            self,
+            layer: WfsLayer,
+            response_headers,
+            payload: bytearray) -> None:
+        """Store the validators of a response for conditional requests."""
+        validators = {}
+        if etag := response_headers.get("etag"):
+            validators["if-none-match"] = etag
+        if last_modified := response_headers.get("last-modified"):
+            validators["if-modified-since"] = last_modified
+        self._validators[layer.name] = validators
+        self._last_payload[layer.name] = payload
@@ -0,0 +1,127 @@
+"""Calendar platform for Polen Madrid pollen seasons."""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+
+from homeassistant.components.calendar import CalendarEntity, CalendarEvent
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.util import dt as dt_util
+
+from .const import CONF_STATIONS, DOMAIN
+from .coordinator import PolenMadridData, PolenMadridDataUpdateCoordinator
+from .entity import PolenMadridStationEntity
+from .seasons import PollenSeasonTracker, PollenSpan, seasons_store
+
+_LOGGER = logging.getLogger(__name__)
+
+# Spans only change once per measurement day; batch writes to storage
+STORAGE_SAVE_DELAY = 60
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up Polen Madrid season calendars from a config entry."""
+    coordinator: PolenMadridDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+
+    selected_stations = entry.options.get(
+        CONF_STATIONS, entry.data.get(CONF_STATIONS)) or []
+    selected_stations = [str(station_id) for station_id in selected_stations]
+
+    store = seasons_store(hass, entry.entry_id)
+    stored = await store.async_load()
+    tracker = (
+        PollenSeasonTracker.from_dict(stored) if stored
+        else PollenSeasonTracker())
+
+    @callback
+    def _async_update_seasons() -> None:
+        """Extend or close the season spans with the latest readings."""
+        data: PolenMadridData | None = coordinator.data
+        if not data:
+            return
+        changed = False
+        for station_id in selected_stations:
+            for record in data.by_station.get(station_id, []):
+                changed |= tracker.update(record, data.level_of(record))
+        if changed:
+            store.async_delay_save(tracker.as_dict, STORAGE_SAVE_DELAY)
+
+    # Registered before the entities so they render the updated spans
+    _async_update_seasons()
+    entry.async_on_unload(
+        coordinator.async_add_listener(_async_update_seasons))
+
+    calendars = []
+    for station_id in selected_stations:
+        records = coordinator.data.by_station.get(station_id) if coordinator.data else None
+        if not records:
+            continue
+        calendars.append(
+            PolenMadridSeasonCalendar(
+                coordinator,
+                tracker,
+                records[0]))
+
+    async_add_entities(calendars)
+
+
+def _span_to_event(span: PollenSpan) -> CalendarEvent:
+    """Return the all-day calendar event of a season span."""
+    return CalendarEvent(
+        start=span.start,
+        # All-day event end dates are exclusive
+        end=span.end + timedelta(days=1),
+        summary=f"{span.pollen_type}: {span.level}",
+        description=(
+            f"Polen {span.pollen_type} ({span.pollen_code}) en nivel "
+            f"{span.level} durante {span.days} día(s)."),
+        uid=f"{span.station_id}_{span.pollen_code}_{span.start.isoformat()}",
+    )
+
+
+class PolenMadridSeasonCalendar(PolenMadridStationEntity, CalendarEntity):
+    """Calendar of medium/high pollen periods at a station."""
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            tracker: PollenSeasonTracker,
+            record: dict) -> None:
+        """Initialize the calendar."""
+        super().__init__(coordinator, record)
+        self._tracker = tracker
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_seasons"
+        self._attr_name = f"Polen {self._location_name} - Temporadas"
+
+    @property
+    def event(self) -> CalendarEvent | None:
+        """Return the ongoing season event with the highest level."""
+        current = self._tracker.current(self._station_id)
+        if not current:
+            return None
+        span = max(
+            current,
+            key=lambda span: (span.level == "Alto", span.days))
+        return _span_to_event(span)
+
+    async def async_get_events(
+            self,
+            hass: HomeAssistant,
+            start_date: datetime,
+            end_date: datetime) -> list[CalendarEvent]:
+        """Return the season events within a datetime range."""
+        # The requested range is compared by its local days; its end is
+        # exclusive and the last day it covers inclusive
+        spans = self._tracker.spans(
+            self._station_id,
+            dt_util.as_local(start_date).date(),
+            (dt_util.as_local(end_date) - timedelta(microseconds=1)).date())
+        return [
+            _span_to_event(span)
+            for span in sorted(spans, key=lambda span: span.start)]
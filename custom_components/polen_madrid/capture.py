@@ -0,0 +1,176 @@
+"""Capture of raw WFS responses and their replay.
+
+With capture enabled, every fresh response body received by the API client
+is written gzip-compressed to the capture directory, named after the UTC
+time it was received and its layer. Only the newest CAPTURE_MAX_FILES
+captures are kept.
+
+`ReplayTransport` stands in for the client's `requests.Session` and serves
+those captures back in order, compressed, so a replay goes through the
+same decompression, validation, parsing and entity updates as live data.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import logging
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .api import AIR_QUALITY_LAYERS, CHUNK_SIZE, PAGE_SEPARATOR, POLLEN_LAYER
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_DIRECTORY = "polen_madrid_captures"
+CAPTURE_MAX_FILES = 96
+CAPTURE_SUFFIX = ".json.gz"
+_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+_START_INDEX = re.compile(r"startIndex=(\d+)")
+
+_LAYER_BY_URL = {
+    layer.url: layer.name
+    for layer in (POLLEN_LAYER, *AIR_QUALITY_LAYERS.values())
+}
+
+
+def capture_timestamp(path: Path) -> datetime:
+    """Return the time a capture was received."""
+    return datetime.strptime(
+        path.name.split("_", 1)[0], _TIMESTAMP_FORMAT).replace(
+            tzinfo=timezone.utc)
+
+
+def capture_layer(path: Path) -> str:
+    """Return the layer name of a capture."""
+    return path.name.split("_", 1)[1][:-len(CAPTURE_SUFFIX)]
+
+
+def capture_base_layer(path: Path) -> str:
+    """Return the layer of a capture, without the start index of a page."""
+    layer, _, page = capture_layer(path).partition(PAGE_SEPARATOR)
+    return layer if page.isdigit() else capture_layer(path)
+
+
+def list_captures(directory: Path | str) -> list[Path]:
+    """Return the captures of a directory, oldest first."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    # Timestamps sort lexicographically
+    return sorted(directory.glob(f"*{CAPTURE_SUFFIX}"))
+
+
+class PayloadRecorder:
+    """Write raw response bodies to a rotating capture directory."""
+
+    def __init__(
+            self,
+            directory: Path | str,
+            max_files: int = CAPTURE_MAX_FILES) -> None:
+        """Initialize the recorder."""
+        self.directory = Path(directory)
+        self._max_files = max_files
+
+    def record(self, layer_name: str, payload: bytes) -> Path:
+        """Store one response body. Runs in the executor."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime(_TIMESTAMP_FORMAT)
+        path = self.directory / f"{timestamp}_{layer_name}{CAPTURE_SUFFIX}"
+        path.write_bytes(gzip.compress(payload, compresslevel=6))
+
+        for old in list_captures(self.directory)[:-self._max_files]:
+            old.unlink(missing_ok=True)
+        _LOGGER.debug("Captured %s response to %s.", layer_name, path)
+        return path
+
+
+class _ReplayResponse:
+    """Minimal stand-in for a streamed requests.Response."""
+
+    status_code = 200
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self.headers = {"content-encoding": "gzip"}
+        self.raw = self
+
+    def raise_for_status(self) -> None:
+        """Replayed responses are always successful."""
+
+    def stream(self, chunk_size: int = CHUNK_SIZE, decode_content=None):
+        """Yield the compressed capture as received from the socket."""
+        with self._path.open("rb") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+class ReplayTransport:
+    """Serve captured responses in place of the geoserver.
+
+    Each layer's captures are served in order; once a layer runs out, its
+    last capture keeps being served.
+    """
+
+    def __init__(self, captures: list[Path]) -> None:
+        """Initialize the transport from a list of captures."""
+        self.captures: dict[str, list[Path]] = {}
+        for path in sorted(captures, key=lambda path: path.name):
+            self.captures.setdefault(capture_layer(path), []).append(path)
+        self._position: dict[str, int] = {}
+
+    @classmethod
+    def from_directory(cls, directory: Path | str) -> ReplayTransport:
+        """Return a transport replaying every capture of a directory."""
+        return cls(list_captures(directory))
+
+    def rewind(self) -> None:
+        """Serve every layer from its first capture again."""
+        self._position.clear()
+
+    def post(self, url: str, **kwargs) -> _ReplayResponse:
+        """Return the next captured response of the requested layer."""
+        layer_name = _LAYER_BY_URL.get(url)
+        data = str(kwargs.get("data") or "")
+        if "resultType=hits" in data:
+            layer_name = f"{layer_name}{PAGE_SEPARATOR}hits"
+        elif (match := _START_INDEX.search(data)) and match.group(1) != "0":
+            layer_name = f"{layer_name}{PAGE_SEPARATOR}{match.group(1)}"
+        captures = self.captures.get(layer_name)
+        if not captures:
+            # Surfaces like an unreachable server to the client
+            import requests  # pylint: disable=import-outside-toplevel
+
+            raise requests.exceptions.ConnectionError(
+                f"No captures of layer {layer_name}")
+        position = self._position.get(layer_name, 0)
+        self._position[layer_name] = min(position + 1, len(captures) - 1)
+        return _ReplayResponse(captures[position])
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+async def async_replay(coordinator, speed: float | None = None) -> int:
+    """Run one coordinator update per captured pollen response.
+
+    The coordinator's client must use a ReplayTransport. Updates are run
+    back to back, or spaced by the original intervals divided by `speed`.
+    Returns the number of updates replayed.
+    """
+    transport: ReplayTransport = coordinator.client.transport
+    timestamps = [
+        capture_timestamp(path)
+        for path in transport.captures.get(POLLEN_LAYER.name, [])]
+    previous = None
+    for timestamp in timestamps:
+        if speed and previous is not None:
+            await asyncio.sleep((timestamp - previous).total_seconds() / speed)
+        previous = timestamp
+        await coordinator.async_refresh()
+        if coordinator.air_quality_coordinator is not None:
+            await coordinator.air_quality_coordinator.async_refresh()
+    return len(timestamps)
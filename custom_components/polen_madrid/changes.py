@@ -0,0 +1,122 @@
+"""Differences between consecutive pollen snapshots.
+
+Every record of a PolenMadridData gets a fingerprint, a hash of its fields,
+computed once per snapshot. Consecutive snapshots are compared by key and
+fingerprint instead of field by field, and records reused from an
+unchanged page or provider are skipped by identity. The resulting
+SnapshotDiff tells consumers which readings were added, removed or
+changed, and which changes affect the network's catalog: stations, pollen
+types and level thresholds.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from .const import FIELD_MAPPING
+
+# The parsed fields; `measured_at` is derived from measurement_date
+FINGERPRINT_FIELDS = tuple(dict.fromkeys(FIELD_MAPPING.values()))
+
+
+def record_fingerprint(record: dict) -> int:
+    """Return a fingerprint of the fields of a record."""
+    return hash(tuple(map(record.get, FINGERPRINT_FIELDS)))
+
+
+def _thresholds(record: dict) -> tuple:
+    return record.get('medium_threshold'), record.get('high_threshold')
+
+
+@dataclass(frozen=True)
+class SnapshotDiff:
+    """Changes from one snapshot to the next.
+
+    Readings are keyed by (station_id, pollen_code). Stations map their id
+    to their name and pollen types their code to their name;
+    `thresholds_changed` maps a reading to its old and new (medium, high)
+    thresholds.
+    """
+
+    added: frozenset[tuple] = frozenset()
+    removed: frozenset[tuple] = frozenset()
+    changed: frozenset[tuple] = frozenset()
+    stations_added: dict[str, str] = field(default_factory=dict)
+    stations_removed: dict[str, str] = field(default_factory=dict)
+    pollens_added: dict[str, str] = field(default_factory=dict)
+    pollens_removed: dict[str, str] = field(default_factory=dict)
+    thresholds_changed: dict[tuple, tuple[tuple, tuple]] = field(
+        default_factory=dict)
+
+    def __bool__(self) -> bool:
+        """Return True if any reading changed."""
+        return bool(self.added or self.removed or self.changed)
+
+    @property
+    def catalog_changed(self) -> bool:
+        """Return True if stations, pollen types or thresholds changed."""
+        return bool(
+            self.stations_added or self.stations_removed
+            or self.pollens_added or self.pollens_removed
+            or self.thresholds_changed)
+
+    def as_event(self) -> dict[str, Any]:
+        """Return the diff as the data of a change event."""
+        return {
+            "readings_added": len(self.added),
+            "readings_removed": len(self.removed),
+            "readings_changed": len(self.changed),
+            "stations_added": self.stations_added,
+            "stations_removed": self.stations_removed,
+            "pollens_added": self.pollens_added,
+            "pollens_removed": self.pollens_removed,
+            "thresholds_changed": [
+                {
+                    "station_id": str(station_id),
+                    "pollen_code": pollen_code,
+                    "old": list(old),
+                    "new": list(new),
+                }
+                for (station_id, pollen_code), (old, new)
+                in self.thresholds_changed.items()
+            ],
+        }
+
+
+def diff_snapshots(old, new) -> SnapshotDiff:
+    """Return the changes from the `old` to the `new` PolenMadridData."""
+    if new is old:
+        return SnapshotDiff()
+    old_prints = old.fingerprints
+    new_prints = new.fingerprints
+    changed = frozenset(
+        key for key, record in new.items()
+        if (previous := old.get(key)) is not None
+        and previous is not record
+        and old_prints[key] != new_prints[key])
+
+    def _names(index: dict, keys, name_field: str) -> dict[str, str]:
+        return {key: index[key][0].get(name_field) for key in sorted(keys)}
+
+    return SnapshotDiff(
+        added=frozenset(new_prints.keys() - old_prints.keys()),
+        removed=frozenset(old_prints.keys() - new_prints.keys()),
+        changed=changed,
+        stations_added=_names(
+            new.by_station, new.by_station.keys() - old.by_station.keys(),
+            'location_name'),
+        stations_removed=_names(
+            old.by_station, old.by_station.keys() - new.by_station.keys(),
+            'location_name'),
+        pollens_added=_names(
+            new.by_pollen, new.by_pollen.keys() - old.by_pollen.keys(),
+            'pollen_type'),
+        pollens_removed=_names(
+            old.by_pollen, old.by_pollen.keys() - new.by_pollen.keys(),
+            'pollen_type'),
+        thresholds_changed={
+            key: (_thresholds(old[key]), _thresholds(new[key]))
+            for key in changed
+            if _thresholds(old[key]) != _thresholds(new[key])
+        },
+    )
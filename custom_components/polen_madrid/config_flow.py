@@ -1,49 +1,42 @@
 """Config flow for Polen Madrid."""
 from __future__ import annotations
 
-import json
 import logging
 
-import requests
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.helpers import config_validation as cv
-from requests.exceptions import RequestException
+from homeassistant.helpers import selector
 
+from .api import (
+    RAW_STATION_ID_KEY,
+    RAW_STATION_NAME_KEY,
+    PolenMadridApiClient,
+    PolenMadridApiError,
+)
 from .const import (
-    API_DATA_PAYLOAD,
-    API_HEADERS,
-    API_URL,
+    CACHE_CONTROL_STATIONS,
+    CONF_AIR_QUALITY,
+    CONF_CAPTURE,
+    CONF_COMPACT,
+    CONF_HEAT_MAPS,
+    CONF_PROVIDERS,
+    CONF_REFRESH_MIN_AGE,
+    CONF_STALE_AFTER,
+    CONF_STALE_POLICY,
     CONF_STATIONS,
+    DEFAULT_REFRESH_MIN_AGE,
+    DEFAULT_STALE_AFTER,
     DOMAIN,
-    FIELD_MAPPING,
+    STALE_POLICIES,
+    STALE_POLICY_FLAG,
 )
+from .providers import PROVIDERS_SCHEMA
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def _fix_encoding_issue(text: str) -> str:
-    """Fix encoding issues for text."""
-    if isinstance(text, str):
-        try:
-            return text.encode('latin-1').decode('utf-8')
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            return text
-    return text
-
-
-def _get_raw_key_for_value(value_to_find: str) -> str | None:
-    for raw_key, mapped_value in FIELD_MAPPING.items():
-        if mapped_value == value_to_find:
-            return raw_key
-    return None
-
-
-RAW_STATION_ID_KEY = _get_raw_key_for_value("station_id")
-RAW_STATION_NAME_KEY = _get_raw_key_for_value("location_name")
-
-
 class PolenMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Polen Madrid."""
 
@@ -57,40 +50,18 @@ class PolenMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             )
             return None
 
-        def _blocking_fetch() -> dict[str, str] | None:
-            try:
-                response = requests.post(
-                    API_URL,
-                    headers=API_HEADERS,
-                    data=API_DATA_PAYLOAD,
-                    timeout=10)
-                response.raise_for_status()
-                json_data = response.json()
-
-                stations: dict[str, str] = {}
-                features = json_data.get('features', [])
-                for feature in features:
-                    properties = feature.get('properties', {})
-                    station_id = properties.get(RAW_STATION_ID_KEY)
-                    station_name = properties.get(RAW_STATION_NAME_KEY)
-                    if station_id and station_name:
-                        fixed_name = _fix_encoding_issue(station_name)
-                        # Ensure station_id is string for dict keys/HA select
-                        # options
-                        stations[str(station_id)] = fixed_name
-                return stations
-            except RequestException as e:
-                _LOGGER.error("Error fetching stations for config flow: %s", e)
-                return None
-            except json.JSONDecodeError as e:
-                _LOGGER.error(
-                    "Error decoding stations JSON for config flow: %s", e)
-                return None
-            except Exception as e:  # Catch any other unexpected errors
-                _LOGGER.error("Unexpected error fetching stations: %s", e)
-                return None
-
-        return await self.hass.async_add_executor_job(_blocking_fetch)
+        client = PolenMadridApiClient(self.hass)
+        try:
+            return await client.async_get_stations(
+                cache_control=CACHE_CONTROL_STATIONS)
+        except PolenMadridApiError as e:
+            _LOGGER.error("Error fetching stations for config flow: %s", e)
+            return None
+        except Exception as e:  # Catch any other unexpected errors
+            _LOGGER.error("Unexpected error fetching stations: %s", e)
+            return None
+        finally:
+            await client.async_close()
 
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
@@ -172,41 +143,25 @@ class PolenMadridOptionsFlowHandler(config_entries.OptionsFlow):
             )
             return False
 
-        def _blocking_fetch() -> dict[str, str] | None:
-            try:
-                response = requests.post(
-                    API_URL,
-                    headers=API_HEADERS,
-                    data=API_DATA_PAYLOAD,
-                    timeout=10)
-                response.raise_for_status()
-                json_data = response.json()
-
-                stations: dict[str, str] = {}
-                features = json_data.get('features', [])
-                for feature in features:
-                    properties = feature.get('properties', {})
-                    station_id = properties.get(RAW_STATION_ID_KEY)
-                    station_name = properties.get(RAW_STATION_NAME_KEY)
-                    if station_id and station_name:
-                        fixed_name = _fix_encoding_issue(station_name)
-                        stations[str(station_id)] = fixed_name
-                return stations
-            except RequestException as e:
-                _LOGGER.error(
-                    "Error fetching stations for options flow: %s", e)
-                return None
-            except json.JSONDecodeError as e:
-                _LOGGER.error(
-                    "Error decoding stations JSON for options flow: %s", e)
-                return None
-            except Exception as e:
-                _LOGGER.error(
-                    "Unexpected error fetching stations for options: %s", e)
-                return None
-
-        fetched_data = await self.hass.async_add_executor_job(_blocking_fetch)
+        client = PolenMadridApiClient(self.hass)
+        try:
+            fetched_data = await client.async_get_stations(
+                cache_control=CACHE_CONTROL_STATIONS)
+        except PolenMadridApiError as e:
+            _LOGGER.error(
+                "Error fetching stations for options flow: %s", e)
+            fetched_data = None
+        except Exception as e:
+            _LOGGER.error(
+                "Unexpected error fetching stations for options: %s", e)
+            fetched_data = None
+        finally:
+            await client.async_close()
+
         if fetched_data is not None:
+            # Stations of the other providers come from the loaded data
+            for station_id, name in self._provider_stations().items():
+                fetched_data.setdefault(station_id, name)
             self._stations = dict(
                 sorted(
                     fetched_data.items(),
@@ -214,6 +169,38 @@ class PolenMadridOptionsFlowHandler(config_entries.OptionsFlow):
             return True
         return False
 
+    def _provider_stations(self) -> dict[str, str]:
+        """Return the stations of the loaded data, keyed by station id."""
+        coordinator = self.hass.data.get(DOMAIN, {}).get(
+            self.config_entry.entry_id)
+        if not coordinator or not coordinator.data:
+            return {}
+        return {
+            station_id: records[0].get('location_name') or station_id
+            for station_id, records in coordinator.data.by_station.items()
+        }
+
+    @staticmethod
+    def _valid_providers(providers) -> bool:
+        """Return True if the provider definitions are valid."""
+        try:
+            PROVIDERS_SCHEMA(providers or [])
+        except vol.Invalid as err:
+            _LOGGER.warning("Invalid pollen providers: %s", err)
+            return False
+        return True
+
+    def _pollen_types(self) -> dict[str, str]:
+        """Return the pollen types of the loaded data, keyed by code."""
+        coordinator = self.hass.data.get(DOMAIN, {}).get(
+            self.config_entry.entry_id)
+        if not coordinator or not coordinator.data:
+            return {}
+        return {
+            code: records[0].get('pollen_type') or code
+            for code, records in sorted(coordinator.data.by_pollen.items())
+        }
+
     async def async_step_init(self, user_input=None):
         """Manage the options."""
         errors: dict[str, str] = {}
@@ -222,6 +209,8 @@ class PolenMadridOptionsFlowHandler(config_entries.OptionsFlow):
             if not user_input.get(CONF_STATIONS):  # Check if list is empty
                 # A new error string
                 errors["base"] = "no_stations_selected_options"
+            elif not self._valid_providers(user_input.get(CONF_PROVIDERS)):
+                errors["base"] = "invalid_providers"
             else:
                 _LOGGER.debug(
                     "Updating options with selected stations: %s",
@@ -247,7 +236,42 @@ class PolenMadridOptionsFlowHandler(config_entries.OptionsFlow):
             vol.Required(
                 CONF_STATIONS,
                 default=current_selection
-            ): cv.multi_select(self._stations)
+            ): cv.multi_select(self._stations),
+            vol.Optional(
+                CONF_COMPACT,
+                default=self.config_entry.options.get(CONF_COMPACT, False)
+            ): bool,
+            vol.Optional(
+                CONF_AIR_QUALITY,
+                default=self.config_entry.options.get(CONF_AIR_QUALITY, False)
+            ): bool,
+            vol.Optional(
+                CONF_HEAT_MAPS,
+                default=self.config_entry.options.get(CONF_HEAT_MAPS, [])
+            ): cv.multi_select(self._pollen_types()),
+            vol.Optional(
+                CONF_STALE_AFTER,
+                default=self.config_entry.options.get(
+                    CONF_STALE_AFTER, DEFAULT_STALE_AFTER)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                CONF_STALE_POLICY,
+                default=self.config_entry.options.get(
+                    CONF_STALE_POLICY, STALE_POLICY_FLAG)
+            ): vol.In(STALE_POLICIES),
+            vol.Optional(
+                CONF_REFRESH_MIN_AGE,
+                default=self.config_entry.options.get(
+                    CONF_REFRESH_MIN_AGE, DEFAULT_REFRESH_MIN_AGE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                CONF_PROVIDERS,
+                default=self.config_entry.options.get(CONF_PROVIDERS, [])
+            ): selector.ObjectSelector(),
+            vol.Optional(
+                CONF_CAPTURE,
+                default=self.config_entry.options.get(CONF_CAPTURE, False)
+            ): bool,
         })
 
         return self.async_show_form(
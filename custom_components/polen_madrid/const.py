@@ -4,16 +4,43 @@ from datetime import timedelta
 DOMAIN = "polen_madrid"
 
 CONF_STATIONS = "stations"
+CONF_AIR_QUALITY = "air_quality"
+CONF_CAPTURE = "capture_responses"
+CONF_COMPACT = "compact"
+CONF_HEAT_MAPS = "heat_maps"
+CONF_PROVIDERS = "providers"
+CONF_REFRESH_MIN_AGE = "refresh_min_age_minutes"
+CONF_STALE_AFTER = "stale_after_days"
+CONF_STALE_POLICY = "stale_policy"
 
-API_URL = (
-    'https://idem.comunidad.madrid/geoserver3/wfs?version=2.0.0&request=GetFeature'
-    '&typeName=SPOL_V_CAPTADORES_GIS')
+API_BASE_URL = (
+    'https://idem.comunidad.madrid/geoserver3/wfs?version=2.0.0&request=GetFeature')
+API_URL = f'{API_BASE_URL}&typeName=SPOL_V_CAPTADORES_GIS'
+# Connections kept alive per host, shared by all layers and providers
+API_POOL_SIZE = 4
+# Hosts with a pool of kept-alive connections, one per provider host
+API_POOL_HOSTS = 4
+# Domain-wide request budget: bursts of up to API_REQUEST_BURST requests,
+# refilled at one request per API_REQUEST_REFILL. Callers over budget get
+# the last response of their layer or queue for the next tokens, up to
+# API_QUEUE_TIMEOUT; at least one refill, so the first in line is served.
+API_REQUEST_BURST = 10
+API_REQUEST_REFILL = timedelta(minutes=1)
+API_QUEUE_TIMEOUT = API_REQUEST_REFILL
+# WFS 2.0 paging: features per GetFeature page, and retries of a failed
+# page before the layer fails
+API_PAGE_SIZE = 500
+API_PAGE_RETRIES = 2
+API_PAGE_RETRY_DELAY = timedelta(seconds=1)
 API_HEADERS = {
     "accept": "*/*",
-    "cache-control": "no-cache",
     "content-type": "application/x-www-form-urlencoded",
-    "pragma": "no-cache",
 }
+# Cache-Control request headers per call site. Readings are published once
+# a day, so the scheduled poll accepts a response up to half a poll old and
+# the station list changes even less often.
+CACHE_CONTROL_POLL = "max-age=1800"
+CACHE_CONTROL_STATIONS = "max-age=86400"
 API_DATA_PAYLOAD = (
     'SRS=EPSG%3A25830&outputFormat=application%2Fjson&Filter=%3CFilter%20xmlns'
     '%3Agml%3D%22http%3A%2F%2Fwww.opengis.net%2Fgml%22%3E%3CIntersects%3E%3CPropertyName%3E'
@@ -44,8 +71,60 @@ FIELD_MAPPING = {
 }
 
 SCAN_INTERVAL = timedelta(hours=1)
+# Requested refreshes (e.g. homeassistant.update_entity) are answered from
+# the current data when it was fetched less than this long ago, by default
+DEFAULT_REFRESH_MIN_AGE = 5
+REQUEST_REFRESH_MIN_AGE = timedelta(minutes=DEFAULT_REFRESH_MIN_AGE)
+
+# Time zone of measurement dates sent without an offset
+MEASUREMENT_TIME_ZONE = "Europe/Madrid"
+
+# Readings older than the configured number of days are stale. Stale
+# readings are either flagged with a `stale` attribute or made unavailable.
+DEFAULT_STALE_AFTER = 4
+STALE_POLICY_FLAG = "flag"
+STALE_POLICY_UNAVAILABLE = "unavailable"
+STALE_POLICIES = [STALE_POLICY_FLAG, STALE_POLICY_UNAVAILABLE]
+
+# Pollen levels, ordered from lowest to highest
+POLLEN_LEVELS = ["Bajo", "Medio", "Alto"]
+
+# Services
+SERVICE_GET_READINGS = "get_readings"
+ATTR_STATIONS = "stations"
+ATTR_POLLEN_CODES = "pollen_codes"
+ATTR_MIN_LEVEL = "min_level"
+ATTR_NEAREST = "nearest"
+SERVICE_EXPORT = "export"
+ATTR_FORMAT = "format"
+ATTR_COLUMNS = "columns"
+ATTR_START_DATE = "start_date"
+ATTR_END_DATE = "end_date"
+ATTR_FILENAME = "filename"
+SERVICE_PROFILE_NEXT_UPDATE = "profile_next_update"
+# Fired when stations, pollen types or thresholds change upstream
+EVENT_CATALOG_CHANGED = f"{DOMAIN}_catalog_changed"
+ATTR_TOP = "top"
+ATTR_REFRESH = "refresh"
+
+# Minimum time between on-demand fetches for stations missing from the
+# coordinator snapshot
+FALLBACK_FETCH_INTERVAL = timedelta(minutes=10)
 
 POLLUTANT_MAPPING = {
     "NO2": "Nitrogen Dioxide (NO2)",
     "PM2_5": "Particulate Matter < 2.5μm (PM2.5)"
 }
+
+# Air quality layers of the same geoserver, one per pollutant
+AIR_QUALITY_TYPE_NAMES = {
+    "NO2": "SCAL_V_NO2_GIS",
+    "PM2_5": "SCAL_V_PM25_GIS",
+}
+AIR_QUALITY_DATA_PAYLOAD = 'SRS=EPSG%3A25830&outputFormat=application%2Fjson'
+AIR_QUALITY_FIELD_MAPPING = {
+    "CD_ESTACION": "station_id",
+    "DS_ESTACION": "location_name",
+    "FC_FECHA_MEDICION": "measurement_date",
+    "NM_VALOR": "value",
+}
@@ -0,0 +1,917 @@
+"""Data update coordinator for the Polen Madrid integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import issue_registry as ir
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+from homeassistant.util import dt as dt_util
+
+from .api import (
+    AIR_QUALITY_LAYERS,
+    PolenMadridApiClient,
+    PolenMadridApiError,
+    WfsLayer,
+    decode_payload,
+    number_matched,
+    page_layer,
+)
+from .changes import SnapshotDiff, diff_snapshots, record_fingerprint
+from .const import (
+    API_PAGE_RETRIES,
+    API_PAGE_RETRY_DELAY,
+    CACHE_CONTROL_POLL,
+    DEFAULT_STALE_AFTER,
+    DOMAIN,
+    EVENT_CATALOG_CHANGED,
+    FALLBACK_FETCH_INTERVAL,
+    REQUEST_REFRESH_MIN_AGE,
+    SCAN_INTERVAL,
+    STALE_POLICY_FLAG,
+)
+from .helpers import (
+    get_pollen_level_details,
+    parse_air_quality_response,
+    parse_api_response,
+    parse_measurement_datetime,
+)
+from .memory import MemoryStats, estimate_records_size, track_peak
+from .profiler import UpdateProfiler, async_add_profiled_job
+from .providers import MADRID_PROVIDER, PollenProvider
+from .validation import ValidationReport, validate_features
+
+_LOGGER = logging.getLogger(__name__)
+
+STATIONS_STORAGE_VERSION = 1
+# The stations catalog only changes when the network does
+STATIONS_SAVE_DELAY = 60
+
+
+def stations_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Return the store of a config entry's stations catalog."""
+    return Store(hass, STATIONS_STORAGE_VERSION, f"{DOMAIN}.stations.{entry_id}")
+
+
+def _fingerprint_records(items) -> dict[tuple, int]:
+    """Return the fingerprints of (key, record) pairs, keyed like them."""
+    return {key: record_fingerprint(record) for key, record in items}
+
+
+class PolenMadridData(dict):
+    """Readings keyed by (station_id, pollen_code) with secondary indexes.
+
+    The indexes are built once per update and hold references to the same
+    record dicts as the primary map:
+
+    * `by_station`: str(station_id) -> records of that station
+    * `by_pollen`: pollen_code -> records of that pollen type
+    * `by_level`: level name (Bajo, Medio, Alto, Unknown) -> records
+    * `newest_by_station`: str(station_id) -> newest `measured_at` of the
+      station, and `newest_measurement` the newest of all, so dates can be
+      compared without rescanning the records
+
+    `validation` holds the report of the features dropped while building it
+    and `memory` the memory accounting of the refresh. `fingerprints`, to
+    diff the map against the next one, are computed in the executor when
+    the records are parsed, and carried over from unchanged pages and
+    providers; otherwise on first use.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize the map and build its indexes."""
+        super().__init__(*args, **kwargs)
+        self.validation = ValidationReport()
+        self.memory = MemoryStats()
+        self.by_station: dict[str, list[dict]] = {}
+        self.by_pollen: dict[str, list[dict]] = {}
+        self.by_level: dict[str, list[dict]] = {}
+        self.newest_by_station: dict[str, datetime] = {}
+        self.newest_measurement: datetime | None = None
+        self._fingerprints: dict[tuple, int] | None = None
+        for record in self.values():
+            station_id = str(record.get('station_id'))
+            self.by_station.setdefault(station_id, []).append(record)
+            self.by_pollen.setdefault(
+                record.get('pollen_code'), []).append(record)
+            self.by_level.setdefault(
+                self.level_of(record), []).append(record)
+            measured_at = record.get('measured_at')
+            if measured_at is None:
+                continue
+            newest = self.newest_by_station.get(station_id)
+            if newest is None or measured_at > newest:
+                self.newest_by_station[station_id] = measured_at
+            if (self.newest_measurement is None
+                    or measured_at > self.newest_measurement):
+                self.newest_measurement = measured_at
+
+    @property
+    def fingerprints(self) -> dict[tuple, int]:
+        """Return the fingerprint of every record, keyed like the map."""
+        if self._fingerprints is None:
+            self._fingerprints = _fingerprint_records(self.items())
+        return self._fingerprints
+
+    def select(
+            self,
+            stations=None,
+            pollen_codes=None,
+            levels=None) -> list[dict]:
+        """Return the records matching all given filters.
+
+        Candidates are taken from the smallest matching index bucket, so the
+        cost is proportional to the result rather than to the whole map.
+        """
+        candidates = None
+        for index, keys in (
+                (self.by_station, stations),
+                (self.by_pollen, pollen_codes),
+                (self.by_level, levels)):
+            if keys is None:
+                continue
+            bucket = [
+                record for key in keys for record in index.get(key, [])]
+            if candidates is None or len(bucket) < len(candidates):
+                candidates = bucket
+        if candidates is None:
+            return list(self.values())
+
+        stations = set(stations) if stations is not None else None
+        pollen_codes = set(pollen_codes) if pollen_codes is not None else None
+        levels = set(levels) if levels is not None else None
+        return [
+            record for record in candidates
+            if (stations is None or str(record.get('station_id')) in stations)
+            and (pollen_codes is None or record.get('pollen_code') in pollen_codes)
+            and (levels is None or self.level_of(record) in levels)
+        ]
+
+    @staticmethod
+    def level_of(record: dict) -> str:
+        """Return the level name of a record."""
+        return get_pollen_level_details(
+            record.get('pollen_value'),
+            record.get('medium_threshold'),
+            record.get('high_threshold'))[0]
+
+
+def _keyed_records(parsed_data: list[dict], provider: PollenProvider):
+    """Yield ((station_id, pollen_code), normalized record) pairs.
+
+    The parsed records are fresh dicts, so they are normalized in place
+    rather than copied, and the pairs feed PolenMadridData directly instead of an
+    intermediate dict. The measurement date is parsed once here into the
+    aware `measured_at` datetime; `measurement_date` keeps the raw value.
+    """
+    for record in parsed_data:
+        if not (record.get('station_id') and record.get('pollen_code')):
+            continue
+        record = provider.normalize(record)
+        record['measured_at'] = parse_measurement_datetime(
+            record.get('measurement_date'))
+        yield (record['station_id'], record['pollen_code']), record
+
+
+def _parse_payload(payload: bytes, provider: PollenProvider):
+    """Decode, validate and parse a payload.
+
+    Returns the keyed records (lazily), the validation report and the
+    number of features in the payload. The decoded JSON is released as
+    soon as the records are parsed.
+    """
+    json_data = decode_payload(payload)
+    _LOGGER.debug(
+        "Successfully fetched data, raw JSON keys: %s", list(
+            json_data.keys()) if isinstance(
+            json_data, dict) else 'Not a dict')
+
+    features, report = validate_features(json_data, provider.validator)
+    parsed_data = parse_api_response(
+        {'features': features}, provider.field_mapping)
+    feature_count = report.accepted + sum(report.rejected.values())
+    del json_data, features
+    _LOGGER.debug("Parsed_data count: %s", len(parsed_data))
+    return _keyed_records(parsed_data, provider), report, feature_count
+
+
+def _finish_data(
+        data: PolenMadridData,
+        report: ValidationReport,
+        memory: MemoryStats) -> PolenMadridData:
+    """Attach the validation report and memory accounting to the data."""
+    if not data:
+        _LOGGER.warning("No data in final_data_structure after processing.")
+    _LOGGER.debug("Final_data_structure populated with %s entries.", len(data))
+
+    memory.records = len(data)
+    memory.estimated_data_bytes = estimate_records_size(list(data.values()))
+    data.validation = report
+    data.memory = memory
+    return data
+
+
+def build_data_from_payload(
+        payload: bytes,
+        track_memory: bool | None = None,
+        provider: PollenProvider = MADRID_PROVIDER) -> PolenMadridData:
+    """Decode a provider's raw API payload into indexed readings.
+
+    Runs in the executor: decode, validation, parse_api_response,
+    normalization, keyed structure and indexes are all built off the event
+    loop.
+    Malformed features are quarantined rather than failing the update.
+
+    The decoded JSON is released as soon as the records are parsed, so the
+    raw payload, decoded JSON and records are never all alive at once
+    beyond that point. Peak allocation is measured with tracemalloc when
+    `track_memory` is set, by default when debug logging is enabled.
+    """
+    if track_memory is None:
+        track_memory = _LOGGER.isEnabledFor(logging.DEBUG)
+    memory = MemoryStats(payload_bytes=len(payload))
+    with track_peak(memory, track_memory):
+        records, report, _ = _parse_payload(payload, provider)
+        # Build the indexes before returning so the primary map and its
+        # indexes are swapped into coordinator.data as a single object.
+        data = PolenMadridData(records)
+        del records
+    # Off the event loop, where the next update's diff would otherwise
+    # compute them
+    data._fingerprints = _fingerprint_records(data.items())
+    return _finish_data(data, report, memory)
+
+
+@dataclass
+class ParsedPage:
+    """Keyed records of one page of a paged layer."""
+
+    records: list[tuple]
+    report: ValidationReport
+    # Features in the page, valid or not, and the layer's total if reported
+    features: int
+    number_matched: int | None
+    payload_bytes: int
+    # Peak allocation while the page was parsed, if measured
+    peak_bytes: int | None = None
+    # Fingerprints of the records, keyed like them
+    fingerprints: dict[tuple, int] = field(default_factory=dict)
+
+
+def parse_page(
+        payload: bytes,
+        provider: PollenProvider,
+        track_memory: bool | None = None) -> ParsedPage:
+    """Parse one page of a layer. Runs in the executor.
+
+    Peak allocation is measured as in build_data_from_payload.
+    """
+    if track_memory is None:
+        track_memory = _LOGGER.isEnabledFor(logging.DEBUG)
+    memory = MemoryStats(payload_bytes=len(payload))
+    with track_peak(memory, track_memory):
+        records, report, features = _parse_payload(payload, provider)
+        records = list(records)
+    return ParsedPage(
+        records, report, features, number_matched(payload), len(payload),
+        memory.peak_bytes,
+        _fingerprint_records(records))
+
+
+def build_data_from_pages(
+        pages: list[ParsedPage],
+        track_memory: bool | None = None) -> PolenMadridData:
+    """Merge the parsed pages of a layer into indexed readings.
+
+    Runs in the executor. The records of each page go straight into the
+    keyed map; a reading repeated on two pages (the dataset changed while
+    paging) is kept once, as is its fingerprint. The peak allocation is the
+    largest of the pages' parses and the merge.
+    """
+    if track_memory is None:
+        track_memory = _LOGGER.isEnabledFor(logging.DEBUG)
+    memory = MemoryStats(
+        payload_bytes=sum(page.payload_bytes for page in pages))
+    with track_peak(memory, track_memory):
+        data = PolenMadridData(
+            pair for page in pages for pair in page.records)
+        data._fingerprints = {
+            key: fingerprint
+            for page in pages for key, fingerprint in page.fingerprints.items()}
+    if memory.peak_bytes is not None:
+        memory.peak_bytes = max([
+            memory.peak_bytes,
+            *(page.peak_bytes for page in pages if page.peak_bytes is not None)])
+    first = pages[0].report
+    report = ValidationReport(
+        missing_properties=first.missing_properties,
+        unknown_properties=first.unknown_properties)
+    for page in pages:
+        report.merge(page.report)
+    return _finish_data(data, report, memory)
+
+
+def merge_provider_data(parts: list[PolenMadridData]) -> PolenMadridData:
+    """Merge the readings of several providers into one indexed map.
+
+    The validation report is the first (Madrid) provider's, which the
+    schema drift issue is about; memory accounting is summed.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    data = PolenMadridData(
+        item for part in parts for item in part.items())
+    data._fingerprints = {
+        key: fingerprint
+        for part in parts for key, fingerprint in part.fingerprints.items()}
+    data.validation = parts[0].validation
+    peaks = [part.memory.peak_bytes for part in parts]
+    data.memory = MemoryStats(
+        payload_bytes=sum(part.memory.payload_bytes for part in parts),
+        records=len(data),
+        estimated_data_bytes=sum(
+            part.memory.estimated_data_bytes for part in parts),
+        peak_bytes=None if None in peaks else max(peaks))
+    return data
+
+
+@dataclass
+class RefreshStats:
+    """Outcome of the refresh requests of a coordinator."""
+
+    requested: int = 0
+    # Requests that started a fetch
+    fetched: int = 0
+    # Requests that joined a fetch in flight
+    joined: int = 0
+    # Requests answered by data younger than the minimum age
+    fresh: int = 0
+
+
+class CoalescedRefreshMixin:
+    """Coalesce refresh requests into a single fetch.
+
+    Replaces the coordinator's debounced async_request_refresh, which lets
+    a burst of requests through as two fetches. A request made while a
+    fetch is in flight, whether requested, scheduled or the first refresh,
+    joins it and returns when it completes, and a request made less than
+    `refresh_min_age` after the last successful fetch returns at once.
+    Subclasses implement _async_fetch_data.
+    """
+
+    def _init_refresh(self) -> None:
+        self.refresh_stats = RefreshStats()
+        # Set from the config entry options
+        self.refresh_min_age: timedelta = REQUEST_REFRESH_MIN_AGE
+        # The requested refresh task, from its creation, and the completion
+        # of any refresh while it runs
+        self._refresh_task: asyncio.Task | None = None
+        self._refreshing: asyncio.Future | None = None
+        self._fetched_at: float | None = None
+
+    async def _async_refresh(self, *args, **kwargs) -> None:
+        """Refresh, letting requests made meanwhile join this refresh.
+
+        A refresh started while another runs, e.g. a scheduled one, joins
+        it rather than fetching again.
+        """
+        if (refreshing := self._refreshing) is not None:
+            await asyncio.shield(refreshing)
+            return
+        refreshing = self._refreshing = self.hass.loop.create_future()
+        try:
+            await super()._async_refresh(*args, **kwargs)
+        finally:
+            self._refreshing = None
+            refreshing.set_result(None)
+
+    async def async_shutdown(self) -> None:
+        """Cancel the requested refresh in flight, then shut down."""
+        if (task := self._refresh_task) is not None and not task.done():
+            task.cancel()
+        await super().async_shutdown()
+
+    async def _async_update_data(self):
+        """Fetch data and record when it was fetched."""
+        data = await self._async_fetch_data()
+        self._fetched_at = time.monotonic()
+        return data
+
+    def _refresh_in_flight(self) -> asyncio.Future | None:
+        """Return the requested or other refresh in flight, if any."""
+        for task in (self._refresh_task, self._refreshing):
+            if task is not None and not task.done():
+                return task
+        return None
+
+    async def async_join_refresh(self) -> None:
+        """Wait until no refresh is in flight."""
+        while (task := self._refresh_in_flight()) is not None:
+            await asyncio.shield(task)
+
+    async def async_request_refresh(self) -> None:
+        """Refresh unless the data is fresh, sharing any fetch in flight."""
+        self.refresh_stats.requested += 1
+        if (task := self._refresh_in_flight()) is not None:
+            self.refresh_stats.joined += 1
+        elif (self.last_update_success
+                and self._fetched_at is not None
+                and time.monotonic() - self._fetched_at
+                < self.refresh_min_age.total_seconds()):
+            self.logger.debug("%s data is fresh, not refreshing.", self.name)
+            self.refresh_stats.fresh += 1
+            return
+        else:
+            self.refresh_stats.fetched += 1
+            task = self._refresh_task = self.hass.async_create_task(
+                self.async_refresh(), f"{self.name} requested refresh")
+        # A cancelled caller does not cancel the fetch the others wait for
+        await asyncio.shield(task)
+
+
+class PolenMadridDataUpdateCoordinator(
+        CoalescedRefreshMixin, DataUpdateCoordinator):
+    """Class to manage fetching Polen Madrid data.
+
+    Every provider is fetched concurrently through the same client, and
+    their readings are merged into one PolenMadridData. The Madrid provider
+    comes first and must succeed; any other failing provider keeps its
+    last readings and is reported in `provider_errors`.
+    """
+
+    def __init__(
+            self,
+            hass: HomeAssistant,
+            client: PolenMadridApiClient | None = None) -> None:
+        """Initialize."""
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
+        self.client = client or PolenMadridApiClient(hass)
+        # Set up by the integration when air quality sensors are enabled
+        self.air_quality_coordinator: PolenMadridAirQualityCoordinator | None = None
+        # Platforms set up for the config entry
+        self.platforms: list = []
+        # Created by the websocket API on the first subscription
+        self.delta_publisher = None
+        # Serialized by the HTTP API on the first request after an update
+        self.geojson_document = None
+        # Set up by the integration from the `providers` option
+        self.providers: list[PollenProvider] = [MADRID_PROVIDER]
+        self.provider_errors: dict[str, str] = {}
+        # Readings of each provider the merged data was built from
+        self.provider_data: dict[str, PolenMadridData] = {}
+        self._merged: tuple[tuple, PolenMadridData | None] = ((), None)
+        # Staleness policy, from the config entry options
+        self.stale_after: timedelta | None = timedelta(days=DEFAULT_STALE_AFTER)
+        self.stale_policy = STALE_POLICY_FLAG
+        # Armed by the profile_next_update service for the next update only
+        self._armed_profiler: UpdateProfiler | None = None
+        self.profiler: UpdateProfiler | None = None
+        self.profile_summary: dict | None = None
+        # Changes made by the last update
+        self.changes = SnapshotDiff()
+        # Stations ever reported, new ones announced until selected, and
+        # those that left the feed; restored by async_load_stations
+        self.known_stations: dict[str, str] = {}
+        self.announced_stations: dict[str, str] = {}
+        self.retired_stations: dict[str, str] = {}
+        # Set from the config entry
+        self.selected_stations: set[str] = set()
+        self._stations_store: Store | None = None
+        self._last_payload: dict[str, bytearray] = {}
+        # Payload and parsed records of each page, per paged provider
+        self._pages: dict[str, dict[str, tuple[bytearray, ParsedPage]]] = {}
+        self._fallback_lock = asyncio.Lock()
+        self._fallback_data: dict | None = None
+        self._fallback_fetched_at: float | None = None
+        self._init_refresh()
+
+    def is_stale(self, measured_at: datetime | None) -> bool:
+        """Return True if a measurement is older than the staleness policy.
+
+        Readings without a measurement date are never considered stale.
+        """
+        if self.stale_after is None or measured_at is None:
+            return False
+        return dt_util.utcnow() - measured_at > self.stale_after
+
+    def arm_profiler(self, profiler: UpdateProfiler) -> None:
+        """Profile the next update with `profiler`."""
+        self._armed_profiler = profiler
+
+    async def _async_refresh(self, *args, **kwargs) -> None:
+        """Refresh, profiling the update and its entity fan-out if armed."""
+        profiler = self._armed_profiler
+        if profiler is None or self._refreshing is not None:
+            # A refresh joining the one in flight leaves the profiler armed
+            await super()._async_refresh(*args, **kwargs)
+            return
+        self._armed_profiler = None
+        self.profiler = self.client.profiler = profiler
+        try:
+            with profiler:
+                await super()._async_refresh(*args, **kwargs)
+        finally:
+            self.profiler = self.client.profiler = None
+        try:
+            self.profile_summary = await self.hass.async_add_executor_job(
+                profiler.write)
+        except OSError as err:
+            _LOGGER.warning("Could not write the update profile: %s", err)
+
+    async def _async_update_data(self) -> PolenMadridData:
+        """Fetch the readings and diff them against the previous ones.
+
+        The first update is the baseline and reports no changes.
+        """
+        previous = self.data
+        data = await super()._async_update_data()
+        if previous is None:
+            self.changes = SnapshotDiff()
+        else:
+            self.changes = diff_snapshots(previous, data)
+            self._async_report_changes(self.changes)
+        self._async_update_stations(data)
+        return data
+
+    async def async_load_stations(self, store: Store) -> None:
+        """Restore the stations catalog, and keep it in `store`."""
+        self._stations_store = store
+        if stored := await store.async_load():
+            self.known_stations = stored.get('known', {})
+            self.announced_stations = stored.get('announced', {})
+            self.retired_stations = stored.get('retired', {})
+
+    async def async_save_stations(self) -> None:
+        """Write the stations catalog now, instead of after its delay."""
+        if self._stations_store is not None:
+            await self._stations_store.async_save(self._stations_data())
+
+    def _stations_data(self) -> dict:
+        return {
+            'known': self.known_stations,
+            'announced': self.announced_stations,
+            'retired': self.retired_stations,
+        }
+
+    async def async_fetch_fallback(self) -> dict:
+        """Fetch a snapshot outside the regular update schedule.
+
+        Used by services asking for stations that are missing from the
+        current coordinator data. The API is hit at most once per
+        FALLBACK_FETCH_INTERVAL; calls in between get the cached result.
+        The coordinator's caches, diagnostics and repairs issues are left
+        as the last update set them.
+        """
+        async with self._fallback_lock:
+            now = time.monotonic()
+            if (self._fallback_fetched_at is not None
+                    and now - self._fallback_fetched_at
+                    < FALLBACK_FETCH_INTERVAL.total_seconds()):
+                _LOGGER.debug("Serving fallback request from cache.")
+                return self._fallback_data or {}
+
+            # Record the attempt before fetching so failures are rate
+            # limited as well.
+            self._fallback_fetched_at = now
+            try:
+                parts, _ = await self._async_fetch_parts(reuse=False)
+                self._fallback_data = merge_provider_data(list(parts.values()))
+            except UpdateFailed as err:
+                _LOGGER.warning("Fallback fetch failed: %s", err)
+            return self._fallback_data or {}
+
+    async def _async_fetch_data(self):
+        """Download and process the full dataset of every provider."""
+        parts, self.provider_errors = await self._async_fetch_parts()
+        self.provider_data = parts
+
+        # Unchanged providers return the very same objects; merge only
+        # when one of them changed.
+        merged_parts, merged = self._merged
+        if len(parts) == len(merged_parts) and all(
+                part is previous
+                for part, previous in zip(parts.values(), merged_parts)):
+            return merged
+        data = merge_provider_data(list(parts.values()))
+        self._merged = (tuple(parts.values()), data)
+        self._async_report_schema_drift(data.validation)
+        return data
+
+    async def _async_fetch_parts(
+            self,
+            reuse: bool = True) -> tuple[dict[str, PolenMadridData], dict[str, str]]:
+        """Fetch every provider; return their readings and errors.
+
+        The first (Madrid) provider failing raises. Another failing one
+        keeps the readings of the last update, if any.
+        """
+        results = await asyncio.gather(
+            *(self._async_fetch_provider(provider, reuse)
+              for provider in self.providers),
+            return_exceptions=True)
+
+        parts: dict[str, PolenMadridData] = {}
+        errors: dict[str, str] = {}
+        for index, (provider, result) in enumerate(zip(self.providers, results)):
+            if isinstance(result, BaseException):
+                if index == 0:
+                    raise result
+                _LOGGER.warning(
+                    "Error fetching %s pollen data: %s", provider.name, result)
+                errors[provider.name] = str(result)
+                if (previous := self.provider_data.get(provider.name)) is not None:
+                    parts[provider.name] = previous
+                continue
+            parts[provider.name] = result
+        return parts, errors
+
+    async def _async_fetch_provider(
+            self,
+            provider: PollenProvider,
+            reuse: bool = True) -> PolenMadridData:
+        """Fetch and process one provider, reusing it when it did not change.
+
+        Without `reuse`, the payloads and readings of the last update are
+        neither reused nor replaced.
+        """
+        try:
+            if provider.layer.page_size:
+                return await self._async_fetch_pages(provider, reuse)
+            payload = await self.client.async_get_payload(
+                cache_control=CACHE_CONTROL_POLL,
+                conditional=True,
+                layer=provider.layer)
+            if not reuse:
+                return await async_add_profiled_job(
+                    self.hass, self.profiler,
+                    build_data_from_payload, payload, None, provider)
+            if (payload is self._last_payload.get(provider.name)
+                    and provider.name in self.provider_data):
+                return self.provider_data[provider.name]
+            # Decoding and processing a multi-megabyte FeatureCollection is
+            # CPU bound; run it as one executor job to keep the loop free.
+            data = await async_add_profiled_job(
+                self.hass, self.profiler,
+                build_data_from_payload, payload, None, provider)
+        except PolenMadridApiError as err:
+            raise UpdateFailed(str(err)) from err
+        except Exception as e:
+            _LOGGER.exception("Unexpected error fetching pollen data: %s", e)
+            raise UpdateFailed(f"Unexpected error: {e}") from e
+        self._last_payload[provider.name] = payload
+        return data
+
+    async def _async_fetch_pages(
+            self,
+            provider: PollenProvider,
+            reuse: bool = True) -> PolenMadridData:
+        """Fetch a paged layer with WFS 2.0 count/startIndex paging.
+
+        The first page gives the layer's size: the numberMatched it reports,
+        or a resultType=hits request if it is full and reports none. The
+        other pages are fetched concurrently, within the request budget's
+        concurrency cap, and each is parsed in the executor as soon as it
+        arrives. A failed page, the first one included, is retried on its
+        own before the layer fails. Pages are sized by
+        the first one, so a server capping responses below `page_size` is
+        still paged through completely.
+        """
+        layer = provider.layer
+        previous = self._pages.get(provider.name, {}) if reuse else {}
+        pages: dict[str, tuple[bytearray, ParsedPage]] = {}
+
+        first = await self._async_fetch_page(
+            provider, page_layer(layer, 0), previous, pages,
+            retries=API_PAGE_RETRIES)
+        starts: range = range(0)
+        if first.features >= layer.page_size or first.number_matched:
+            matched = first.number_matched
+            if matched is None:
+                matched = await self.client.async_get_hits(layer)
+            if matched is not None and first.features:
+                starts = range(first.features, matched, first.features)
+        if starts:
+            _LOGGER.debug(
+                "Fetching %s more pages of %s data.", len(starts), layer.name)
+        rest = await asyncio.gather(*(
+            self._async_fetch_page(
+                provider,
+                page_layer(layer, start, first.features),
+                previous,
+                pages,
+                retries=API_PAGE_RETRIES)
+            for start in starts))
+        if not reuse:
+            return await async_add_profiled_job(
+                self.hass, self.profiler, build_data_from_pages, [first, *rest])
+        self._pages[provider.name] = pages
+
+        if (pages.keys() == previous.keys()
+                and all(pages[name] is previous[name] for name in pages)
+                and provider.name in self.provider_data):
+            return self.provider_data[provider.name]
+        return await async_add_profiled_job(
+            self.hass, self.profiler, build_data_from_pages, [first, *rest])
+
+    async def _async_fetch_page(
+            self,
+            provider: PollenProvider,
+            layer: WfsLayer,
+            previous: dict[str, tuple[bytearray, ParsedPage]],
+            pages: dict[str, tuple[bytearray, ParsedPage]],
+            retries: int) -> ParsedPage:
+        """Fetch and parse one page, retrying only this page on errors.
+
+        An unchanged page (the same payload object) is not parsed again.
+        """
+        for attempt in range(retries + 1):
+            try:
+                payload = await self.client.async_get_payload(
+                    cache_control=CACHE_CONTROL_POLL,
+                    conditional=True,
+                    layer=layer)
+                break
+            except PolenMadridApiError as err:
+                if attempt == retries:
+                    raise
+                _LOGGER.debug("Retrying %s page: %s", layer.name, err)
+                await asyncio.sleep(
+                    API_PAGE_RETRY_DELAY.total_seconds() * (attempt + 1))
+
+        cached = previous.get(layer.name)
+        if cached is None or cached[0] is not payload:
+            cached = (payload, await async_add_profiled_job(
+                self.hass, self.profiler, parse_page, payload, provider))
+        pages[layer.name] = cached
+        return cached[1]
+
+    def _async_report_changes(self, changes: SnapshotDiff) -> None:
+        """Log catalog changes and fire their event."""
+        if not changes.catalog_changed:
+            return
+        _LOGGER.info(
+            "Pollen network changed: stations added %s, removed %s; pollen "
+            "types added %s, removed %s; %s threshold changes.",
+            list(changes.stations_added), list(changes.stations_removed),
+            list(changes.pollens_added), list(changes.pollens_removed),
+            len(changes.thresholds_changed))
+        self.hass.bus.async_fire(EVENT_CATALOG_CHANGED, changes.as_event())
+
+    def _async_update_stations(self, data: PolenMadridData) -> None:
+        """Keep the stations catalog and its repairs issues current.
+
+        A station is new the first time it is ever reported, not when it
+        comes back after leaving the feed, and stays announced until it is
+        selected or leaves again. Nothing is announced on the first update
+        of a new config entry.
+        """
+        current = {
+            station_id: records[0].get('location_name')
+            for station_id, records in data.by_station.items()}
+        before = (
+            dict(self.known_stations),
+            dict(self.announced_stations),
+            dict(self.retired_stations))
+        if self.known_stations:
+            self.announced_stations.update(
+                (station_id, name) for station_id, name in current.items()
+                if station_id not in self.known_stations)
+        self.known_stations.update(current)
+        self.announced_stations = {
+            station_id: name
+            for station_id, name in self.announced_stations.items()
+            if station_id in current and station_id not in self.selected_stations}
+        self.retired_stations.update(self.changes.stations_removed)
+        self.retired_stations = {
+            station_id: name
+            for station_id, name in self.retired_stations.items()
+            if station_id not in current}
+        self._async_update_stations_issue("new_stations", self.announced_stations)
+        self._async_update_stations_issue("stations_retired", self.retired_stations)
+        if self._stations_store is not None and before != (
+                self.known_stations,
+                self.announced_stations,
+                self.retired_stations):
+            self._stations_store.async_delay_save(
+                self._stations_data, STATIONS_SAVE_DELAY)
+
+    def _async_update_stations_issue(
+            self, issue_id: str, stations: dict[str, str]) -> None:
+        """Raise the repairs issue listing `stations`, or clear it."""
+        if not stations:
+            ir.async_delete_issue(self.hass, DOMAIN, issue_id)
+            return
+        ir.async_create_issue(
+            self.hass,
+            DOMAIN,
+            issue_id,
+            is_fixable=False,
+            severity=ir.IssueSeverity.WARNING,
+            translation_key=issue_id,
+            translation_placeholders={
+                "stations": ", ".join(
+                    f"{name} ({station_id})"
+                    for station_id, name in sorted(stations.items())),
+            },
+        )
+
+    def _async_report_schema_drift(self, report: ValidationReport) -> None:
+        """Raise or clear the repairs issue about upstream schema changes."""
+        if not report.schema_drift:
+            ir.async_delete_issue(self.hass, DOMAIN, "schema_drift")
+            return
+        _LOGGER.warning(
+            "Pollen API properties missing from every feature: %s",
+            report.missing_properties)
+        ir.async_create_issue(
+            self.hass,
+            DOMAIN,
+            "schema_drift",
+            is_fixable=False,
+            severity=ir.IssueSeverity.WARNING,
+            translation_key="schema_drift",
+            translation_placeholders={
+                "missing": ", ".join(report.missing_properties),
+                "unknown": ", ".join(report.unknown_properties) or "-",
+            },
+        )
+
+
+def build_air_quality_layer(payload: bytes) -> dict[str, dict]:
+    """Decode an air quality layer payload. Runs in the executor."""
+    return parse_air_quality_response(decode_payload(payload))
+
+
+class PolenMadridAirQualityCoordinator(
+        CoalescedRefreshMixin, DataUpdateCoordinator):
+    """Fetch the air quality layers next to the pollen layer.
+
+    Data is a dict of pollutant code -> {station_id: reading}. Every layer
+    is fetched concurrently through the pollen coordinator's client, which
+    shares one connection pool, and succeeds or fails on its own: a failing
+    layer keeps its last readings and is reported in `layer_errors`, and
+    only a failure of every layer fails the update.
+    """
+
+    def __init__(
+            self,
+            hass: HomeAssistant,
+            client: PolenMadridApiClient) -> None:
+        """Initialize."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_air_quality",
+            update_interval=SCAN_INTERVAL,
+            # Listeners are only called when a layer actually changed
+            always_update=False)
+        self.client = client
+        self.layer_errors: dict[str, str] = {}
+        self._payloads: dict[str, bytearray] = {}
+        self._init_refresh()
+
+    async def _async_fetch_data(self) -> dict[str, dict[str, dict]]:
+        """Fetch all air quality layers concurrently."""
+        codes = list(AIR_QUALITY_LAYERS)
+        results = await asyncio.gather(
+            *(self._async_fetch_layer(code) for code in codes),
+            return_exceptions=True)
+
+        previous = self.data or {}
+        data: dict[str, dict[str, dict]] = {}
+        self.layer_errors = {}
+        for code, result in zip(codes, results):
+            if isinstance(result, BaseException):
+                _LOGGER.warning(
+                    "Error fetching %s air quality data: %s", code, result)
+                self.layer_errors[code] = str(result)
+                if code in previous:
+                    data[code] = previous[code]
+                continue
+            data[code] = result
+
+        if len(self.layer_errors) == len(codes):
+            raise UpdateFailed(
+                f"Error fetching air quality data: {self.layer_errors}")
+        return data
+
+    async def _async_fetch_layer(self, code: str) -> dict[str, dict]:
+        """Fetch and parse one layer, reusing it when it did not change."""
+        payload = await self.client.async_get_payload(
+            cache_control=CACHE_CONTROL_POLL,
+            conditional=True,
+            layer=AIR_QUALITY_LAYERS[code])
+        if payload is self._payloads.get(code) and code in (self.data or {}):
+            return self.data[code]
+        readings = await self.hass.async_add_executor_job(
+            build_air_quality_layer, payload)
+        self._payloads[code] = payload
+        return readings
@@ -0,0 +1,74 @@
+"""Diagnostics support for Polen Madrid."""
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import PolenMadridDataUpdateCoordinator
+from .providers import CONF_PARAMS, CONF_PROVIDER_URL
+from .ratelimit import async_get_request_limiter
+
+# Provider URLs and query parameters may carry credentials or API keys
+TO_REDACT = {CONF_PROVIDER_URL, CONF_PARAMS}
+
+
+async def async_get_config_entry_diagnostics(
+        hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: PolenMadridDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    data = coordinator.data
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": async_redact_data(entry.options, TO_REDACT),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "records": len(data) if data else 0,
+            "stations": len(data.by_station) if data else 0,
+        },
+        "validation": data.validation.as_dict() if data else None,
+        "memory": asdict(data.memory) if data else None,
+        "refresh": asdict(coordinator.refresh_stats),
+        "transfer": asdict(coordinator.client.stats),
+        "rate_limit": asdict(async_get_request_limiter(hass).stats),
+        "air_quality": _air_quality_diagnostics(coordinator),
+        "providers": _provider_diagnostics(coordinator),
+        # Summary of the last update profiled by profile_next_update
+        "profile": coordinator.profile_summary,
+    }
+
+
+def _provider_diagnostics(
+        coordinator: PolenMadridDataUpdateCoordinator) -> dict[str, Any]:
+    """Return the state of each pollen provider."""
+    providers = {}
+    for provider in coordinator.providers:
+        part = coordinator.provider_data.get(provider.name)
+        providers[provider.name] = {
+            "records": len(part) if part else 0,
+            "validation": part.validation.as_dict() if part else None,
+            "error": coordinator.provider_errors.get(provider.name),
+        }
+    return providers
+
+
+def _air_quality_diagnostics(
+        coordinator: PolenMadridDataUpdateCoordinator) -> dict[str, Any] | None:
+    """Return the state of the air quality layers, if enabled."""
+    air_quality = coordinator.air_quality_coordinator
+    if air_quality is None:
+        return None
+    return {
+        "last_update_success": air_quality.last_update_success,
+        "stations": {
+            code: len(readings)
+            for code, readings in (air_quality.data or {}).items()},
+        "layer_errors": air_quality.layer_errors,
+    }
@@ -0,0 +1,50 @@
+"""Shared entity helpers for the Polen Madrid integration."""
+from __future__ import annotations
+
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN
+from .coordinator import PolenMadridDataUpdateCoordinator
+
+
+def station_device_info(station_id, record: dict) -> DeviceInfo:
+    """Return the device info of a station, built from one of its records.
+
+    Static station metadata belongs to the device (or the station's
+    diagnostic entities) rather than to every pollen sensor's state.
+    """
+    return DeviceInfo(
+        identifiers={(DOMAIN, station_id)},
+        name=f"Estación Polen {record.get('location_name')}",
+        manufacturer="Comunidad de Madrid",
+        model="Sensor de Polen",
+        serial_number=record.get('station_code'),
+    )
+
+
+class PolenMadridStationEntity(CoordinatorEntity):
+    """Base class for entities describing a whole station."""
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            record: dict) -> None:
+        """Initialize the entity from one of the station's records."""
+        super().__init__(coordinator)
+        self._station_id = str(record.get('station_id'))
+        self._location_name = record.get('location_name')
+        self._attr_device_info = station_device_info(
+            record.get('station_id'), record)
+
+    @property
+    def _records(self) -> list[dict]:
+        """Return the station's records from the coordinator data."""
+        if self.coordinator.data:
+            return self.coordinator.data.by_station.get(self._station_id, [])
+        return []
+
+    @property
+    def available(self) -> bool:
+        """Return True if the station is present in the coordinator data."""
+        return super().available and bool(self._records)
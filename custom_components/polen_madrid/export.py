@@ -0,0 +1,132 @@
+"""Streaming export of pollen readings to CSV or NDJSON files.
+
+Records flow through a generator pipeline (source -> de-duplication ->
+filters -> writer), so only one capture and one output row are held at a
+time besides the current snapshot. History comes from the raw responses
+retained by capture mode; columns are the record fields of FIELD_MAPPING.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import logging
+import os
+from collections.abc import Iterable, Iterator
+from datetime import date
+from itertools import chain
+from pathlib import Path
+
+import orjson
+
+from .capture import capture_base_layer, list_captures
+from .const import FIELD_MAPPING
+from .coordinator import build_data_from_payload
+from .helpers import measurement_day
+
+_LOGGER = logging.getLogger(__name__)
+
+EXPORT_DIRECTORY = "polen_madrid_exports"
+EXPORT_COLUMNS = list(dict.fromkeys(FIELD_MAPPING.values()))
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+def iter_capture_records(directory: Path | str) -> Iterator[dict]:
+    """Yield the records of every retained pollen capture, oldest first.
+
+    Each page of a paged response is its own capture.
+    """
+    for path in list_captures(directory):
+        if capture_base_layer(path) != "pollen":
+            continue
+        try:
+            with gzip.open(path, "rb") as file:
+                data = build_data_from_payload(file.read())
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Skipping unreadable capture %s: %s", path, err)
+            continue
+        yield from data.values()
+
+
+def unique_readings(records: Iterable[dict]) -> Iterator[dict]:
+    """Drop repeated readings of a station, pollen type and date."""
+    seen: set[tuple] = set()
+    for record in records:
+        key = (
+            str(record.get('station_id')),
+            record.get('pollen_code'),
+            str(record.get('measurement_date')))
+        if key in seen:
+            continue
+        seen.add(key)
+        yield record
+
+
+def filter_records(
+        records: Iterable[dict],
+        stations: list[str] | None = None,
+        start_date: date | None = None,
+        end_date: date | None = None) -> Iterator[dict]:
+    """Yield the records of the given stations and measurement days."""
+    stations = {str(station_id) for station_id in stations} if stations else None
+    for record in records:
+        if stations is not None and str(record.get('station_id')) not in stations:
+            continue
+        if start_date or end_date:
+            day = measurement_day(record)
+            if day is None or (start_date and day < start_date) or (
+                    end_date and day > end_date):
+                continue
+        yield record
+
+
+def write_records(
+        path: Path,
+        records: Iterable[dict],
+        columns: list[str],
+        export_format: str) -> int:
+    """Stream records to a file and return the number of rows written.
+
+    The file is written under a temporary name and renamed when complete,
+    so readers never see a partial export.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f".{path.name}.partial")
+    rows = 0
+    try:
+        with partial.open("w", encoding="utf-8", newline="") as file:
+            if export_format == "csv":
+                writer = csv.writer(file)
+                writer.writerow(columns)
+                for record in records:
+                    writer.writerow([record.get(column) for column in columns])
+                    rows += 1
+            else:
+                for record in records:
+                    file.write(orjson.dumps(
+                        {column: record.get(column) for column in columns},
+                        default=str).decode())
+                    file.write("\n")
+                    rows += 1
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return rows
+
+
+def export_readings(
+        path: Path,
+        snapshot: list[dict],
+        capture_directory: Path | str | None,
+        columns: list[str],
+        export_format: str,
+        stations: list[str] | None = None,
+        start_date: date | None = None,
+        end_date: date | None = None) -> int:
+    """Export the retained history and the snapshot. Runs in the executor."""
+    history = (
+        iter_capture_records(capture_directory) if capture_directory else ())
+    records = filter_records(
+        unique_readings(chain(history, snapshot)), stations, start_date, end_date)
+    rows = write_records(path, records, columns, export_format)
+    _LOGGER.debug("Exported %s pollen readings to %s.", rows, path)
+    return rows
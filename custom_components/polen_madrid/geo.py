@@ -0,0 +1,103 @@
+"""Coordinate helpers for Polen Madrid station positions.
+
+Station coordinates are published in ETRS89 / UTM zone 30N (EPSG:25830).
+ETRS89 and WGS84 differ by less than a metre, which is well below the
+precision needed to find the nearest pollen station.
+"""
+from __future__ import annotations
+
+import math
+
+_A = 6378137.0  # GRS80 / WGS84 semi-major axis
+_F = 1 / 298.257222101
+_E2 = _F * (2 - _F)
+_EP2 = _E2 / (1 - _E2)
+_K0 = 0.9996
+_FALSE_EASTING = 500000.0
+_UTM_ZONE = 30
+_CENTRAL_MERIDIAN = math.radians((_UTM_ZONE - 1) * 6 - 180 + 3)
+
+
+def wgs84_to_utm(latitude: float, longitude: float) -> tuple[float, float]:
+    """Convert WGS84 latitude/longitude to UTM zone 30N easting/northing."""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+
+    sin_lat = math.sin(lat)
+    cos_lat = math.cos(lat)
+    tan_lat = math.tan(lat)
+
+    n = _A / math.sqrt(1 - _E2 * sin_lat ** 2)
+    t = tan_lat ** 2
+    c = _EP2 * cos_lat ** 2
+    a = cos_lat * (lon - _CENTRAL_MERIDIAN)
+
+    m = _A * (
+        (1 - _E2 / 4 - 3 * _E2 ** 2 / 64 - 5 * _E2 ** 3 / 256) * lat
+        - (3 * _E2 / 8 + 3 * _E2 ** 2 / 32 + 45 * _E2 ** 3 / 1024)
+        * math.sin(2 * lat)
+        + (15 * _E2 ** 2 / 256 + 45 * _E2 ** 3 / 1024) * math.sin(4 * lat)
+        - (35 * _E2 ** 3 / 3072) * math.sin(6 * lat)
+    )
+
+    easting = _FALSE_EASTING + _K0 * n * (
+        a
+        + (1 - t + c) * a ** 3 / 6
+        + (5 - 18 * t + t ** 2 + 72 * c - 58 * _EP2) * a ** 5 / 120
+    )
+    northing = _K0 * (
+        m
+        + n * tan_lat * (
+            a ** 2 / 2
+            + (5 - t + 9 * c + 4 * c ** 2) * a ** 4 / 24
+            + (61 - 58 * t + t ** 2 + 600 * c - 330 * _EP2) * a ** 6 / 720
+        )
+    )
+    return easting, northing
+
+
+def record_utm_position(record: dict) -> tuple[float, float] | None:
+    """Return the (easting, northing) of a record, or None if unavailable."""
+    try:
+        return float(record['longitude_utm']), float(record['latitude_utm'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def utm_to_wgs84(easting: float, northing: float) -> tuple[float, float]:
+    """Convert UTM zone 30N easting/northing to WGS84 latitude/longitude."""
+    e1 = (1 - math.sqrt(1 - _E2)) / (1 + math.sqrt(1 - _E2))
+    m = northing / _K0
+    mu = m / (_A * (1 - _E2 / 4 - 3 * _E2 ** 2 / 64 - 5 * _E2 ** 3 / 256))
+
+    # Footpoint latitude
+    phi1 = (
+        mu
+        + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * math.sin(2 * mu)
+        + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * math.sin(4 * mu)
+        + (151 * e1 ** 3 / 96) * math.sin(6 * mu)
+        + (1097 * e1 ** 4 / 512) * math.sin(8 * mu)
+    )
+    sin_phi1 = math.sin(phi1)
+    cos_phi1 = math.cos(phi1)
+    tan_phi1 = math.tan(phi1)
+
+    n1 = _A / math.sqrt(1 - _E2 * sin_phi1 ** 2)
+    r1 = _A * (1 - _E2) / (1 - _E2 * sin_phi1 ** 2) ** 1.5
+    t1 = tan_phi1 ** 2
+    c1 = _EP2 * cos_phi1 ** 2
+    d = (easting - _FALSE_EASTING) / (n1 * _K0)
+
+    lat = phi1 - (n1 * tan_phi1 / r1) * (
+        d ** 2 / 2
+        - (5 + 3 * t1 + 10 * c1 - 4 * c1 ** 2 - 9 * _EP2) * d ** 4 / 24
+        + (61 + 90 * t1 + 298 * c1 + 45 * t1 ** 2 - 252 * _EP2 - 3 * c1 ** 2)
+        * d ** 6 / 720
+    )
+    lon = _CENTRAL_MERIDIAN + (
+        d
+        - (1 + 2 * t1 + c1) * d ** 3 / 6
+        + (5 - 2 * c1 + 28 * t1 - 3 * c1 ** 2 + 8 * _EP2 + 24 * t1 ** 2)
+        * d ** 5 / 120
+    ) / cos_phi1
+    return math.degrees(lat), math.degrees(lon)
@@ -0,0 +1,166 @@
+"""Regional pollen heat maps.
+
+Station values are interpolated with inverse distance weighting over a grid
+covering the polygon the WFS query is bounded by (API_DATA_PAYLOAD), and
+colored by the pollen type's medium/high thresholds. The grid, its polygon
+mask and its pixel coordinates are computed once; each rendering is a few
+vectorized numpy operations plus PNG encoding, and runs in the executor.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import struct
+import zlib
+from functools import lru_cache
+from urllib.parse import unquote
+
+from .const import API_DATA_PAYLOAD
+from .geo import record_utm_position
+
+# Width of the rendered image; the height follows the polygon's aspect
+HEAT_MAP_WIDTH = 320
+IDW_POWER = 2
+# RGB of the level colors at 0, the medium and the high threshold
+_COLOR_STOPS = ((46, 160, 67), (240, 200, 40), (215, 48, 39))
+_STATION_COLOR = (20, 20, 20, 255)
+
+
+def region_polygon() -> list[tuple[float, float]]:
+    """Return the UTM vertices of the polygon the WFS query is bounded by."""
+    pos_list = re.search(
+        r"<posList[^>]*>([^<]+)</posList>", unquote(API_DATA_PAYLOAD)).group(1)
+    values = [float(value) for value in pos_list.split()]
+    return list(zip(values[::2], values[1::2]))
+
+
+class HeatMapGrid:
+    """Pixel centers of the map and the mask of those inside the region."""
+
+    def __init__(
+            self,
+            polygon: list[tuple[float, float]],
+            width: int = HEAT_MAP_WIDTH) -> None:
+        """Precompute the grid geometry."""
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        vertices = np.asarray(polygon, dtype=float)
+        min_x, min_y = vertices.min(axis=0)
+        max_x, max_y = vertices.max(axis=0)
+        self.width = width
+        self.height = max(1, round(width * (max_y - min_y) / (max_x - min_x)))
+        self.min_x, self.max_y = min_x, max_y
+        self.cell_x = (max_x - min_x) / self.width
+        self.cell_y = (max_y - min_y) / self.height
+
+        xs = min_x + (np.arange(self.width) + 0.5) * self.cell_x
+        # Image rows go from north to south
+        ys = max_y - (np.arange(self.height) + 0.5) * self.cell_y
+        grid_x, grid_y = np.meshgrid(xs, ys)
+
+        # Even-odd rule, vectorized over all pixels for each polygon edge
+        inside = np.zeros(grid_x.shape, dtype=bool)
+        for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+            if y1 == y2:
+                continue
+            crosses = (y1 > grid_y) != (y2 > grid_y)
+            x_cross = x1 + (grid_y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (grid_x < x_cross)
+        self.mask = inside
+        self.points = np.column_stack((grid_x[inside], grid_y[inside]))
+
+    def pixel_of(self, x: float, y: float) -> tuple[int, int] | None:
+        """Return the (row, column) of a UTM position, if on the map."""
+        column = int((x - self.min_x) / self.cell_x)
+        row = int((self.max_y - y) / self.cell_y)
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return row, column
+        return None
+
+
+@lru_cache(maxsize=1)
+def region_grid() -> HeatMapGrid:
+    """Return the grid of the query region, built on first use."""
+    return HeatMapGrid(region_polygon())
+
+
+def heat_map_samples(records: list[dict]) -> tuple:
+    """Return the (x, y, value) samples and thresholds of a pollen type."""
+    samples = []
+    medium = high = None
+    for record in records:
+        position = record_utm_position(record)
+        try:
+            value = float(record.get('pollen_value'))
+        except (TypeError, ValueError):
+            continue
+        if position is None:
+            continue
+        samples.append((*position, value))
+        medium = medium or record.get('medium_threshold')
+        high = high or record.get('high_threshold')
+    return tuple(sorted(samples)), medium, high
+
+
+def samples_hash(samples: tuple) -> str:
+    """Return a hash of the inputs of a heat map."""
+    return hashlib.sha1(repr(samples).encode()).hexdigest()
+
+
+def _encode_png(rgba) -> bytes:
+    """Encode an RGBA uint8 array as PNG."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    height, width, _ = rgba.shape
+    # Filter type 0 (None) at the start of every scanline
+    raw = np.concatenate(
+        (np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)),
+        axis=1).tobytes()
+
+    def _chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data)))
+
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+        _chunk(b"IDAT", zlib.compress(raw, 6)),
+        _chunk(b"IEND", b""),
+    ))
+
+
+def render_heat_map(
+        grid: HeatMapGrid,
+        samples: tuple,
+        medium_threshold,
+        high_threshold) -> bytes:
+    """Render the PNG heat map of a pollen type. Runs in the executor."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    rgba = np.zeros((grid.height, grid.width, 4), dtype=np.uint8)
+    if samples:
+        stations = np.asarray(samples, dtype=float)
+        # (pixels, stations) distances, then the IDW weighted mean
+        distances = np.hypot(
+            grid.points[:, 0, None] - stations[None, :, 0],
+            grid.points[:, 1, None] - stations[None, :, 1])
+        weights = 1.0 / np.maximum(distances, 1.0) ** IDW_POWER
+        values = weights @ stations[:, 2] / weights.sum(axis=1)
+
+        medium = float(medium_threshold or 0) or 1.0
+        high = max(float(high_threshold or 0), medium + 1.0)
+        stops = np.array((0.0, medium, high))
+        colors = np.array(_COLOR_STOPS, dtype=float)
+        rgb = np.column_stack([
+            np.interp(values, stops, colors[:, channel])
+            for channel in range(3)])
+        rgba[grid.mask, :3] = rgb.astype(np.uint8)
+        rgba[grid.mask, 3] = 220
+
+        for x, y, _ in samples:
+            if (pixel := grid.pixel_of(x, y)) is not None:
+                row, column = pixel
+                rgba[max(row - 1, 0):row + 2,
+                     max(column - 1, 0):column + 2] = _STATION_COLOR
+    return _encode_png(rgba)
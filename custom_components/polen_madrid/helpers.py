@@ -0,0 +1,201 @@
+"""Parsing helpers for Polen Madrid API data.
+
+These helpers have no dependency on Home Assistant entities so they can be
+shared by the coordinator, the config flow and the platforms without
+pulling in any platform module.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+from .const import AIR_QUALITY_FIELD_MAPPING, FIELD_MAPPING, MEASUREMENT_TIME_ZONE
+
+_LOGGER = logging.getLogger(__name__)
+
+# Helper function from download_script.py
+
+
+def parse_api_response(json_data, field_mapping: dict[str, str] = FIELD_MAPPING):
+    """Parse the raw JSON data from the API into a structured list of records."""
+    features = json_data.get('features', [])
+    transformed_data = []
+    for feature in features:
+        properties = feature.get('properties', {})
+        # Let it be None if not present or null
+        geometry = feature.get('geometry')
+
+        # Safely get coordinates only if geometry is not None
+        coordinates = [None, None]
+        if geometry and isinstance(geometry, dict):
+            coordinates = geometry.get('coordinates', [None, None])
+
+        output_record = {}
+        for source_field, target_field in field_mapping.items():
+            if target_field == "coordinates_utm":
+                if coordinates and coordinates[0] is not None and coordinates[1] is not None:
+                    output_record[target_field] = (
+                        f"{coordinates[0]},{coordinates[1]}")
+                else:
+                    output_record[target_field] = None
+            elif source_field in properties:
+                output_record[target_field] = properties[source_field]
+            else:
+                output_record[target_field] = None
+        transformed_data.append(output_record)
+    transformed_data.sort(
+        key=lambda x: (
+            x.get('station_id'),
+            x.get('pollen_code')))
+    return transformed_data
+
+
+def parse_air_quality_response(json_data) -> dict[str, dict]:
+    """Parse an air quality layer into its latest reading per station.
+
+    The layers may carry several hourly readings of a station; only the one
+    with the newest measurement date is kept. Station positions are taken
+    from the point geometry, in the same UTM projection as the pollen
+    stations.
+    """
+    readings: dict[str, dict] = {}
+    for feature in json_data.get('features', []):
+        properties = feature.get('properties') or {}
+        record = {
+            target_field: properties.get(source_field)
+            for source_field, target_field in AIR_QUALITY_FIELD_MAPPING.items()
+        }
+        if record['station_id'] is None:
+            continue
+        record['station_id'] = str(record['station_id'])
+        record['location_name'] = fix_encoding_issue(record['location_name'])
+
+        geometry = feature.get('geometry')
+        coordinates = (
+            geometry.get('coordinates') if isinstance(geometry, dict)
+            else None)
+        try:
+            record['longitude_utm'] = float(coordinates[0])
+            record['latitude_utm'] = float(coordinates[1])
+        except (IndexError, TypeError, ValueError):
+            record['longitude_utm'] = record['latitude_utm'] = None
+
+        previous = readings.get(record['station_id'])
+        if previous is None or str(record['measurement_date'] or '') >= str(
+                previous['measurement_date'] or ''):
+            readings[record['station_id']] = record
+    return readings
+
+# Helper function from render_pollen_table.py
+
+
+def fix_encoding_issue(text):
+    """Fix potential encoding issues for text strings from the API."""
+    if isinstance(text, str):
+        try:
+            return text.encode('latin-1').decode('utf-8')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            return text
+    return text
+
+# Helper function from render_pollen_table.py
+
+
+def get_pollen_level_details(value, medium_threshold, high_threshold):
+    """Determine pollen level (Bajo, Medio, Alto) and descriptive text based on value and thresholds."""
+    try:
+        value = int(value)
+        medium_threshold = int(
+            medium_threshold if medium_threshold is not None else 0)
+        high_threshold = int(
+            high_threshold if high_threshold is not None else 0)
+    except (ValueError, TypeError):
+        _LOGGER.warning(
+            "Invalid threshold or value for get_pollen_level: val=%s, med=%s, high=%s",
+            value,
+            medium_threshold,
+            high_threshold,
+        )
+        return "Unknown", "Data N/A", "level-unknown"
+
+    if high_threshold > 0 and value >= high_threshold:
+        return "Alto", f"Alto (>= {high_threshold})", "level-alto"
+    if medium_threshold > 0 and value >= medium_threshold:
+        return "Medio", f"Medio (>= {medium_threshold})", "level-medio"
+
+    threshold_text = f"< {medium_threshold}" if medium_threshold > 0 else ""
+    return "Bajo", f"Bajo ({threshold_text})", "level-bajo"
+
+
+def serialize_reading(record: dict) -> dict:
+    """Return the service and websocket representation of a reading."""
+    level_name, _, _ = get_pollen_level_details(
+        record.get('pollen_value'),
+        record.get('medium_threshold'),
+        record.get('high_threshold'))
+    return {
+        'station_id': str(record.get('station_id')),
+        'station_code': record.get('station_code'),
+        'location_name': record.get('location_name'),
+        'pollen_code': record.get('pollen_code'),
+        'pollen_type': record.get('pollen_type'),
+        'pollen_value': record.get('pollen_value'),
+        'pollen_level': level_name,
+        'medium_threshold': record.get('medium_threshold'),
+        'high_threshold': record.get('high_threshold'),
+        'measurement_date': record.get('measurement_date'),
+    }
+
+
+def parse_measurement_day(value) -> date | None:
+    """Return the calendar day of a measurement date as sent by the API."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)):
+        # WFS services may encode dates as epoch milliseconds
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).date()
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def parse_measurement_datetime(value) -> datetime | None:
+    """Return a measurement date as sent by the API as an aware datetime.
+
+    Offsets sent by the API are kept, so the calendar day is the one the
+    API reports. Dates without an offset are local to Madrid.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, (int, float)):
+        # WFS services may encode dates as epoch milliseconds
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo(MEASUREMENT_TIME_ZONE))
+    return parsed
+
+
+def measurement_day(record: dict) -> date | None:
+    """Return the calendar day of a record's measurement.
+
+    Uses the datetime parsed during ingestion when the record has one.
+    """
+    measured_at = record.get('measured_at')
+    if measured_at is not None:
+        return measured_at.date()
+    return parse_measurement_day(record.get('measurement_date'))
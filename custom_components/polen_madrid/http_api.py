@@ -0,0 +1,158 @@
+"""HTTP API for the Polen Madrid integration.
+
+`/api/polen_madrid/stations.geojson` serves a GeoJSON FeatureCollection of
+the stations, at their WGS84 positions, with the current reading of each
+pollen type. The document is serialized and gzip-compressed once per
+coordinator update, on the first request after it, and served from those
+buffers with a strong ETag, so polling clients mostly get 304 responses.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any
+
+from aiohttp import hdrs, web
+from aiohttp.helpers import ETag
+from homeassistant.components.http import HomeAssistantView
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.json import json_bytes
+
+from .const import DOMAIN
+from .coordinator import PolenMadridData, PolenMadridDataUpdateCoordinator
+from .geo import record_utm_position, utm_to_wgs84
+from .helpers import serialize_reading
+
+_LOGGER = logging.getLogger(__name__)
+
+GEOJSON_URL = f"/api/{DOMAIN}/stations.geojson"
+GEOJSON_CONTENT_TYPE = "application/geo+json"
+# Clients may keep the document but must revalidate it on every use
+GEOJSON_CACHE_CONTROL = "private, no-cache"
+
+
+def build_stations_geojson(data: PolenMadridData | None) -> dict[str, Any]:
+    """Return the stations of the readings as a GeoJSON FeatureCollection.
+
+    Stations are sorted by id, so the same readings always give the same
+    document.
+    """
+    features = []
+    for station_id in sorted((data.by_station if data else {})):
+        records = data.by_station[station_id]
+        position = next(
+            (position for record in records
+             if (position := record_utm_position(record)) is not None),
+            None)
+        geometry = None
+        if position is not None:
+            latitude, longitude = utm_to_wgs84(*position)
+            geometry = {
+                "type": "Point",
+                "coordinates": [round(longitude, 6), round(latitude, 6)],
+            }
+        first = records[0]
+        newest = data.newest_by_station.get(station_id)
+        features.append({
+            "type": "Feature",
+            "id": station_id,
+            "geometry": geometry,
+            "properties": {
+                "station_id": station_id,
+                "station_code": first.get('station_code'),
+                "location_name": first.get('location_name'),
+                "measured_at": newest.isoformat() if newest else None,
+                "pollens": {
+                    reading['pollen_code']: {
+                        "pollen_type": reading['pollen_type'],
+                        "pollen_value": reading['pollen_value'],
+                        "pollen_level": reading['pollen_level'],
+                        "measurement_date": reading['measurement_date'],
+                    }
+                    for reading in sorted(
+                        map(serialize_reading, records),
+                        key=lambda reading: str(reading['pollen_code']))
+                },
+            },
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+@dataclass(frozen=True)
+class GeoJsonDocument:
+    """The serialized GeoJSON of one coordinator update."""
+
+    data: PolenMadridData | None
+    body: bytes
+    gzip_body: bytes
+    etag: str
+
+    @classmethod
+    def build(cls, data: PolenMadridData | None) -> GeoJsonDocument:
+        """Serialize and compress the stations of `data`."""
+        body = json_bytes(build_stations_geojson(data))
+        # No timestamp in the gzip header, so equal documents compress equally
+        gzip_body = gzip.compress(body, mtime=0)
+        return cls(data, body, gzip_body, hashlib.sha256(body).hexdigest()[:32])
+
+
+@callback
+def _async_get_document(
+        coordinator: PolenMadridDataUpdateCoordinator) -> GeoJsonDocument:
+    """Return the document of the coordinator's data, building it once."""
+    document = coordinator.geojson_document
+    if document is None or document.data is not coordinator.data:
+        document = coordinator.geojson_document = GeoJsonDocument.build(
+            coordinator.data)
+        _LOGGER.debug(
+            "Serialized the stations GeoJSON: %s bytes, %s compressed.",
+            len(document.body), len(document.gzip_body))
+    return document
+
+
+class PollenGeoJsonView(HomeAssistantView):
+    """Serve the stations and their readings as GeoJSON."""
+
+    url = GEOJSON_URL
+    name = f"api:{DOMAIN}:stations_geojson"
+    requires_auth = True
+
+    async def get(self, request: web.Request) -> web.Response:
+        """Answer from the cached document, or with 304 if unchanged."""
+        hass: HomeAssistant = request.app["hass"]
+        coordinators = hass.data.get(DOMAIN, {})
+        if not coordinators:
+            return self.json_message(
+                "Polen Madrid is not set up.", HTTPStatus.NOT_FOUND)
+        # Only a single config entry is allowed for this integration.
+        document = _async_get_document(next(iter(coordinators.values())))
+
+        compressed = "gzip" in request.headers.get(hdrs.ACCEPT_ENCODING, "")
+        # Each representation has its own strong ETag
+        etag = ETag(f"{document.etag}-gzip" if compressed else document.etag)
+        headers = {
+            hdrs.CACHE_CONTROL: GEOJSON_CACHE_CONTROL,
+            hdrs.VARY: hdrs.ACCEPT_ENCODING,
+        }
+        if any(match.value in (etag.value, "*")
+               for match in request.if_none_match or ()):
+            response = web.Response(
+                status=HTTPStatus.NOT_MODIFIED, headers=headers)
+        else:
+            if compressed:
+                headers[hdrs.CONTENT_ENCODING] = "gzip"
+            response = web.Response(
+                body=document.gzip_body if compressed else document.body,
+                content_type=GEOJSON_CONTENT_TYPE,
+                headers=headers)
+        response.etag = etag
+        return response
+
+
+@callback
+def async_setup_http_api(hass: HomeAssistant) -> None:
+    """Register the HTTP views."""
+    hass.http.register_view(PollenGeoJsonView())
@@ -0,0 +1,88 @@
+"""Image platform for Polen Madrid regional heat maps."""
+from __future__ import annotations
+
+import logging
+
+from homeassistant.components.image import ImageEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
+
+from .const import CONF_HEAT_MAPS, DOMAIN
+from .coordinator import PolenMadridDataUpdateCoordinator
+from .heatmap import heat_map_samples, region_grid, render_heat_map, samples_hash
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up a heat map per selected pollen type."""
+    coordinator: PolenMadridDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    pollen_codes = entry.options.get(CONF_HEAT_MAPS) or []
+    if not pollen_codes or not coordinator.data:
+        return
+
+    async_add_entities(
+        PolenMadridHeatMapImage(coordinator, pollen_code, records[0])
+        for pollen_code in pollen_codes
+        if (records := coordinator.data.by_pollen.get(pollen_code)))
+
+
+class PolenMadridHeatMapImage(CoordinatorEntity, ImageEntity):
+    """Heat map of a pollen type interpolated over the whole network.
+
+    The PNG is rendered lazily, in the executor, on the first request after
+    the readings of its pollen type changed; until then the cached image is
+    served.
+    """
+
+    _attr_content_type = "image/png"
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            pollen_code: str,
+            record: dict) -> None:
+        """Initialize the image."""
+        CoordinatorEntity.__init__(self, coordinator)
+        ImageEntity.__init__(self, coordinator.hass)
+        self._pollen_code = pollen_code
+        self._attr_unique_id = f"{DOMAIN}_heat_map_{pollen_code}"
+        self._attr_name = f"Polen {record.get('pollen_type')} - Mapa"
+        self._samples_hash: str | None = None
+        self._image: bytes | None = None
+        self._update_samples()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Invalidate the image if the readings of its pollen type changed."""
+        self._update_samples()
+        super()._handle_coordinator_update()
+
+    def _update_samples(self) -> None:
+        data = self.coordinator.data
+        records = data.by_pollen.get(self._pollen_code, []) if data else []
+        self._samples = heat_map_samples(records)
+        digest = samples_hash(self._samples)
+        if digest != self._samples_hash:
+            self._samples_hash = digest
+            self._image = None
+            self._attr_image_last_updated = dt_util.utcnow()
+
+    async def async_image(self) -> bytes | None:
+        """Return the heat map, rendering it if the readings changed."""
+        if self._image is None:
+            samples_hash_at_start = self._samples_hash
+            samples = self._samples
+            image = await self.hass.async_add_executor_job(
+                lambda: render_heat_map(region_grid(), *samples))
+            if samples_hash_at_start == self._samples_hash:
+                self._image = image
+            return image
+        return self._image
@@ -0,0 +1,103 @@
+"""Import Polen Madrid readings into the recorder's long-term statistics.
+
+Readings change once a day, so besides the statistics the recorder
+compiles from the sensors' hourly states, one external statistics point is
+written per (station_id, pollen_code) and measurement day, dated by the
+measurement rather than by when it was polled.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+from homeassistant.util import slugify
+
+from .const import DOMAIN
+from .coordinator import PolenMadridDataUpdateCoordinator
+from .helpers import measurement_day
+
+_LOGGER = logging.getLogger(__name__)
+
+UNIT_OF_MEASUREMENT = "g/m³"
+
+
+def statistic_id_for(station_id, pollen_code: str) -> str:
+    """Return the external statistic id of a station and pollen type."""
+    return f"{DOMAIN}:{slugify(f'{station_id}_{pollen_code}')}"
+
+
+class PolenMadridStatisticsImporter:
+    """Write one statistics point per reading and measurement day."""
+
+    def __init__(
+            self,
+            hass: HomeAssistant,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            stations: list[str]) -> None:
+        """Initialize the importer."""
+        self._hass = hass
+        self._coordinator = coordinator
+        self._stations = [str(station_id) for station_id in stations]
+        # Last measurement day imported per statistic id. Re-polls of the
+        # same day are skipped; after a restart the recorder upserts the
+        # point for (statistic_id, start), so re-importing is harmless.
+        self._imported: dict[str, date] = {}
+
+    @callback
+    def async_import(self) -> None:
+        """Import the readings of the latest coordinator update."""
+        data = self._coordinator.data
+        if not data or "recorder" not in self._hass.config.components:
+            return
+
+        # The recorder is only imported once it is known to be loaded
+        from homeassistant.components.recorder.models import (  # pylint: disable=import-outside-toplevel
+            StatisticData,
+            StatisticMetaData,
+        )
+        from homeassistant.components.recorder.statistics import (  # pylint: disable=import-outside-toplevel
+            async_add_external_statistics,
+        )
+
+        batch = []
+        for station_id in self._stations:
+            for record in data.by_station.get(station_id, []):
+                day = measurement_day(record)
+                try:
+                    value = float(record.get('pollen_value'))
+                except (TypeError, ValueError):
+                    continue
+                statistic_id = statistic_id_for(
+                    station_id, record.get('pollen_code'))
+                if day is None or self._imported.get(statistic_id) == day:
+                    continue
+
+                metadata = StatisticMetaData(
+                    has_mean=True,
+                    has_sum=False,
+                    name=(
+                        f"Polen {record.get('location_name')} - "
+                        f"{record.get('pollen_type')}"),
+                    source=DOMAIN,
+                    statistic_id=statistic_id,
+                    unit_of_measurement=UNIT_OF_MEASUREMENT,
+                )
+                point = StatisticData(
+                    start=dt_util.start_of_local_day(day),
+                    mean=value,
+                    min=value,
+                    max=value,
+                )
+                batch.append((statistic_id, day, metadata, point))
+
+        if not batch:
+            return
+
+        # All points are queued in the same loop iteration, so the recorder
+        # commits them together in its next batch.
+        for statistic_id, day, metadata, point in batch:
+            async_add_external_statistics(self._hass, metadata, [point])
+            self._imported[statistic_id] = day
+        _LOGGER.debug("Queued %s pollen statistics points.", len(batch))
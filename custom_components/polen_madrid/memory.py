@@ -0,0 +1,74 @@
+"""Memory accounting of coordinator refreshes.
+
+With debug logging enabled for the integration, the peak memory allocated
+while a payload is processed is measured with tracemalloc. Otherwise only
+cheap estimates are kept: the payload size and the size of the resulting
+records, extrapolated from a sample.
+"""
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+_LOGGER = logging.getLogger(__name__)
+
+# Records measured to extrapolate the size of the whole dataset
+SIZE_SAMPLE = 20
+# tracemalloc is process-wide: concurrent jobs take turns measuring
+_TRACKING_LOCK = threading.Lock()
+
+
+@dataclass
+class MemoryStats:
+    """Memory used by one refresh."""
+
+    payload_bytes: int = 0
+    records: int = 0
+    estimated_data_bytes: int = 0
+    # Only measured in debug mode
+    peak_bytes: int | None = None
+
+
+def estimate_records_size(records: list[dict]) -> int:
+    """Estimate the memory held by a list of flat record dicts."""
+    if not records:
+        return 0
+    sample = records[:SIZE_SAMPLE]
+    sampled = sum(
+        sys.getsizeof(record) + sum(
+            sys.getsizeof(value) for value in record.values())
+        for record in sample)
+    return sampled * len(records) // len(sample)
+
+
+@contextmanager
+def track_peak(stats: MemoryStats, enabled: bool):
+    """Record the peak allocation of the block in `stats` when enabled.
+
+    tracemalloc slows allocations down noticeably, so it is only started
+    for the duration of the block, and only if it was not already running.
+    Its peak and its tracing are shared by every thread, so blocks of
+    concurrent executor jobs (providers, pages) run one at a time.
+    """
+    if not enabled:
+        yield
+        return
+    with _TRACKING_LOCK:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            stats.peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+            _LOGGER.debug(
+                "Refresh peak allocation: %.1f MB for a %.1f MB payload.",
+                stats.peak_bytes / 1e6, stats.payload_bytes / 1e6)
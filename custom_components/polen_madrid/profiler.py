@@ -0,0 +1,135 @@
+"""On-demand profiling of one coordinator update.
+
+The `profile_next_update` service arms an UpdateProfiler on the pollen
+coordinator. The next update then runs with cProfile enabled, covering
+the event loop thread (fetch scheduling, entity fan-out) and the executor
+jobs scheduled through async_add_profiled_job (HTTP fetch, decoding,
+parsing and the keyed-structure build). The statistics are written to
+PROFILE_DIRECTORY with a text summary of the top functions.
+
+From Python 3.12, cProfile uses the process-wide sys.monitoring profiler:
+a single Profile sees every thread, and a second one cannot be enabled
+while it runs. The update's Profile then covers the executor jobs too.
+Before 3.12, profiling hooks are per thread, so each job is run under its
+own Profile and the statistics are merged.
+
+Nothing is profiled while no profiler is armed: jobs are scheduled as
+plain executor jobs and no profiling hook is installed.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+PROFILE_DIRECTORY = "polen_madrid_profiles"
+DEFAULT_PROFILE_TOP = 30
+# One process-wide profiler slot (sys.monitoring) instead of per-thread hooks
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class UpdateProfiler:
+    """Profile of one update, across the event loop and executor threads.
+
+    Used as a context manager around the update on the event loop; other
+    tasks and threads running meanwhile are profiled as well.
+    """
+
+    def __init__(self, directory: Path | str, top: int = DEFAULT_PROFILE_TOP) -> None:
+        """Initialize the profiler, writing to `directory`."""
+        self.directory = Path(directory)
+        self.top = top
+        self._loop_profile = cProfile.Profile()
+        self._profiles = [self._loop_profile]
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._started: float | None = None
+        self._duration = 0.0
+
+    def __enter__(self) -> UpdateProfiler:
+        self._started = time.perf_counter()
+        self._loop_profile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._loop_profile.disable()
+        self._duration = time.perf_counter() - self._started
+
+    def runcall(self, func: Callable, *args) -> Any:
+        """Run an executor job, profiled by the update's Profile or its own."""
+        with self._lock:
+            self._jobs += 1
+            if PROFILES_ALL_THREADS:
+                profile = None
+            else:
+                profile = cProfile.Profile()
+                self._profiles.append(profile)
+        if profile is None:
+            return func(*args)
+        return profile.runcall(func, *args)
+
+    def write(self) -> dict[str, Any]:
+        """Write the stats and their summary and return the summary.
+
+        Does I/O: runs in the executor.
+        """
+        stats = pstats.Stats(self._loop_profile)
+        with self._lock:
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"update_{dt_util.now():%Y%m%d_%H%M%S}"
+        stats_file = self.directory / f"{name}.prof"
+        summary_file = self.directory / f"{name}.txt"
+        stats.dump_stats(stats_file)
+        text = io.StringIO()
+        stats.stream = text
+        stats.print_stats(self.top)
+        summary_file.write_text(text.getvalue(), encoding="utf-8")
+
+        top = []
+        for key in stats.fcn_list[:self.top]:
+            file, line, function = key
+            _, calls, total_time, cumulative_time, _ = stats.stats[key]
+            top.append({
+                "function": f"{os.path.basename(file)}:{line}({function})",
+                "calls": calls,
+                "total_time": round(total_time, 6),
+                "cumulative_time": round(cumulative_time, 6),
+            })
+        summary = {
+            "stats_file": str(stats_file),
+            "summary_file": str(summary_file),
+            "duration": round(self._duration, 4),
+            "executor_jobs": self._jobs,
+            "top": top,
+        }
+        _LOGGER.info(
+            "Profiled a %.2f s update to %s.", self._duration, stats_file)
+        return summary
+
+
+def async_add_profiled_job(
+        hass: HomeAssistant,
+        profiler: UpdateProfiler | None,
+        func: Callable,
+        *args):
+    """Add an executor job, profiled if a profiler is active."""
+    if profiler is None:
+        return hass.async_add_executor_job(func, *args)
+    return hass.async_add_executor_job(profiler.runcall, func, *args)
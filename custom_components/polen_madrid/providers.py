@@ -0,0 +1,155 @@
+"""Pollen data providers.
+
+A provider describes one pollen source through the steps of ingestion:
+
+* query builder: `layer`, the WFS GetFeature request (URL and POST body)
+* transport: the coordinator's shared PolenMadridApiClient, so every
+  provider uses the same connection pool, request budget and conditional
+  request cache, keyed by the provider's layer name
+* field mapper: `field_mapping`, source property -> record field, used by
+  parse_api_response and compiled into the provider's FeatureValidator
+* normalizer: `normalize`, applied to every parsed record
+
+The Comunidad de Madrid is the built-in provider. Other WFS services that
+serve GeoJSON are added with WfsProvider from the `providers` option.
+"""
+from __future__ import annotations
+
+from urllib.parse import urlencode
+
+import voluptuous as vol
+
+from .api import AIR_QUALITY_LAYERS, POLLEN_LAYER, WfsLayer, key_sort_by
+from .const import FIELD_MAPPING
+from .helpers import fix_encoding_issue
+from .validation import DEFAULT_VALIDATOR, FIELD_RULES, FeatureValidator
+
+CONF_PROVIDER_ID = "id"
+CONF_PROVIDER_URL = "url"
+CONF_TYPE_NAME = "type_name"
+CONF_FIELD_MAPPING = "field_mapping"
+CONF_SRS_NAME = "srs_name"
+CONF_PARAMS = "params"
+CONF_PAGE_SIZE = "page_size"
+
+# Heat maps and nearest-station lookups use the Madrid stations' projection
+DEFAULT_SRS_NAME = "EPSG:25830"
+RECORD_FIELDS = frozenset(FIELD_MAPPING.values())
+REQUIRED_FIELDS = frozenset(
+    target for target, (_, required, _) in FIELD_RULES.items() if required)
+# Layer names already used by the built-in layers
+RESERVED_IDS = frozenset({POLLEN_LAYER.name, *AIR_QUALITY_LAYERS})
+
+
+def _field_mapping(value) -> dict[str, str]:
+    """Validate a source property -> record field mapping."""
+    mapping = vol.Schema({str: vol.In(sorted(RECORD_FIELDS))})(value)
+    if missing := REQUIRED_FIELDS - set(mapping.values()):
+        raise vol.Invalid(f"field_mapping must map {', '.join(sorted(missing))}")
+    return mapping
+
+
+PROVIDER_SCHEMA = vol.Schema({
+    vol.Required(CONF_PROVIDER_ID): vol.All(
+        str, vol.Match(r"^[a-z0-9]+$"), vol.NotIn(RESERVED_IDS)),
+    vol.Required(CONF_PROVIDER_URL): vol.Url(),
+    vol.Required(CONF_TYPE_NAME): str,
+    vol.Required(CONF_FIELD_MAPPING): _field_mapping,
+    vol.Optional(CONF_SRS_NAME, default=DEFAULT_SRS_NAME): str,
+    vol.Optional(CONF_PARAMS, default={}): {str: vol.Coerce(str)},
+    # Features per WFS 2.0 page; without it the layer is fetched at once
+    vol.Optional(CONF_PAGE_SIZE): vol.All(int, vol.Range(min=1)),
+})
+
+
+def _unique_ids(providers: list[dict]) -> list[dict]:
+    ids = [provider[CONF_PROVIDER_ID] for provider in providers]
+    if len(ids) != len(set(ids)):
+        raise vol.Invalid("provider ids must be unique")
+    return providers
+
+
+PROVIDERS_SCHEMA = vol.All([PROVIDER_SCHEMA], _unique_ids)
+
+
+class PollenProvider:
+    """A source of pollen readings."""
+
+    layer: WfsLayer
+    field_mapping: dict[str, str]
+    validator: FeatureValidator
+
+    @property
+    def name(self) -> str:
+        """Return the provider name, also the name of its layer."""
+        return self.layer.name
+
+    def normalize(self, record: dict) -> dict:
+        """Normalize a parsed record in place and return it."""
+        return record
+
+
+class MadridProvider(PollenProvider):
+    """The Comunidad de Madrid pollen network."""
+
+    layer = POLLEN_LAYER
+    field_mapping = FIELD_MAPPING
+    validator = DEFAULT_VALIDATOR
+
+    def normalize(self, record: dict) -> dict:
+        """Fix the text fields the service sends double encoded."""
+        if record.get('location_name'):
+            record['location_name'] = fix_encoding_issue(
+                record['location_name'])
+        if record.get('pollen_type'):
+            record['pollen_type'] = fix_encoding_issue(record['pollen_type'])
+        return record
+
+
+class WfsProvider(PollenProvider):
+    """A WFS 2.0 layer served as GeoJSON, described by its configuration.
+
+    Station ids are prefixed with the provider id, so they cannot collide
+    with the stations of other providers.
+    """
+
+    def __init__(self, config: dict) -> None:
+        """Initialize the provider from a validated PROVIDER_SCHEMA entry."""
+        self.provider_id = config[CONF_PROVIDER_ID]
+        query = urlencode({
+            "service": "WFS",
+            "version": "2.0.0",
+            "request": "GetFeature",
+            "typeNames": config[CONF_TYPE_NAME],
+        })
+        separator = "&" if "?" in config[CONF_PROVIDER_URL] else "?"
+        self.layer = WfsLayer(
+            self.provider_id,
+            f"{config[CONF_PROVIDER_URL]}{separator}{query}",
+            urlencode({
+                "outputFormat": "application/json",
+                "srsName": config[CONF_SRS_NAME],
+                **config[CONF_PARAMS],
+            }),
+            config.get(CONF_PAGE_SIZE),
+            key_sort_by(config[CONF_FIELD_MAPPING]))
+        # Positions come from the point geometry, as for Madrid
+        self.field_mapping = {
+            **config[CONF_FIELD_MAPPING], "coordinates": "coordinates_utm"}
+        self.validator = FeatureValidator(self.field_mapping)
+
+    def normalize(self, record: dict) -> dict:
+        """Namespace the station id with the provider id."""
+        record['station_id'] = f"{self.provider_id}_{record['station_id']}"
+        return record
+
+
+MADRID_PROVIDER = MadridProvider()
+
+
+def providers_from_options(options: list[dict] | None) -> list[PollenProvider]:
+    """Return the Madrid provider followed by the configured ones."""
+    return [
+        MADRID_PROVIDER,
+        *(WfsProvider(config) for config in PROVIDERS_SCHEMA(options or [])),
+    ]
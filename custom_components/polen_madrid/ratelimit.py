@@ -0,0 +1,102 @@
+"""Domain-wide request budget for the Comunidad de Madrid geoserver.
+
+Every API client of the integration (coordinators, config and options
+flows, services) draws from the same token bucket and concurrency cap, so
+misbehaving automations cannot spam the upstream server.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    API_POOL_SIZE,
+    API_REQUEST_BURST,
+    API_REQUEST_REFILL,
+    DOMAIN,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_REQUEST_LIMITER = f"{DOMAIN}_request_limiter"
+
+
+@dataclass
+class ThrottleStats:
+    """Throttle events of the request limiter."""
+
+    granted: int = 0
+    served_from_cache: int = 0
+    queued: int = 0
+    rejected: int = 0
+
+
+class RequestLimiter:
+    """Token bucket with a cap on concurrent requests."""
+
+    def __init__(
+            self,
+            burst: int = API_REQUEST_BURST,
+            refill_seconds: float = API_REQUEST_REFILL.total_seconds(),
+            concurrency: int = API_POOL_SIZE) -> None:
+        """Initialize a full bucket."""
+        self._burst = burst
+        self._refill_seconds = refill_seconds
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.concurrency = asyncio.Semaphore(concurrency)
+        self.stats = ThrottleStats()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst,
+            self._tokens + (now - self._updated) / self._refill_seconds)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.stats.granted += 1
+            return True
+        return False
+
+    async def async_acquire(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a token.
+
+        Callers queue in arrival order: each one reserves the next token to
+        be refilled, leaving the bucket in debt, and waits until it
+        arrives. A caller whose token would arrive after `timeout` is
+        rejected at once.
+        """
+        self.stats.queued += 1
+        self._refill()
+        wait = (1 - self._tokens) * self._refill_seconds
+        if wait > timeout:
+            self.stats.rejected += 1
+            return False
+        self._tokens -= 1
+        if wait > 0:
+            _LOGGER.debug("Request budget exhausted, waiting %.1f s.", wait)
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Give the reserved token back to the callers behind
+                self._tokens += 1
+                raise
+        self.stats.granted += 1
+        return True
+
+
+@callback
+def async_get_request_limiter(hass: HomeAssistant) -> RequestLimiter:
+    """Return the request limiter shared by the whole integration."""
+    if (limiter := hass.data.get(DATA_REQUEST_LIMITER)) is None:
+        limiter = hass.data[DATA_REQUEST_LIMITER] = RequestLimiter()
+    return limiter
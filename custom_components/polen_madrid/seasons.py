@@ -0,0 +1,208 @@
+"""Pollen season tracking for the Polen Madrid calendar.
+
+A season span is a run of consecutive measurement days on which a pollen
+type stayed at the same (Medio or Alto) level at one station. Spans are
+maintained incrementally as new measurement days arrive and are stored in
+a per-station interval index to answer calendar range queries. Closed
+spans are kept for SEASON_RETENTION_YEARS pollen seasons.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .helpers import measurement_day
+
+SEASON_LEVELS = ("Medio", "Alto")
+# Seasons are yearly: spans ended this long before a newly closed one of
+# the same station are dropped
+SEASON_RETENTION_YEARS = 5
+SEASON_RETENTION = timedelta(days=365 * SEASON_RETENTION_YEARS)
+
+STORAGE_VERSION = 1
+
+
+def seasons_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Return the store of a config entry's season spans."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.seasons.{entry_id}")
+
+
+@dataclass
+class PollenSpan:
+    """A run of days at the same level for one station and pollen type."""
+
+    station_id: str
+    pollen_code: str
+    pollen_type: str
+    level: str
+    start: date
+    end: date  # inclusive
+
+    @property
+    def days(self) -> int:
+        """Return the number of days covered by the span."""
+        return (self.end - self.start).days + 1
+
+    def as_dict(self) -> dict:
+        """Return a JSON-serializable representation."""
+        data = asdict(self)
+        data['start'] = self.start.isoformat()
+        data['end'] = self.end.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> PollenSpan:
+        """Create a span from its serialized representation."""
+        return cls(
+            station_id=data['station_id'],
+            pollen_code=data['pollen_code'],
+            pollen_type=data['pollen_type'],
+            level=data['level'],
+            start=date.fromisoformat(data['start']),
+            end=date.fromisoformat(data['end']),
+        )
+
+
+class SpanIndex:
+    """Interval index of closed spans, sorted by start day.
+
+    Lookups bisect on the start day, bounded by the longest span stored,
+    so a range query only visits spans that can overlap the range.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty index."""
+        self._starts: list[date] = []
+        self._spans: list[PollenSpan] = []
+        self._max_days = 0
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def add(self, span: PollenSpan) -> None:
+        """Insert a closed span."""
+        position = bisect_right(self._starts, span.start)
+        self._starts.insert(position, span.start)
+        self._spans.insert(position, span)
+        self._max_days = max(self._max_days, span.days)
+
+    def prune(self, before: date) -> int:
+        """Drop the spans that ended before `before`; return how many."""
+        kept = [span for span in self._spans if span.end >= before]
+        removed = len(self._spans) - len(kept)
+        if removed:
+            self._spans = kept
+            self._starts = [span.start for span in kept]
+            self._max_days = max((span.days for span in kept), default=0)
+        return removed
+
+    def overlapping(self, start: date, end: date) -> list[PollenSpan]:
+        """Return the spans overlapping the inclusive range [start, end]."""
+        low = bisect_left(
+            self._starts, start - timedelta(days=self._max_days))
+        high = bisect_right(self._starts, end)
+        return [
+            span for span in self._spans[low:high] if span.end >= start]
+
+
+class PollenSeasonTracker:
+    """Maintain season spans from successive coordinator updates."""
+
+    def __init__(self) -> None:
+        """Initialize the tracker."""
+        self._open: dict[tuple[str, str], PollenSpan] = {}
+        # Last measurement day seen per (station, pollen) to ignore re-polls
+        self._last_day: dict[tuple[str, str], date] = {}
+        self._closed: dict[str, SpanIndex] = {}
+
+    def update(self, record: dict, level: str) -> bool:
+        """Feed one reading. Returns True if the spans changed."""
+        day = measurement_day(record)
+        if day is None:
+            return False
+        station_id = str(record.get('station_id'))
+        pollen_code = record.get('pollen_code')
+        key = (station_id, pollen_code)
+
+        last_day = self._last_day.get(key)
+        if last_day is not None and day <= last_day:
+            # Same measurement seen again on a later poll
+            return False
+        self._last_day[key] = day
+
+        span = self._open.get(key)
+        if span is not None:
+            if level == span.level and day == span.end + timedelta(days=1):
+                span.end = day
+                return True
+            self._close(key)
+
+        if level in SEASON_LEVELS:
+            self._open[key] = PollenSpan(
+                station_id=station_id,
+                pollen_code=pollen_code,
+                pollen_type=record.get('pollen_type') or pollen_code,
+                level=level,
+                start=day,
+                end=day,
+            )
+        return True
+
+    def _close(self, key: tuple[str, str]) -> None:
+        span = self._open.pop(key)
+        index = self._closed.setdefault(span.station_id, SpanIndex())
+        index.add(span)
+        index.prune(span.end - SEASON_RETENTION)
+
+    def current(self, station_id: str) -> list[PollenSpan]:
+        """Return the open spans of a station."""
+        return [
+            span for span in self._open.values()
+            if span.station_id == station_id]
+
+    def spans(
+            self,
+            station_id: str,
+            start: date,
+            end: date) -> list[PollenSpan]:
+        """Return all spans of a station overlapping [start, end]."""
+        closed = self._closed.get(station_id)
+        spans = closed.overlapping(start, end) if closed else []
+        spans.extend(
+            span for span in self.current(station_id)
+            if span.start <= end and span.end >= start)
+        return spans
+
+    def as_dict(self) -> dict:
+        """Return a JSON-serializable representation for storage."""
+        return {
+            'open': [span.as_dict() for span in self._open.values()],
+            'closed': [
+                span.as_dict()
+                for index in self._closed.values() for span in index],
+            'last_day': [
+                [station_id, pollen_code, day.isoformat()]
+                for (station_id, pollen_code), day in self._last_day.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> PollenSeasonTracker:
+        """Restore a tracker from storage."""
+        tracker = cls()
+        for item in data.get('open', []):
+            span = PollenSpan.from_dict(item)
+            tracker._open[(span.station_id, span.pollen_code)] = span
+        for item in data.get('closed', []):
+            span = PollenSpan.from_dict(item)
+            tracker._closed.setdefault(span.station_id, SpanIndex()).add(span)
+        for station_id, pollen_code, day in data.get('last_day', []):
+            tracker._last_day[(station_id, pollen_code)] = date.fromisoformat(day)
+        return tracker
@@ -1,114 +1,44 @@
+"""Sensor platform for Polen Madrid integration."""
 from __future__ import annotations
 
-"""Sensor platform for Polen Madrid integration."""
+import hashlib
 import logging
-import json
+import math
 
-import requests  # This will be made async later
-# import voluptuous as vol # Unused import
 from homeassistant.components.sensor import (
+    SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-    UpdateFailed,
-    ConfigEntryNotReady,
+from homeassistant.const import (
+    CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
+    EntityCategory,
 )
-# from homeassistant.helpers import config_validation as cv # Unused import
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import (
-    DOMAIN,
-    API_URL,
-    API_HEADERS,
-    API_DATA_PAYLOAD,
-    FIELD_MAPPING,
-    SCAN_INTERVAL,
+    CONF_COMPACT,
     CONF_STATIONS,
+    DOMAIN,
+    POLLEN_LEVELS,
+    POLLUTANT_MAPPING,
+    STALE_POLICY_UNAVAILABLE,
+)
+from .coordinator import (
+    PolenMadridAirQualityCoordinator,
+    PolenMadridDataUpdateCoordinator,
 )
+from .entity import PolenMadridStationEntity, station_device_info
+from .geo import record_utm_position
+from .table import PollenTableRenderer
+from .helpers import get_pollen_level_details
 
 _LOGGER = logging.getLogger(__name__)
 
-# Helper function from download_script.py
-
-
-def parse_api_response(json_data):
-    """Parse the raw JSON data from the API into a structured list of records."""
-    features = json_data.get('features', [])
-    transformed_data = []
-    for feature in features:
-        properties = feature.get('properties', {})
-        # Let it be None if not present or null
-        geometry = feature.get('geometry')
-
-        # Safely get coordinates only if geometry is not None
-        coordinates = [None, None]
-        if geometry and isinstance(geometry, dict):
-            coordinates = geometry.get('coordinates', [None, None])
-
-        output_record = {}
-        for source_field, target_field in FIELD_MAPPING.items():
-            if target_field == "coordinates_utm":
-                if coordinates and coordinates[0] is not None and coordinates[1] is not None:
-                    output_record[target_field] = f"{
-                        coordinates[0]},{coordinates[1]}"
-                else:
-                    output_record[target_field] = None
-            elif source_field in properties:
-                output_record[target_field] = properties[source_field]
-            else:
-                output_record[target_field] = None
-        transformed_data.append(output_record)
-    transformed_data.sort(
-        key=lambda x: (
-            x.get('station_id'),
-            x.get('pollen_code')))
-    return transformed_data
-
-# Helper function from render_pollen_table.py
-
-
-def fix_encoding_issue(text):
-    """Fix potential encoding issues for text strings from the API."""
-    if isinstance(text, str):
-        try:
-            return text.encode('latin-1').decode('utf-8')
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            return text
-    return text
-
-# Helper function from render_pollen_table.py
-
-
-def get_pollen_level_details(value, medium_threshold, high_threshold):
-    """Determine pollen level (Bajo, Medio, Alto) and descriptive text based on value and thresholds."""
-    try:
-        value = int(value)
-        medium_threshold = int(
-            medium_threshold if medium_threshold is not None else 0)
-        high_threshold = int(
-            high_threshold if high_threshold is not None else 0)
-    except (ValueError, TypeError):
-        _LOGGER.warning(
-            "Invalid threshold or value for get_pollen_level: val=%s, med=%s, high=%s",
-            value,
-            medium_threshold,
-            high_threshold,
-        )
-        return "Unknown", "Data N/A", "level-unknown"
-
-    if high_threshold > 0 and value >= high_threshold:
-        return "Alto", f"Alto (>= {high_threshold})", "level-alto"
-    if medium_threshold > 0 and value >= medium_threshold:
-        return "Medio", f"Medio (>= {medium_threshold})", "level-medio"
-
-    threshold_text = f"< {medium_threshold}" if medium_threshold > 0 else ""
-    return "Bajo", f"Bajo ({threshold_text})", "level-bajo"
-
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -138,23 +68,42 @@ async def async_setup_entry(
         async_add_entities([])
         return
 
+    compact = entry.options.get(CONF_COMPACT, False)
+    _async_disable_entities_of_other_mode(hass, entry, selected_stations, compact)
+
+    sensors = []
     # Check if coordinator data is available (it should be, if __init__
     # succeeded)
-    if coordinator.last_update_success and coordinator.data:
+    if compact and coordinator.last_update_success and coordinator.data:
+        # One entity per station carrying all of its readings
+        for station_id in selected_stations:
+            station_records = coordinator.data.by_station.get(str(station_id))
+            if station_records:
+                sensors.append(
+                    PolenMadridStationSummarySensor(coordinator, station_records[0]))
+                sensors.append(
+                    PolenMadridLastMeasurementSensor(coordinator, station_records[0]))
+        if coordinator.air_quality_coordinator is not None:
+            sensors.extend(
+                PolenMadridAirQualitySensor(
+                    coordinator.air_quality_coordinator,
+                    coordinator.data.by_station[str(station_id)][0],
+                    pollutant_code)
+                for station_id in selected_stations
+                if coordinator.data.by_station.get(str(station_id))
+                for pollutant_code in POLLUTANT_MAPPING)
+    elif coordinator.last_update_success and coordinator.data:
         _LOGGER.debug(
             "Coordinator data is available. Processing %s records for selected stations.",
             len(coordinator.data)
         )
-        sensors = []
-        for _, record in coordinator.data.items():
+        records = [
+            record
+            for station_id in selected_stations
+            for record in coordinator.data.by_station.get(str(station_id), [])
+        ]
+        for record in records:
             station_id = record.get('station_id')
-
-            # Filter by selected stations
-            # Ensure station_id is string for comparison, as selected_stations
-            # contains strings
-            if str(station_id) not in selected_stations:
-                continue
-
             pollen_code = record.get('pollen_code')
             location_name = record.get('location_name')
             pollen_type = record.get('pollen_type')
@@ -178,12 +127,33 @@ async def async_setup_entry(
                     "Skipping sensor creation due to missing key fields in record for station %s: %s",
                     station_id,
                     record)
+
+        # One set of diagnostic sensors per station for its static metadata
+        for station_id in selected_stations:
+            station_records = coordinator.data.by_station.get(str(station_id))
+            if station_records:
+                sensors.append(
+                    PolenMadridStationSensor(coordinator, station_records[0]))
+                sensors.append(
+                    PolenMadridThresholdsSensor(coordinator, station_records[0]))
+                sensors.append(
+                    PolenMadridLastMeasurementSensor(coordinator, station_records[0]))
+                # Air quality readings of the nearest monitoring station
+                if coordinator.air_quality_coordinator is not None:
+                    sensors.extend(
+                        PolenMadridAirQualitySensor(
+                            coordinator.air_quality_coordinator,
+                            station_records[0],
+                            pollutant_code)
+                        for pollutant_code in POLLUTANT_MAPPING)
     else:
         _LOGGER.warning(
             "Coordinator data is None or empty after refresh. No sensors will be created."
         )
 
     if sensors:
+        # Level table of all selected stations, for dashboards
+        sensors.append(PolenMadridTableSensor(coordinator, selected_stations))
         _LOGGER.info(
             "Adding %s Polen Madrid sensors to Home Assistant for the selected stations.",
             len(sensors))
@@ -192,104 +162,140 @@ async def async_setup_entry(
             "No Polen Madrid sensors were created to add for the selected stations.")
 
     async_add_entities(sensors)
+    if not compact:
+        # Readings appearing in or leaving the feed later
+        entry.async_on_unload(_async_follow_readings(
+            coordinator, selected_stations, sensors, async_add_entities))
     _LOGGER.debug(
         "Finished setting up Polen Madrid sensor platform for selected stations.")
 
 
-class PolenMadridDataUpdateCoordinator(DataUpdateCoordinator):
-    """Class to manage fetching Polen Madrid data."""
-
-    def __init__(self, hass: HomeAssistant) -> None:
-        """Initialize."""
-        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
-
-    async def _async_update_data(self):
-        """Fetch data from API endpoint."""
-        _LOGGER.debug("Attempting to fetch data from API.")
-        try:
-            # Define a helper function to pass to async_add_executor_job
-            def _blocking_post_request():
-                return requests.post(
-                    API_URL,
-                    headers=API_HEADERS,
-                    data=API_DATA_PAYLOAD,
-                    timeout=10)
-
-            # Use hass.async_add_executor_job to run the blocking request
-            response = await self.hass.async_add_executor_job(_blocking_post_request)
-
-            response.raise_for_status()
-            json_data = response.json()
-            _LOGGER.debug(
-                "Successfully fetched data, raw JSON keys: %s", list(
-                    json_data.keys()) if isinstance(
-                    json_data, dict) else 'Not a dict')
-
-            parsed_data = parse_api_response(json_data)
-            _LOGGER.debug("Parsed_data count: %s", len(parsed_data))
-
-            # Apply encoding fix
-            processed_data = []
-            for item in parsed_data:
-                fixed_item = item.copy()
-                if 'location_name' in fixed_item and fixed_item['location_name']:
-                    fixed_item['location_name'] = fix_encoding_issue(
-                        fixed_item['location_name'])
-                if 'pollen_type' in fixed_item and fixed_item['pollen_type']:
-                    fixed_item['pollen_type'] = fix_encoding_issue(
-                        fixed_item['pollen_type'])
-                processed_data.append(fixed_item)
-            _LOGGER.debug(
-                "Processed_data (after encoding fix) count: %s",
-                len(processed_data))
-
-            # Organize data for sensors
-            final_data_structure = {}
-            for record in processed_data:
-                station_id = record.get('station_id')
-                pollen_code = record.get('pollen_code')
-                if station_id and pollen_code:
-                    final_data_structure[(station_id, pollen_code)] = record
-
-            if not final_data_structure:
-                _LOGGER.warning(
-                    "No data in final_data_structure after processing.")
-                return {}
-
-            _LOGGER.debug(
-                "Final_data_structure populated with %s entries.",
-                len(final_data_structure))
-            return final_data_structure
-
-        except requests.exceptions.HTTPError as errh:
-            _LOGGER.error("Http Error: %s", errh)
-            raise UpdateFailed(
-                f"Error communicating with API: {errh}") from errh
-        except requests.exceptions.ConnectionError as errc:
-            _LOGGER.error("Error Connecting: %s", errc)
-            raise UpdateFailed(f"Error connecting to API: {errc}") from errc
-        except requests.exceptions.Timeout as errt:
-            _LOGGER.error("Timeout Error: %s", errt)
-            raise UpdateFailed(f"Timeout connecting to API: {errt}") from errt
-        except requests.exceptions.RequestException as err:
-            _LOGGER.error("Request Error: %s", err)
-            raise UpdateFailed(
-                f"An unexpected error occurred with the request: {err}") from err
-        except json.JSONDecodeError as j_err:
-            _LOGGER.error("Failed to decode JSON response: %s", j_err)
+@callback
+def _async_disable_entities_of_other_mode(
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        selected_stations,
+        compact: bool) -> None:
+    """Disable the registry entries of the other sensor mode.
+
+    Switching modes would otherwise leave the previous entities orphaned.
+    They are disabled rather than removed, so their entity ids,
+    customisations and history are still there when switching back, and
+    re-enabled then; entries disabled by the user stay disabled. Unique IDs
+    are stable per mode: `<domain>_<station>_summary` in compact mode;
+    `<domain>_<station>_<pollen>`, `_station` and `_thresholds` otherwise.
+    Air quality and last measurement sensors exist in both modes.
+    """
+    registry = er.async_get(hass)
+    prefixes = tuple(f"{DOMAIN}_{station_id}_" for station_id in selected_stations)
+    for entity_entry in er.async_entries_for_config_entry(
+            registry, entry.entry_id):
+        unique_id = entity_entry.unique_id
+        if (entity_entry.domain != "sensor"
+                or not unique_id.startswith(prefixes)
+                or "_aq_" in unique_id
+                or unique_id.endswith("_last_measurement")):
+            continue
+        if compact != unique_id.endswith("_summary"):
+            if entity_entry.disabled_by is None:
+                _LOGGER.debug(
+                    "Disabling %s, not used in the current sensor mode.",
+                    entity_entry.entity_id)
+                registry.async_update_entity(
+                    entity_entry.entity_id,
+                    disabled_by=er.RegistryEntryDisabler.INTEGRATION)
+                # The unavailable state it was left with on unload
+                hass.states.async_remove(entity_entry.entity_id)
+        elif entity_entry.disabled_by is er.RegistryEntryDisabler.INTEGRATION:
             _LOGGER.debug(
-                "Response text that failed to parse: %s",
-                response.text if 'response' in locals() else 'Response object not available')
-            raise UpdateFailed(
-                f"Invalid JSON response from API: {j_err}") from j_err
-        except Exception as e:
-            _LOGGER.exception("Unexpected error fetching pollen data: %s", e)
-            raise UpdateFailed(f"Unexpected error: {e}") from e
+                "Enabling %s, used again in the current sensor mode.",
+                entity_entry.entity_id)
+            registry.async_update_entity(
+                entity_entry.entity_id, disabled_by=None)
+
+
+@callback
+def _async_follow_readings(
+        coordinator: PolenMadridDataUpdateCoordinator,
+        selected_stations,
+        sensors: list,
+        async_add_entities: AddEntitiesCallback) -> CALLBACK_TYPE:
+    """Add and remove the pollen sensors of the coordinator's changes.
+
+    A reading of a selected station that appears in the feed gets its
+    sensor; the sensor of a reading that leaves it is removed, keeping its
+    registry entry so it comes back as it was if the reading returns.
+    """
+    stations = {str(station_id) for station_id in selected_stations}
+    entities = {
+        (sensor._station_id, sensor._pollen_code): sensor
+        for sensor in sensors if isinstance(sensor, PolenMadridSensor)}
+    applied = coordinator.changes
+
+    @callback
+    def _async_apply_changes() -> None:
+        nonlocal applied
+        changes = coordinator.changes
+        if changes is applied or not (changes.added or changes.removed):
+            return
+        applied = changes
+        for key in changes.removed:
+            if (entity := entities.pop(key, None)) is not None:
+                _LOGGER.debug("Removing %s, no longer reported.", entity.entity_id)
+                coordinator.hass.async_create_task(entity.async_remove())
+        new_sensors = []
+        for key in changes.added:
+            record = coordinator.data[key]
+            if str(key[0]) not in stations or key in entities:
+                continue
+            entities[key] = sensor = PolenMadridSensor(
+                coordinator,
+                record['station_id'],
+                record['pollen_code'],
+                record.get('location_name'),
+                record.get('pollen_type'))
+            new_sensors.append(sensor)
+        if new_sensors:
+            _LOGGER.info(
+                "Adding %s Polen Madrid sensors for newly reported readings.",
+                len(new_sensors))
+            async_add_entities(new_sensors)
+
+    return coordinator.async_add_listener(_async_apply_changes)
+
+
+def _hidden_when_stale(
+        coordinator: PolenMadridDataUpdateCoordinator, measured_at) -> bool:
+    """Return True if stale readings make the entity unavailable."""
+    return (
+        coordinator.stale_policy == STALE_POLICY_UNAVAILABLE
+        and coordinator.is_stale(measured_at))
 
 
 class PolenMadridSensor(CoordinatorEntity, SensorEntity):
     """Representation of a Polen Madrid Sensor."""
 
+    # Kept so the statistics recorded so far stay attached to the sensor
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    # Static or slow-changing attributes are kept out of the recorder; the
+    # station metadata lives on the device and the station diagnostic
+    # sensors, and threshold changes are recorded by the thresholds sensor.
+    # The value is the state already.
+    _unrecorded_attributes = frozenset({
+        'pollen_type',
+        'pollen_value',
+        'location_name',
+        'pollen_level_text',
+        'medium_threshold',
+        'high_threshold',
+        'station_code',
+        'station_id',
+        'pollen_code',
+        'coordinates_utm',
+        'altitude',
+        'sensor_height',
+    })
+
     def __init__(
             self,
             coordinator: PolenMadridDataUpdateCoordinator,
@@ -306,20 +312,12 @@ class PolenMadridSensor(CoordinatorEntity, SensorEntity):
 
         # Use fixed names for unique_id and name to avoid issues if encoding changes them slightly
         # But display names can use the (hopefully) corrected versions.
-        self._attr_unique_id = f"{DOMAIN}_{
-            self._station_id}_{
-            self._pollen_code}"
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_{self._pollen_code}"
         self._attr_name = f"Polen {self._location_name} - {self._pollen_type}"
 
         # Device info: Group sensors by physical location (station)
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, self._station_id)},
-            "name": f"Estación Polen {self._location_name}",
-            "manufacturer": "Comunidad de Madrid",
-            "model": "Sensor de Polen",
-            # "sw_version": ... , # Could add if available
-            # "via_device": (DOMAIN, "cloud_service"), # If we had a central device for the API itself
-        }
+        self._attr_device_info = station_device_info(
+            self._station_id, self._record or {'location_name': location_name})
 
     @property
     def _record(self):
@@ -341,10 +339,6 @@ class PolenMadridSensor(CoordinatorEntity, SensorEntity):
         """Return the unit of measurement."""
         return "g/m³"  # grains per cubic meter
 
-    @property
-    def state_class(self) -> SensorStateClass | None:
-        return SensorStateClass.MEASUREMENT
-
     @property
     def extra_state_attributes(self):
         """Return other attributes of the sensor."""
@@ -369,6 +363,8 @@ class PolenMadridSensor(CoordinatorEntity, SensorEntity):
         # commented as it is always 0
         # attrs['very_high_threshold'] = self._record.get('very_high_threshold')
         attrs['measurement_date'] = self._record.get('measurement_date')
+        attrs['stale'] = self.coordinator.is_stale(
+            self._record.get('measured_at'))
         attrs['station_code'] = self._record.get('station_code')
         attrs['station_id'] = self._station_id
         attrs['pollen_code'] = self._pollen_code
@@ -381,4 +377,335 @@ class PolenMadridSensor(CoordinatorEntity, SensorEntity):
     @property
     def available(self) -> bool:
         """Return True if entity is available (data is present in coordinator and record exists)."""
-        return super().available and self._record is not None
+        return (
+            super().available
+            and self._record is not None
+            and not _hidden_when_stale(
+                self.coordinator, self._record.get('measured_at')))
+
+
+class PolenMadridStationSensor(PolenMadridStationEntity, SensorEntity):
+    """Diagnostic sensor holding the static metadata of a station."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:map-marker-radius"
+    _unrecorded_attributes = frozenset({
+        'station_id',
+        'location_name',
+        'coordinates_utm',
+        'longitude_utm',
+        'latitude_utm',
+        'altitude',
+        'sensor_height',
+        'pollen_codes',
+    })
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            record: dict) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, record)
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_station"
+        self._attr_name = f"Polen {self._location_name} - Estación"
+
+    @property
+    def native_value(self):
+        """Return the station code."""
+        if self._records:
+            return self._records[0].get('station_code')
+        return None
+
+    @property
+    def extra_state_attributes(self):
+        """Return the station metadata."""
+        if not self._records:
+            return {}
+        record = self._records[0]
+        return {
+            'station_id': self._station_id,
+            'location_name': record.get('location_name'),
+            'coordinates_utm': record.get('coordinates_utm'),
+            'longitude_utm': record.get('longitude_utm'),
+            'latitude_utm': record.get('latitude_utm'),
+            'altitude': record.get('altitude'),
+            'sensor_height': record.get('sensor_height'),
+            'pollen_codes': sorted(
+                str(item.get('pollen_code')) for item in self._records),
+        }
+
+
+class PolenMadridThresholdsSensor(PolenMadridStationEntity, SensorEntity):
+    """Diagnostic sensor tracking the pollen thresholds of a station.
+
+    Its state is a fingerprint of all thresholds, so a recorder row is only
+    written when the upstream thresholds actually change.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:tune-vertical"
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            record: dict) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, record)
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_thresholds"
+        self._attr_name = f"Polen {self._location_name} - Umbrales"
+
+    @property
+    def _thresholds(self) -> dict[str, dict]:
+        return {
+            str(record.get('pollen_code')): {
+                'medium': record.get('medium_threshold'),
+                'high': record.get('high_threshold'),
+            }
+            for record in sorted(
+                self._records, key=lambda item: str(item.get('pollen_code')))
+        }
+
+    @property
+    def native_value(self):
+        """Return a short fingerprint of the thresholds."""
+        if not self._records:
+            return None
+        return hashlib.sha1(
+            repr(self._thresholds).encode()).hexdigest()[:8]
+
+    @property
+    def extra_state_attributes(self):
+        """Return the medium/high thresholds per pollen code."""
+        return self._thresholds
+
+
+class PolenMadridStationSummarySensor(PolenMadridStationEntity, SensorEntity):
+    """All pollen readings of a station in a single entity.
+
+    Used in compact mode instead of one sensor per pollen type. The state is
+    the highest pollen level of the station and the `readings` attribute
+    holds every reading; both are built once per coordinator update. The
+    readings are kept out of the recorder, their history is available from
+    the long-term statistics.
+    """
+
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_options = POLLEN_LEVELS
+    _attr_icon = "mdi:flower-pollen"
+    _unrecorded_attributes = frozenset({'readings'})
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            record: dict) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, record)
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_summary"
+        self._attr_name = f"Polen {self._location_name}"
+        self._update_from_records()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Rebuild the state and readings, then write them."""
+        self._update_from_records()
+        super()._handle_coordinator_update()
+
+    def _update_from_records(self) -> None:
+        """Build the state and attributes from the station's records."""
+        readings = {}
+        highest = None
+        measurement_date = None
+        for record in self._records:
+            level = self.coordinator.data.level_of(record)
+            readings[str(record.get('pollen_code'))] = {
+                'pollen_type': record.get('pollen_type'),
+                'pollen_value': record.get('pollen_value'),
+                'pollen_level': level,
+                'medium_threshold': record.get('medium_threshold'),
+                'high_threshold': record.get('high_threshold'),
+            }
+            if level in POLLEN_LEVELS and (
+                    highest is None
+                    or POLLEN_LEVELS.index(level) > POLLEN_LEVELS.index(highest)):
+                highest = level
+            measurement_date = max(
+                filter(None, (measurement_date, record.get('measurement_date'))),
+                key=str,
+                default=None)
+
+        self._attr_native_value = highest
+        self._attr_extra_state_attributes = {
+            'measurement_date': measurement_date,
+            'stale': self.coordinator.is_stale(self._measured_at),
+            'readings': dict(sorted(readings.items())),
+        }
+
+    @property
+    def _measured_at(self):
+        """Return the station's newest measurement time."""
+        if self.coordinator.data:
+            return self.coordinator.data.newest_by_station.get(self._station_id)
+        return None
+
+    @property
+    def available(self) -> bool:
+        """Return True unless the station's readings are hidden as stale."""
+        return super().available and not _hidden_when_stale(
+            self.coordinator, self._measured_at)
+
+
+class PolenMadridLastMeasurementSensor(PolenMadridStationEntity, SensorEntity):
+    """Time of the newest measurement of a station.
+
+    Read from the coordinator's newest-date index. It stays available when
+    the readings are stale, so the age of the data can always be checked.
+    """
+
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            record: dict) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, record)
+        self._attr_unique_id = f"{DOMAIN}_{self._station_id}_last_measurement"
+        self._attr_name = f"Polen {self._location_name} - Última medición"
+
+    @property
+    def native_value(self):
+        """Return the newest measurement time of the station."""
+        if self.coordinator.data:
+            return self.coordinator.data.newest_by_station.get(self._station_id)
+        return None
+
+    @property
+    def extra_state_attributes(self):
+        """Return whether the station's readings are stale."""
+        return {'stale': self.coordinator.is_stale(self.native_value)}
+
+
+class PolenMadridTableSensor(CoordinatorEntity, SensorEntity):
+    """Pre-rendered level table of the selected stations.
+
+    The state is a short hash of the table content, and the `html` and
+    `markdown` attributes hold the rendered table. It is re-rendered only
+    when the readings it shows change.
+    """
+
+    _attr_icon = "mdi:table"
+    _unrecorded_attributes = frozenset({'html', 'markdown'})
+
+    def __init__(
+            self,
+            coordinator: PolenMadridDataUpdateCoordinator,
+            stations: list[str]) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{DOMAIN}_table"
+        self._attr_name = "Polen Madrid - Tabla"
+        self._renderer = PollenTableRenderer(stations)
+        self._update_from_renderer()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Re-render the table if the readings changed."""
+        self._update_from_renderer()
+        super()._handle_coordinator_update()
+
+    def _update_from_renderer(self) -> None:
+        if self._renderer.update(self.coordinator.data):
+            self._attr_native_value = self._renderer.content_hash[:8]
+            self._attr_extra_state_attributes = {
+                'html': self._renderer.html,
+                'markdown': self._renderer.markdown,
+            }
+
+
+AIR_QUALITY_DEVICE_CLASSES = {
+    "NO2": SensorDeviceClass.NITROGEN_DIOXIDE,
+    "PM2_5": SensorDeviceClass.PM25,
+}
+
+
+class PolenMadridAirQualitySensor(CoordinatorEntity, SensorEntity):
+    """Pollutant concentration next to a pollen station.
+
+    The air quality network does not share stations with the pollen
+    network, so the reading of the nearest air quality station with data is
+    shown on the pollen station's device. It is looked up once per
+    coordinator update.
+    """
+
+    _attr_native_unit_of_measurement = CONCENTRATION_MICROGRAMS_PER_CUBIC_METER
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _unrecorded_attributes = frozenset({
+        'air_quality_station_id',
+        'air_quality_location_name',
+        'distance_km',
+    })
+
+    def __init__(
+            self,
+            coordinator: PolenMadridAirQualityCoordinator,
+            record: dict,
+            pollutant_code: str) -> None:
+        """Initialize the sensor from one of the pollen station's records."""
+        super().__init__(coordinator)
+        self._station_id = str(record.get('station_id'))
+        self._pollutant_code = pollutant_code
+        self._position = record_utm_position(record)
+        self._attr_unique_id = (
+            f"{DOMAIN}_{self._station_id}_aq_{pollutant_code.lower()}")
+        self._attr_name = (
+            f"Polen {record.get('location_name')} - "
+            f"{POLLUTANT_MAPPING[pollutant_code]}")
+        self._attr_device_class = AIR_QUALITY_DEVICE_CLASSES.get(pollutant_code)
+        self._attr_device_info = station_device_info(
+            record.get('station_id'), record)
+        self._reading, self._distance = self._nearest_reading()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Look up the nearest reading, then write the state."""
+        self._reading, self._distance = self._nearest_reading()
+        super()._handle_coordinator_update()
+
+    def _nearest_reading(self) -> tuple[dict, float] | tuple[None, None]:
+        """Return the nearest reading with a value and its distance in m."""
+        readings = (self.coordinator.data or {}).get(self._pollutant_code)
+        if not readings or self._position is None:
+            return None, None
+        nearest, nearest_distance = None, None
+        for reading in readings.values():
+            position = record_utm_position(reading)
+            if position is None or reading.get('value') is None:
+                continue
+            distance = math.dist(self._position, position)
+            if nearest_distance is None or distance < nearest_distance:
+                nearest, nearest_distance = reading, distance
+        return nearest, nearest_distance
+
+    @property
+    def native_value(self):
+        """Return the pollutant concentration."""
+        return self._reading.get('value') if self._reading else None
+
+    @property
+    def extra_state_attributes(self):
+        """Return the air quality station the reading comes from."""
+        reading = self._reading
+        if not reading:
+            return {}
+        return {
+            'air_quality_station_id': reading.get('station_id'),
+            'air_quality_location_name': reading.get('location_name'),
+            'distance_km': round(self._distance / 1000, 1),
+            'measurement_date': reading.get('measurement_date'),
+        }
+
+    @property
+    def available(self) -> bool:
+        """Return True if a nearby reading is available."""
+        return super().available and self._reading is not None
@@ -0,0 +1,235 @@
+"""Services for the Polen Madrid integration."""
+from __future__ import annotations
+
+import logging
+import math
+from functools import partial
+from pathlib import Path
+
+import voluptuous as vol
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .capture import CAPTURE_DIRECTORY
+from .const import (
+    ATTR_COLUMNS,
+    ATTR_END_DATE,
+    ATTR_FILENAME,
+    ATTR_FORMAT,
+    ATTR_MIN_LEVEL,
+    ATTR_NEAREST,
+    ATTR_POLLEN_CODES,
+    ATTR_REFRESH,
+    ATTR_START_DATE,
+    ATTR_STATIONS,
+    ATTR_TOP,
+    DOMAIN,
+    POLLEN_LEVELS,
+    SERVICE_EXPORT,
+    SERVICE_GET_READINGS,
+    SERVICE_PROFILE_NEXT_UPDATE,
+)
+from .export import EXPORT_COLUMNS, EXPORT_DIRECTORY, EXPORT_FORMATS, export_readings
+from .geo import record_utm_position, wgs84_to_utm
+from .coordinator import PolenMadridData
+from .helpers import serialize_reading
+from .profiler import DEFAULT_PROFILE_TOP, PROFILE_DIRECTORY, UpdateProfiler
+
+_LOGGER = logging.getLogger(__name__)
+
+GET_READINGS_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_STATIONS): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_POLLEN_CODES): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_MIN_LEVEL): vol.In(POLLEN_LEVELS),
+    vol.Inclusive(ATTR_LATITUDE, "coordinates"): cv.latitude,
+    vol.Inclusive(ATTR_LONGITUDE, "coordinates"): cv.longitude,
+    vol.Optional(ATTR_NEAREST, default=1): vol.All(
+        vol.Coerce(int), vol.Range(min=1)),
+})
+
+EXPORT_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_FORMAT, default="csv"): vol.In(EXPORT_FORMATS),
+    vol.Optional(ATTR_COLUMNS): vol.All(
+        cv.ensure_list, [vol.In(EXPORT_COLUMNS)]),
+    vol.Optional(ATTR_STATIONS): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(ATTR_START_DATE): cv.date,
+    vol.Optional(ATTR_END_DATE): cv.date,
+    # A plain file name: exports are always written to EXPORT_DIRECTORY
+    vol.Optional(ATTR_FILENAME): cv.matches_regex(r"^[\w][\w.-]*$"),
+})
+
+PROFILE_NEXT_UPDATE_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_TOP, default=DEFAULT_PROFILE_TOP): vol.All(
+        vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(ATTR_REFRESH, default=False): cv.boolean,
+})
+
+
+def _get_coordinator(hass: HomeAssistant):
+    """Return the coordinator of the loaded config entry."""
+    coordinators = hass.data.get(DOMAIN, {})
+    if not coordinators:
+        raise ServiceValidationError(
+            "Polen Madrid is not set up; no data is available.")
+    # Only a single config entry is allowed for this integration.
+    return next(iter(coordinators.values()))
+
+
+def _nearest_stations(
+        records: list[dict],
+        latitude: float,
+        longitude: float,
+        count: int) -> dict[str, float]:
+    """Return the ids of the `count` nearest stations with their distance in km."""
+    easting, northing = wgs84_to_utm(latitude, longitude)
+    distances: dict[str, float] = {}
+    for record in records:
+        station_id = str(record.get('station_id'))
+        if station_id in distances:
+            continue
+        position = record_utm_position(record)
+        if position is None:
+            continue
+        distances[station_id] = math.hypot(
+            position[0] - easting, position[1] - northing) / 1000
+    nearest = sorted(distances.items(), key=lambda item: item[1])[:count]
+    return dict(nearest)
+
+
+def filter_readings(data: PolenMadridData, filters: dict) -> list[dict]:
+    """Apply the get_readings filters using the coordinator data indexes."""
+    levels = None
+    if ATTR_MIN_LEVEL in filters:
+        levels = POLLEN_LEVELS[POLLEN_LEVELS.index(filters[ATTR_MIN_LEVEL]):]
+
+    selected = data.select(
+        stations=filters.get(ATTR_STATIONS) or None,
+        pollen_codes=filters.get(ATTR_POLLEN_CODES) or None,
+        levels=levels)
+    readings = [serialize_reading(record) for record in selected]
+
+    if ATTR_LATITUDE in filters:
+        distances = _nearest_stations(
+            selected,
+            filters[ATTR_LATITUDE],
+            filters[ATTR_LONGITUDE],
+            filters[ATTR_NEAREST])
+        readings = [
+            {**reading, 'distance_km': round(distances[reading['station_id']], 2)}
+            for reading in readings
+            if reading['station_id'] in distances
+        ]
+        readings.sort(key=lambda reading: reading['distance_km'])
+
+    return readings
+
+
+async def _async_get_readings(
+        hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Answer a get_readings call from the coordinator's in-memory data."""
+    coordinator = _get_coordinator(hass)
+    data = coordinator.data or PolenMadridData()
+    source = "coordinator"
+
+    missing = set(call.data.get(ATTR_STATIONS) or []) - data.by_station.keys()
+    if missing:
+        _LOGGER.debug(
+            "Stations %s not in coordinator data, using fallback fetch.",
+            sorted(missing))
+        data = PolenMadridData(
+            {**data, **await coordinator.async_fetch_fallback()})
+        source = "fetch"
+
+    readings = filter_readings(data, call.data)
+    return {"source": source, "readings": readings}
+
+
+async def _async_export(
+        hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Write the retained history and current readings to a file."""
+    coordinator = _get_coordinator(hass)
+    export_format = call.data[ATTR_FORMAT]
+    filename = call.data.get(ATTR_FILENAME) or (
+        f"polen_madrid_{dt_util.now():%Y%m%d_%H%M%S}.{export_format}")
+    path = Path(hass.config.path(EXPORT_DIRECTORY, filename))
+    # The snapshot's records are never mutated, only the list is copied
+    snapshot = list((coordinator.data or {}).values())
+
+    rows = await hass.async_add_executor_job(
+        partial(
+            export_readings,
+            path,
+            snapshot,
+            hass.config.path(CAPTURE_DIRECTORY),
+            call.data.get(ATTR_COLUMNS) or EXPORT_COLUMNS,
+            export_format,
+            stations=call.data.get(ATTR_STATIONS),
+            start_date=call.data.get(ATTR_START_DATE),
+            end_date=call.data.get(ATTR_END_DATE)))
+    return {"path": str(path), "rows": rows}
+
+
+async def _async_profile_next_update(
+        hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Profile the next pollen update, or one started now with `refresh`.
+
+    With `refresh`, a refresh in flight is let finish first so that the
+    profile covers a full update rather than the tail of one.
+    """
+    coordinator = _get_coordinator(hass)
+    profiler = UpdateProfiler(
+        hass.config.path(PROFILE_DIRECTORY), call.data[ATTR_TOP])
+    if not call.data[ATTR_REFRESH]:
+        coordinator.arm_profiler(profiler)
+        return None
+    await coordinator.async_join_refresh()
+    coordinator.arm_profiler(profiler)
+    await coordinator.async_refresh()
+    return coordinator.profile_summary
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the Polen Madrid services."""
+
+    async def async_get_readings(call: ServiceCall) -> ServiceResponse:
+        return await _async_get_readings(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_READINGS,
+        async_get_readings,
+        schema=GET_READINGS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_export(call: ServiceCall) -> ServiceResponse:
+        return await _async_export(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT,
+        async_export,
+        schema=EXPORT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_profile_next_update(call: ServiceCall) -> ServiceResponse:
+        return await _async_profile_next_update(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE_NEXT_UPDATE,
+        async_profile_next_update,
+        schema=PROFILE_NEXT_UPDATE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
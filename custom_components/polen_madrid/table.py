@@ -0,0 +1,113 @@
+"""Pre-rendered station x pollen level table.
+
+The table used to be rendered by dashboards with Jinja templates over every
+pollen sensor. It is now rendered here, as HTML and Markdown, and only when
+the readings it shows change: the renderer keeps the output of the last
+content hash and returns it as is while the hash is unchanged.
+"""
+from __future__ import annotations
+
+import hashlib
+from html import escape
+
+from .coordinator import PolenMadridData
+from .helpers import get_pollen_level_details
+
+
+def _rows(data: PolenMadridData, stations: list[str]) -> list[tuple]:
+    """Return the (station, pollen) readings shown in the table."""
+    return [
+        (
+            str(record.get('station_id')),
+            record.get('location_name'),
+            record.get('pollen_code'),
+            record.get('pollen_type'),
+            record.get('pollen_value'),
+            record.get('medium_threshold'),
+            record.get('high_threshold'),
+        )
+        for station_id in stations
+        for record in sorted(
+            data.by_station.get(str(station_id), []),
+            key=lambda record: str(record.get('pollen_code')))
+    ]
+
+
+def content_hash(rows: list[tuple]) -> str:
+    """Return a hash of the readings shown in the table."""
+    return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+
+def _layout(rows: list[tuple]):
+    """Return the pollen columns and, per station, its cells by pollen code."""
+    columns: dict[str, str] = {}
+    stations: dict[str, tuple[str, dict]] = {}
+    for station_id, location, code, pollen_type, value, medium, high in rows:
+        columns.setdefault(code, pollen_type)
+        level, text, css_class = get_pollen_level_details(value, medium, high)
+        stations.setdefault(station_id, (location, {}))[1][code] = (
+            value, level, text, css_class)
+    return dict(sorted(columns.items())), stations
+
+
+def render_html(rows: list[tuple]) -> str:
+    """Render the table as HTML, with the level-* CSS classes per cell."""
+    columns, stations = _layout(rows)
+    parts = ['<table class="pollen-table"><thead><tr><th>Estación</th>']
+    parts.extend(
+        f'<th title="{escape(str(pollen_type))}">{escape(str(code))}</th>'
+        for code, pollen_type in columns.items())
+    parts.append('</tr></thead><tbody>')
+    for location, cells in stations.values():
+        parts.append(f'<tr><th>{escape(str(location))}</th>')
+        for code in columns:
+            if code not in cells:
+                parts.append('<td></td>')
+                continue
+            value, _, text, css_class = cells[code]
+            parts.append(
+                f'<td class="{css_class}" title="{escape(text)}">'
+                f'{escape(str(value))}</td>')
+        parts.append('</tr>')
+    parts.append('</tbody></table>')
+    return "".join(parts)
+
+
+def render_markdown(rows: list[tuple]) -> str:
+    """Render the table as Markdown, e.g. for a markdown card."""
+    columns, stations = _layout(rows)
+    lines = [
+        "| Estación | " + " | ".join(
+            str(pollen_type) for pollen_type in columns.values()) + " |",
+        "|---|" + "---|" * len(columns),
+    ]
+    for location, cells in stations.values():
+        values = [
+            f"{cells[code][0]} {cells[code][1]}" if code in cells else ""
+            for code in columns]
+        lines.append(f"| {location} | " + " | ".join(values) + " |")
+    return "\n".join(lines)
+
+
+class PollenTableRenderer:
+    """Render the table once per content change."""
+
+    def __init__(self, stations: list[str]) -> None:
+        """Initialize the renderer for the given stations."""
+        self._stations = [str(station_id) for station_id in stations]
+        self.content_hash: str | None = None
+        self.html = ""
+        self.markdown = ""
+        self.renders = 0
+
+    def update(self, data: PolenMadridData | None) -> bool:
+        """Re-render if the readings changed. Returns True if rendered."""
+        rows = _rows(data, self._stations) if data else []
+        digest = content_hash(rows)
+        if digest == self.content_hash:
+            return False
+        self.content_hash = digest
+        self.html = render_html(rows)
+        self.markdown = render_markdown(rows)
+        self.renders += 1
+        return True
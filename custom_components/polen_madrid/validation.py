@@ -0,0 +1,204 @@
+"""Validation of the features returned by the pollen WFS layer.
+
+The checks are compiled once per field mapping (FIELD_MAPPING, or a
+provider's own) into a flat list of (raw key, target field, check) tuples,
+so validating a feature is a single pass over its properties. Malformed
+features are quarantined instead of failing the whole update, and
+properties missing from every feature are reported as schema drift.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .const import FIELD_MAPPING
+
+_LOGGER = logging.getLogger(__name__)
+
+# Quarantined features kept per update, for diagnostics
+QUARANTINE_SIZE = 10
+
+
+def _is_number(value) -> bool:
+    """Return True for numbers and numeric strings."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+def _is_identifier(value) -> bool:
+    return (isinstance(value, int) and not isinstance(value, bool)) or (
+        isinstance(value, str) and value.strip() != "")
+
+
+def _is_text(value) -> bool:
+    return isinstance(value, str)
+
+
+def _is_date(value) -> bool:
+    return isinstance(value, str) or _is_number(value)
+
+
+# Target field -> (check, required, minimum value)
+FIELD_RULES = {
+    "station_id": (_is_identifier, True, None),
+    "station_code": (_is_text, False, None),
+    "location_name": (_is_text, True, None),
+    "longitude_utm": (_is_number, False, None),
+    "latitude_utm": (_is_number, False, None),
+    "altitude": (_is_number, False, None),
+    "sensor_height": (_is_number, False, 0),
+    "measurement_date": (_is_date, False, None),
+    "pollen_value": (_is_number, False, 0),
+    "pollen_code": (_is_identifier, True, None),
+    "pollen_type": (_is_text, True, None),
+    "high_threshold": (_is_number, False, 0),
+    "medium_threshold": (_is_number, False, 0),
+    "very_high_threshold": (_is_number, False, 0),
+}
+
+
+class FeatureValidator:
+    """Checks compiled from a provider's field mapping."""
+
+    def __init__(self, field_mapping: dict[str, str]) -> None:
+        """Compile the rules of the mapped properties.
+
+        "coordinates" comes from the geometry and has no rule.
+        """
+        self.rules = tuple(
+            (raw_key, target, *FIELD_RULES[target])
+            for raw_key, target in field_mapping.items()
+            if target in FIELD_RULES
+        )
+        self.expected_properties = frozenset(raw_key for raw_key, *_ in self.rules)
+        raw_keys = {target: raw_key for raw_key, target in field_mapping.items()}
+        self._raw_medium = raw_keys.get("medium_threshold")
+        self._raw_high = raw_keys.get("high_threshold")
+
+    def check_properties(self, properties: dict) -> str | None:
+        """Return the rejection reason of a feature's properties, if any."""
+        for raw_key, target, check, required, minimum in self.rules:
+            value = properties.get(raw_key)
+            if value is None or value == "":
+                if required:
+                    return f"missing:{target}"
+                continue
+            if not check(value):
+                return f"type:{target}"
+            if minimum is not None and float(value) < minimum:
+                return f"range:{target}"
+
+        medium = properties.get(self._raw_medium)
+        high = properties.get(self._raw_high)
+        if medium is not None and high is not None and 0 < float(high) < float(medium):
+            return "range:thresholds"
+        return None
+
+
+DEFAULT_VALIDATOR = FeatureValidator(FIELD_MAPPING)
+EXPECTED_PROPERTIES = DEFAULT_VALIDATOR.expected_properties
+
+
+def check_properties(properties: dict) -> str | None:
+    """Return the rejection reason of a Comunidad de Madrid feature, if any."""
+    return DEFAULT_VALIDATOR.check_properties(properties)
+
+
+@dataclass
+class ValidationReport:
+    """Outcome of validating one FeatureCollection."""
+
+    accepted: int = 0
+    rejected: Counter = field(default_factory=Counter)
+    quarantine: list[dict] = field(default_factory=list)
+    # Mapped properties absent from every feature
+    missing_properties: list[str] = field(default_factory=list)
+    # Properties of the first feature that the field mapping does not know
+    unknown_properties: list[str] = field(default_factory=list)
+
+    @property
+    def schema_drift(self) -> bool:
+        """Return True if upstream properties appear to have changed."""
+        return bool(self.missing_properties)
+
+    def merge(self, other: ValidationReport) -> None:
+        """Add the report of another page of the same layer."""
+        self.accepted += other.accepted
+        self.rejected.update(other.rejected)
+        self.quarantine.extend(
+            other.quarantine[:QUARANTINE_SIZE - len(self.quarantine)])
+        # Missing from every feature means missing from every page
+        self.missing_properties = sorted(
+            set(self.missing_properties) & set(other.missing_properties))
+
+    def as_dict(self) -> dict:
+        """Return the report as a JSON serializable dict."""
+        return {
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "quarantine": self.quarantine,
+            "missing_properties": self.missing_properties,
+            "unknown_properties": self.unknown_properties,
+        }
+
+
+def validate_features(
+        json_data,
+        validator: FeatureValidator = DEFAULT_VALIDATOR,
+) -> tuple[list[dict], ValidationReport]:
+    """Split the features of a FeatureCollection into valid ones and a report.
+
+    Never raises on malformed input: anything that cannot be validated is
+    quarantined with a reason.
+    """
+    report = ValidationReport()
+    expected = validator.expected_properties
+    features = json_data.get('features') if isinstance(json_data, dict) else None
+    if not isinstance(features, list):
+        report.rejected["not_a_feature_collection"] += 1
+        return [], report
+
+    valid = []
+    seen_properties: set[str] = set()
+    for feature in features:
+        properties = (
+            feature.get('properties') if isinstance(feature, dict) else None)
+        if not isinstance(properties, dict):
+            reason = "not_a_feature"
+        else:
+            seen_properties.update(properties.keys() & expected)
+            try:
+                reason = validator.check_properties(properties)
+            except (TypeError, ValueError) as err:
+                reason = f"invalid:{type(err).__name__}"
+        if reason is None:
+            valid.append(feature)
+            continue
+        report.rejected[reason] += 1
+        if len(report.quarantine) < QUARANTINE_SIZE:
+            report.quarantine.append({"reason": reason, "feature": feature})
+
+    report.accepted = len(valid)
+    if features:
+        report.missing_properties = sorted(
+            expected - seen_properties)
+        first = features[0].get('properties') if isinstance(
+            features[0], dict) else None
+        if isinstance(first, dict):
+            report.unknown_properties = sorted(
+                set(first) - expected)
+    if report.rejected:
+        _LOGGER.warning(
+            "Quarantined %s of %s features: %s",
+            sum(report.rejected.values()), len(features), dict(report.rejected))
+    return valid, report
@@ -0,0 +1,164 @@
+"""Websocket API for the Polen Madrid integration.
+
+`polen_madrid/subscribe` sends a snapshot of every reading, then one delta
+event per coordinator update with only the readings that changed. The
+delta is built from the coordinator's snapshot diff and serialized once per
+update for all subscriptions. When the config entry is unloaded, e.g. on
+an options change, subscriptions end with a `closed` event and clients
+should subscribe again.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.json import json_bytes
+
+from .const import DOMAIN
+from .coordinator import PolenMadridData, PolenMadridDataUpdateCoordinator
+from .helpers import serialize_reading
+
+_LOGGER = logging.getLogger(__name__)
+
+WS_TYPE_SUBSCRIBE = f"{DOMAIN}/subscribe"
+
+
+def _serialize_data(data: PolenMadridData | None) -> list[dict]:
+    """Return every reading, serialized."""
+    if not data:
+        return []
+    return [serialize_reading(record) for record in data.values()]
+
+
+def _event_message(msg_id: int, partial: bytes) -> bytes:
+    """Append the subscription id to a pre-serialized event message."""
+    return b"".join((partial[:-1], b',"id":', str(msg_id).encode(), b"}"))
+
+
+class PollenDeltaPublisher:
+    """Diff coordinator updates once and push them to every subscriber."""
+
+    def __init__(self, coordinator: PolenMadridDataUpdateCoordinator) -> None:
+        """Initialize the publisher."""
+        self._coordinator = coordinator
+        self._subscribers: dict[tuple[int, int], tuple[Any, int]] = {}
+        self._data: PolenMadridData | None = None
+        self._unsub_coordinator: CALLBACK_TYPE | None = None
+
+    @property
+    def snapshot(self) -> list[dict]:
+        """Return every current reading."""
+        return _serialize_data(self._coordinator.data)
+
+    @callback
+    def async_subscribe(self, connection, msg_id: int) -> CALLBACK_TYPE:
+        """Register a subscription and return its unsubscribe callback."""
+        if self._unsub_coordinator is None:
+            # Only follow the coordinator while someone is listening
+            self._data = self._coordinator.data
+            self._unsub_coordinator = self._coordinator.async_add_listener(
+                self._async_publish)
+        key = (id(connection), msg_id)
+        self._subscribers[key] = (connection, msg_id)
+
+        @callback
+        def _async_unsubscribe() -> None:
+            self._subscribers.pop(key, None)
+            if not self._subscribers:
+                self._async_stop()
+
+        return _async_unsubscribe
+
+    @callback
+    def _async_stop(self) -> None:
+        """Stop following the coordinator."""
+        if self._unsub_coordinator is not None:
+            self._unsub_coordinator()
+            self._unsub_coordinator = None
+        self._data = None
+
+    @callback
+    def async_close(self) -> None:
+        """End every subscription, as the coordinator is unloaded."""
+        for connection, msg_id in self._subscribers.values():
+            connection.subscriptions.pop(msg_id, None)
+            connection.send_event(msg_id, {"type": "closed"})
+        self._subscribers.clear()
+        self._async_stop()
+
+    @callback
+    def _async_publish(self) -> None:
+        """Send the readings changed by the last update."""
+        data = self._coordinator.data
+        if data is self._data:
+            # Failed update or 304 Not Modified: nothing changed
+            return
+        self._data = data
+        changes = self._coordinator.changes
+        if not changes:
+            return
+        changed = [
+            serialize_reading(data[key])
+            for key in sorted(changes.added | changes.changed, key=str)]
+        removed = [
+            [str(station_id), pollen_code]
+            for station_id, pollen_code in sorted(changes.removed, key=str)]
+
+        partial = json_bytes({
+            "type": "event",
+            "event": {"type": "delta", "changed": changed, "removed": removed},
+        })
+        _LOGGER.debug(
+            "Sending %s changed and %s removed readings to %s subscribers.",
+            len(changed), len(removed), len(self._subscribers))
+        for connection, msg_id in self._subscribers.values():
+            connection.send_message(_event_message(msg_id, partial))
+
+
+@callback
+def _async_get_publisher(
+        coordinator: PolenMadridDataUpdateCoordinator) -> PollenDeltaPublisher:
+    """Return the publisher of a coordinator, creating it on first use."""
+    if coordinator.delta_publisher is None:
+        coordinator.delta_publisher = PollenDeltaPublisher(coordinator)
+    return coordinator.delta_publisher
+
+
+@callback
+def async_close_subscriptions(
+        coordinator: PolenMadridDataUpdateCoordinator) -> None:
+    """End the subscriptions to a coordinator being unloaded."""
+    if coordinator.delta_publisher is not None:
+        coordinator.delta_publisher.async_close()
+        coordinator.delta_publisher = None
+
+
+@websocket_api.websocket_command({vol.Required("type"): WS_TYPE_SUBSCRIBE})
+@callback
+def websocket_subscribe(
+        hass: HomeAssistant,
+        connection: websocket_api.ActiveConnection,
+        msg: dict[str, Any]) -> None:
+    """Subscribe to the pollen readings."""
+    coordinators = hass.data.get(DOMAIN, {})
+    if not coordinators:
+        connection.send_error(
+            msg["id"], "not_loaded", "Polen Madrid is not set up.")
+        return
+    # Only a single config entry is allowed for this integration.
+    publisher = _async_get_publisher(next(iter(coordinators.values())))
+
+    connection.subscriptions[msg["id"]] = publisher.async_subscribe(
+        connection, msg["id"])
+    connection.send_result(msg["id"])
+    connection.send_event(
+        msg["id"], {"type": "snapshot", "readings": publisher.snapshot})
+
+
+@callback
+def async_setup_websocket_api(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_subscribe)
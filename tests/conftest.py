@@ -1,6 +1,14 @@
+import json
+from datetime import timedelta
+from urllib.parse import parse_qsl
+
+import orjson
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
 
+from custom_components.polen_madrid import coordinator
+
 # Define MOCK_API_DATA globally for tests needing API responses
 # (Ensure structure matches what parse_api_response expects AFTER json decode)
 MOCK_PARSED_DATA_STRUCTURE = {
@@ -55,19 +63,123 @@ MOCK_RAW_API_RESPONSE = {
 }
 
 
+def pytest_addoption(parser):
+    """Add the option running the timing benchmarks."""
+    parser.addoption(
+        "--run-benchmarks", action="store_true",
+        help="run the tests asserting timing budgets")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the timing benchmarks unless asked for; they depend on the host."""
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="timing benchmark, use --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations):
     """Enable custom integrations defined in the custom_components directory."""
     yield
 
 
+@pytest.fixture(autouse=True)
+def no_page_retry_delay():
+    """Retry failed pages at once."""
+    with patch.object(coordinator, "API_PAGE_RETRY_DELAY", timedelta(0)):
+        yield
+
+
 @pytest.fixture
 def mock_requests_post():
-    """Fixture to mock requests.post, returning RAW API data by default."""
-    with patch("requests.post") as mock_post:
+    """Fixture to mock the client session's post, returning RAW API data by default."""
+    with patch("requests.Session.post") as mock_post:
         mock_response = MagicMock()
         mock_response.raise_for_status.return_value = None
         # Default mock returns raw data structure parse_api_response expects
         mock_response.json.return_value = MOCK_RAW_API_RESPONSE
+        mock_response.content = json.dumps(MOCK_RAW_API_RESPONSE).encode()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        # The client streams the undecoded body; serve the current content
+        mock_response.raw.stream.side_effect = (
+            lambda *args, **kwargs: iter([mock_response.content]))
         mock_post.return_value = mock_response
         yield mock_post
+
+
+@pytest.fixture
+def make_raw_api_response():
+    """Return a factory for synthetic raw API responses of a given size."""
+
+    def _make(stations: int, pollens: int) -> dict:
+        features = []
+        for station in range(stations):
+            for pollen in range(pollens):
+                features.append({
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [400000 + station * 100, 4450000 + station * 100],
+                    },
+                    "properties": {
+                        "NM_ID_CAPTADORES": str(28000000 + station),
+                        "CD_CAPTADORES": f"STN-{station}",
+                        "DS_NOMBRE": f"Estación {station}",
+                        "NM_LONGITUD": 400000 + station * 100,
+                        "NM_LATITUD": 4450000 + station * 100,
+                        "NM_ALTITUD": 600, "NM_ALTURA": 10,
+                        "FC_FECHA_MEDICION": "2024-01-01T10:00:00Z",
+                        "NM_VALOR": pollen % 5, "CD_MATERIAS": f"P{pollen:02d}",
+                        "DS_MATERIAS": f"Polen {pollen}",
+                        "NM_ALTO": 3, "NM_MEDIO": 2, "NM_MUYALTO": 0,
+                    },
+                })
+        return {"type": "FeatureCollection", "features": features}
+
+    return _make
+
+
+def paging_server(
+        features: list,
+        report_matched: bool = True,
+        max_features: int | None = None,
+        failures: dict | None = None):
+    """Return a Session.post stand-in implementing WFS 2.0 paging.
+
+    Pages carry an ETag and are answered with 304 when unchanged.
+    """
+    failures = failures if failures is not None else {}
+
+    def _post(url, data="", **kwargs):
+        params = dict(parse_qsl(data))
+        response = MagicMock()
+        response.status_code = 200
+        response.headers = {}
+        if params.get("resultType") == "hits":
+            body = (
+                f'<wfs:FeatureCollection numberMatched="{len(features)}" '
+                'numberReturned="0"/>').encode()
+        else:
+            start = int(params.get("startIndex", 0))
+            if failures.get(start):
+                failures[start] -= 1
+                raise requests.exceptions.Timeout("page timeout")
+            count = int(params.get("count", len(features)))
+            if max_features:
+                count = min(count, max_features)
+            page = {"type": "FeatureCollection", "features": features[start:start + count]}
+            if report_matched:
+                page["numberMatched"] = len(features)
+            body = orjson.dumps(page)
+            etag = f'"{hash(body)}"'
+            response.headers = {"etag": etag}
+            if kwargs.get("headers", {}).get("if-none-match") == etag:
+                response.status_code = 304
+        response.raw.stream.side_effect = lambda *args, **kwargs: iter([body])
+        return response
+
+    return _post
@@ -0,0 +1,94 @@
+"""Tests for the Polen Madrid API client."""
+
+import gzip
+import json
+
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.api import (
+    PolenMadridApiClient,
+    PolenMadridApiError,
+    read_body,
+)
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+from custom_components.polen_madrid.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+
+
+def test_read_body_gzip() -> None:
+    """Test streaming decompression of a gzip body split in chunks."""
+    body = json.dumps({"features": list(range(1000))}).encode()
+    compressed = gzip.compress(body)
+    chunks = [compressed[i:i + 100] for i in range(0, len(compressed), 100)]
+
+    payload, bytes_on_wire = read_body(chunks, "gzip")
+
+    assert payload == body
+    assert bytes_on_wire == len(compressed)
+
+
+def test_read_body_invalid_gzip() -> None:
+    """Test corrupt compressed bodies raise an API error."""
+    with pytest.raises(PolenMadridApiError):
+        read_body([b"not gzip"], "gzip")
+
+
+async def test_compressed_transfer_stats(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test compression is negotiated and transfer sizes are recorded."""
+    response = mock_requests_post.return_value
+    body = response.content
+    response.content = gzip.compress(body)
+    response.headers = {"content-encoding": "gzip"}
+    client = PolenMadridApiClient(hass)
+
+    payload = await client.async_get_payload(cache_control="max-age=60")
+
+    assert payload == body
+    headers = mock_requests_post.call_args.kwargs["headers"]
+    assert "gzip" in headers["accept-encoding"]
+    assert headers["cache-control"] == "max-age=60"
+    assert "pragma" not in headers
+    assert client.stats.content_encoding == "gzip"
+    assert client.stats.bytes_on_wire == len(response.content)
+    assert client.stats.decompressed_bytes == len(body)
+
+
+async def test_conditional_request_not_modified(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a 304 response reuses the previous payload."""
+    response = mock_requests_post.return_value
+    response.headers = {"etag": '"v1"'}
+    client = PolenMadridApiClient(hass)
+
+    first = await client.async_get_payload(conditional=True)
+
+    response.status_code = 304
+    second = await client.async_get_payload(conditional=True)
+
+    headers = mock_requests_post.call_args.kwargs["headers"]
+    assert headers["if-none-match"] == '"v1"'
+    assert second == first
+    assert client.stats.not_modified == 1
+
+
+async def test_diagnostics_transfer_stats(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test transfer metrics are exposed through diagnostics."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+
+    assert diagnostics["coordinator"]["records"] == 2
+    assert diagnostics["transfer"]["requests"] == 1
+    assert diagnostics["transfer"]["decompressed_bytes"] > 0
@@ -0,0 +1,146 @@
+"""Tests for the Polen Madrid season calendar."""
+
+from datetime import date, datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+from custom_components.polen_madrid.seasons import (
+    SEASON_RETENTION_YEARS,
+    PollenSeasonTracker,
+    SpanIndex,
+    PollenSpan,
+)
+
+
+def _record(day: str, pollen_code: str = "PLT") -> dict:
+    return {
+        'station_id': "28079016", 'pollen_code': pollen_code,
+        'pollen_type': "Platanus", 'measurement_date': f"{day}T00:00:00Z",
+    }
+
+
+def test_tracker_extends_and_closes_spans() -> None:
+    """Test spans are extended day by day and closed on level changes."""
+    tracker = PollenSeasonTracker()
+
+    assert tracker.update(_record("2024-03-01"), "Medio")
+    assert tracker.update(_record("2024-03-02"), "Medio")
+    # Re-polling the same measurement day does not change anything
+    assert not tracker.update(_record("2024-03-02"), "Medio")
+    assert tracker.update(_record("2024-03-03"), "Alto")
+    assert tracker.update(_record("2024-03-04"), "Bajo")
+
+    spans = tracker.spans("28079016", date(2024, 3, 1), date(2024, 3, 31))
+    assert [(s.level, s.start, s.end) for s in spans] == [
+        ("Medio", date(2024, 3, 1), date(2024, 3, 2)),
+        ("Alto", date(2024, 3, 3), date(2024, 3, 3)),
+    ]
+    assert tracker.current("28079016") == []
+
+    # A gap in measurements starts a new span
+    tracker.update(_record("2024-03-10"), "Medio")
+    tracker.update(_record("2024-03-12"), "Medio")
+    assert [s.start for s in tracker.current("28079016")] == [date(2024, 3, 12)]
+
+    restored = PollenSeasonTracker.from_dict(tracker.as_dict())
+    assert restored.as_dict() == tracker.as_dict()
+
+
+def test_span_index_overlapping() -> None:
+    """Test range queries on the interval index."""
+    index = SpanIndex()
+    for start, end in ((1, 20), (5, 6), (25, 27)):
+        index.add(PollenSpan(
+            "1", "PLT", "Platanus", "Medio",
+            date(2024, 4, start), date(2024, 4, end)))
+
+    found = index.overlapping(date(2024, 4, 10), date(2024, 4, 26))
+    assert [s.start.day for s in found] == [1, 25]
+    assert index.overlapping(date(2024, 4, 21), date(2024, 4, 24)) == []
+
+
+def test_tracker_prunes_old_seasons() -> None:
+    """Test closed spans older than the retained seasons are dropped."""
+    tracker = PollenSeasonTracker()
+    for year in range(2010, 2010 + SEASON_RETENTION_YEARS + 2):
+        tracker.update(_record(f"{year}-04-01"), "Alto")
+        tracker.update(_record(f"{year}-04-02"), "Bajo")
+
+    spans = tracker.spans("28079016", date(2000, 1, 1), date(2030, 1, 1))
+    assert [span.start.year for span in spans] == list(
+        range(2012, 2010 + SEASON_RETENTION_YEARS + 2))
+    assert len(tracker.as_dict()['closed']) == SEASON_RETENTION_YEARS
+
+
+def test_span_index_prune() -> None:
+    """Test pruning keeps the index's range queries correct."""
+    index = SpanIndex()
+    for start, end in ((1, 20), (5, 6), (25, 27)):
+        index.add(PollenSpan(
+            "1", "PLT", "Platanus", "Medio",
+            date(2024, 4, start), date(2024, 4, end)))
+
+    assert index.prune(date(2024, 4, 10)) == 1
+    assert [s.start.day for s in index] == [1, 25]
+    assert [s.start.day for s in index.overlapping(
+        date(2024, 4, 15), date(2024, 4, 15))] == [1]
+
+
+async def test_calendar_setup(hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a season calendar is created per selected station."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("calendar.polen_madrid_retiro_temporadas")
+    assert state is not None
+    # All mocked readings are at level Bajo, so no season is ongoing
+    assert state.state == "off"
+
+
+async def test_calendar_events_in_local_days(
+        hass: HomeAssistant, hass_storage, mock_requests_post) -> None:
+    """Test the requested range is taken in local time."""
+    dt_util.set_default_time_zone(dt_util.get_time_zone("Europe/Madrid"))
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    hass_storage[f"{DOMAIN}.seasons.{entry.entry_id}"] = {
+        "version": 1, "data": {}}
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    calendar = hass.data["calendar"].get_entity(
+        "calendar.polen_madrid_retiro_temporadas")
+    calendar._tracker.update(_record("2024-03-02"), "Alto")
+
+    # Midnight of March 2 in Madrid is still March 1 in UTC
+    start = datetime(2024, 3, 1, 23, tzinfo=timezone.utc)
+    events = await calendar.async_get_events(
+        hass, start, start + timedelta(hours=1))
+
+    assert dt_util.as_local(start).date() == date(2024, 3, 2)
+    assert [event.start for event in events] == [date(2024, 3, 2)]
+
+    # The end is exclusive: a range ending at local midnight of March 2
+    # does not include the span starting that day
+    end = datetime(2024, 3, 1, 23, tzinfo=timezone.utc)
+    events = await calendar.async_get_events(
+        hass, end - timedelta(days=1), end)
+    assert events == []
+
+    # The spans are removed with the config entry
+    await hass.async_block_till_done()
+    assert await hass.config_entries.async_remove(entry.entry_id)
+    await hass.async_block_till_done()
+    assert f"{DOMAIN}.seasons.{entry.entry_id}" not in hass_storage
@@ -0,0 +1,72 @@
+"""Tests for capturing and replaying raw WFS responses."""
+
+import copy
+import gzip
+from unittest.mock import patch
+
+import orjson
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.api import PolenMadridApiClient
+from custom_components.polen_madrid.capture import (
+    PayloadRecorder,
+    ReplayTransport,
+    async_replay,
+    capture_layer,
+    list_captures,
+)
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+
+from conftest import MOCK_RAW_API_RESPONSE
+
+
+def test_recorder_rotates_captures(tmp_path) -> None:
+    """Test only the newest captures are kept, compressed."""
+    recorder = PayloadRecorder(tmp_path, max_files=3)
+
+    paths = [recorder.record("pollen", f"{i}".encode()) for i in range(5)]
+
+    assert list_captures(tmp_path) == paths[2:]
+    assert gzip.decompress(paths[-1].read_bytes()) == b"4"
+    assert capture_layer(paths[-1]) == "pollen"
+
+
+async def test_capture_and_replay_through_pipeline(
+        hass: HomeAssistant, mock_requests_post, tmp_path) -> None:
+    """Test captured responses replay through the coordinator and entities."""
+    client = PolenMadridApiClient(hass)
+    client.recorder = PayloadRecorder(tmp_path)
+    response = mock_requests_post.return_value
+    for value in (1, 7):
+        raw = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+        raw["features"][0]["properties"]["NM_VALOR"] = value
+        response.content = orjson.dumps(raw)
+        await client.async_get_payload()
+    assert len(list_captures(tmp_path)) == 2
+
+    mock_requests_post.reset_mock()
+    transport = ReplayTransport.from_directory(tmp_path)
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    with patch(
+            "custom_components.polen_madrid.coordinator.PolenMadridApiClient",
+            lambda hass: PolenMadridApiClient(hass, transport=transport)):
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+    state_id = "sensor.polen_madrid_retiro_platanus"
+    assert hass.states.get(state_id).state == "1"
+
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    # The setup refresh consumed the first capture
+    transport.rewind()
+    assert await async_replay(coordinator) == 2
+    await hass.async_block_till_done()
+
+    assert hass.states.get(state_id).state == "7"
+    assert coordinator.client.stats.content_encoding == "gzip"
+    mock_requests_post.assert_not_called()
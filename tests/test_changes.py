@@ -0,0 +1,210 @@
+"""Tests for the Polen Madrid snapshot diffs."""
+
+import copy
+from unittest.mock import patch
+
+import orjson
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers import issue_registry as ir
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_capture_events,
+)
+
+from custom_components.polen_madrid.changes import diff_snapshots
+from custom_components.polen_madrid.const import (
+    CONF_STATIONS,
+    DOMAIN,
+    EVENT_CATALOG_CHANGED,
+)
+from custom_components.polen_madrid import coordinator as coordinator_module
+from custom_components.polen_madrid.coordinator import (
+    PolenMadridDataUpdateCoordinator,
+    build_data_from_payload,
+)
+
+from conftest import MOCK_RAW_API_RESPONSE, paging_server
+
+
+def _feature(station_id: str, pollen_code: str, **properties) -> dict:
+    feature = copy.deepcopy(MOCK_RAW_API_RESPONSE["features"][0])
+    feature["properties"].update(
+        NM_ID_CAPTADORES=station_id, CD_MATERIAS=pollen_code, **properties)
+    return feature
+
+
+def _payload(features: list) -> bytes:
+    return orjson.dumps({"type": "FeatureCollection", "features": features})
+
+
+def test_diff_snapshots(make_raw_api_response) -> None:
+    """Test readings and catalog changes are found between snapshots."""
+    raw = make_raw_api_response(stations=3, pollens=4)
+    old = build_data_from_payload(orjson.dumps(raw))
+
+    features = raw["features"]
+    # Station 2 retired, P03 dropped from station 0
+    features = [
+        feature for feature in features
+        if feature["properties"]["NM_ID_CAPTADORES"] != "28000002"
+        and not (feature["properties"]["NM_ID_CAPTADORES"] == "28000000"
+                 and feature["properties"]["CD_MATERIAS"] == "P03")]
+    features[0]["properties"]["NM_VALOR"] = 9
+    features[1]["properties"]["NM_MEDIO"] = 1
+    features.append(_feature("28000009", "NEW", DS_NOMBRE="Nueva", DS_MATERIAS="Nuevo"))
+    new = build_data_from_payload(_payload(features))
+
+    diff = diff_snapshots(old, new)
+
+    assert diff.added == {("28000009", "NEW")}
+    assert diff.removed == {("28000000", "P03")} | {
+        ("28000002", f"P{pollen:02d}") for pollen in range(4)}
+    assert diff.changed == {("28000000", "P00"), ("28000000", "P01")}
+    assert diff.stations_added == {"28000009": "Nueva"}
+    assert diff.stations_removed == {"28000002": "Estación 2"}
+    assert diff.pollens_added == {"NEW": "Nuevo"}
+    assert diff.pollens_removed == {}
+    assert diff.thresholds_changed == {("28000000", "P01"): ((2, 3), (1, 3))}
+    assert diff.catalog_changed
+
+    # Identical readings of another snapshot, or the same snapshot
+    assert not diff_snapshots(new, build_data_from_payload(_payload(features)))
+    assert not diff_snapshots(new, new)
+
+
+async def test_paged_diff_fingerprints_changed_pages_only(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test only the records of re-parsed pages are fingerprinted."""
+    features = make_raw_api_response(stations=50, pollens=25)["features"]
+    mock_requests_post.side_effect = paging_server(features)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    await coordinator.async_refresh()
+
+    # One reading of the last page changes
+    features[-1]["properties"]["NM_VALOR"] = 9
+    with patch.object(
+            coordinator_module, "record_fingerprint",
+            wraps=coordinator_module.record_fingerprint) as fingerprint:
+        await coordinator.async_refresh()
+
+    # The 250 features of the last page, fingerprinted while parsing it
+    assert fingerprint.call_count == 250
+    assert coordinator.changes.changed == {("28000049", "P24")}
+
+
+async def test_coordinator_changes(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test updates announce changes and add and remove sensors."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    events = async_capture_events(hass, EVENT_CATALOG_CHANGED)
+    registry = er.async_get(hass)
+    cup = registry.async_get_entity_id("sensor", DOMAIN, "polen_madrid_28079016_CUP")
+    assert not coordinator.changes
+
+    # CUP no longer reported, a new pollen type and a new station
+    plt = MOCK_RAW_API_RESPONSE["features"][0]
+    mock_requests_post.return_value.content = _payload([
+        plt,
+        _feature("28079016", "ALN", DS_MATERIAS="Alnus"),
+        _feature("28079099", "PLT", DS_NOMBRE="Getafe"),
+    ])
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.changes.removed == {("28079016", "CUP")}
+    [event] = events
+    assert event.data["stations_added"] == {"28079099": "Getafe"}
+    assert event.data["pollens_added"] == {"ALN": "Alnus"}
+    assert event.data["pollens_removed"] == {"CUP": "Cupresáceas / Taxáceas"}
+    issues = ir.async_get(hass)
+    assert issues.async_get_issue(DOMAIN, "new_stations")
+    # Only readings of selected stations get sensors
+    assert registry.async_get_entity_id(
+        "sensor", DOMAIN, "polen_madrid_28079016_ALN")
+    assert not registry.async_get_entity_id(
+        "sensor", DOMAIN, "polen_madrid_28079099_PLT")
+    assert hass.states.get(cup).state == "unavailable"
+
+    # The station leaves again and CUP comes back
+    mock_requests_post.return_value.content = _payload([
+        plt,
+        MOCK_RAW_API_RESPONSE["features"][1],
+        _feature("28079016", "ALN", DS_MATERIAS="Alnus"),
+    ])
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert coordinator.retired_stations == {"28079099": "Getafe"}
+    assert issues.async_get_issue(DOMAIN, "stations_retired")
+    assert hass.states.get(cup).state == "0"
+
+
+async def test_stations_catalog_persisted(
+        hass: HomeAssistant, hass_storage, mock_requests_post) -> None:
+    """Test station issues survive restarts and follow the catalog."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    # Getafe left the feed before the restart
+    hass_storage[f"{DOMAIN}.stations.{entry.entry_id}"] = {
+        "version": 1,
+        "data": {
+            "known": {"28079016": "Madrid - Retiro", "28079099": "Getafe"},
+            "announced": {},
+            "retired": {"28079099": "Getafe"},
+        },
+    }
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    issues = ir.async_get(hass)
+    assert issues.async_get_issue(DOMAIN, "stations_retired")
+
+    # Getafe comes back: retired no more, and not new either
+    plt = MOCK_RAW_API_RESPONSE["features"][0]
+    mock_requests_post.return_value.content = _payload([
+        plt, _feature("28079099", "PLT", DS_NOMBRE="Getafe")])
+    await coordinator.async_refresh()
+    assert not issues.async_get_issue(DOMAIN, "stations_retired")
+    assert not issues.async_get_issue(DOMAIN, "new_stations")
+
+    # New stations accumulate in the issue until selected
+    mock_requests_post.return_value.content = _payload([
+        plt, _feature("28079099", "PLT", DS_NOMBRE="Getafe"),
+        _feature("28079101", "PLT", DS_NOMBRE="Alcalá")])
+    await coordinator.async_refresh()
+    mock_requests_post.return_value.content = _payload([
+        plt, _feature("28079099", "PLT", DS_NOMBRE="Getafe"),
+        _feature("28079101", "PLT", DS_NOMBRE="Alcalá"),
+        _feature("28079102", "PLT", DS_NOMBRE="Aranjuez")])
+    await coordinator.async_refresh()
+    issue = issues.async_get_issue(DOMAIN, "new_stations")
+    assert issue.translation_placeholders["stations"] == (
+        "Alcalá (28079101), Aranjuez (28079102)")
+
+    hass.config_entries.async_update_entry(entry, options={
+        CONF_STATIONS: ["28079016", "28079101", "28079102"]})
+    await hass.async_block_till_done()
+    assert not issues.async_get_issue(DOMAIN, "new_stations")
+
+    # The catalog is kept across restarts and removed with the entry
+    await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
+    stored = hass_storage[f"{DOMAIN}.stations.{entry.entry_id}"]["data"]
+    assert set(stored["known"]) == {
+        "28079016", "28079099", "28079101", "28079102"}
+    assert await hass.config_entries.async_remove(entry.entry_id)
+    await hass.async_block_till_done()
+    assert f"{DOMAIN}.stations.{entry.entry_id}" not in hass_storage
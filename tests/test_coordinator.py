@@ -0,0 +1,338 @@
+"""Tests for the Polen Madrid data update coordinator."""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qsl
+
+import orjson
+import pytest
+import requests
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.const import (
+    AIR_QUALITY_TYPE_NAMES,
+    CONF_AIR_QUALITY,
+    CONF_REFRESH_MIN_AGE,
+    CONF_STATIONS,
+    DOMAIN,
+)
+from custom_components.polen_madrid.coordinator import (
+    PolenMadridDataUpdateCoordinator,
+    build_data_from_payload,
+    parse_page,
+)
+from custom_components.polen_madrid.providers import MADRID_PROVIDER
+
+from conftest import paging_server
+
+# Longest the event loop may stall while a large payload is processed
+LOOP_BLOCK_BUDGET = 0.025
+
+
+def test_build_data_from_payload(make_raw_api_response) -> None:
+    """Test decoding and processing a raw payload."""
+    payload = orjson.dumps(make_raw_api_response(stations=3, pollens=4))
+
+    data = build_data_from_payload(payload)
+
+    assert len(data) == 12
+    assert len(data.by_station["28000001"]) == 4
+    assert data[("28000002", "P03")]["pollen_value"] == 3
+
+
+async def test_large_payload_processed_in_executor(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test a large payload is decoded and indexed off the event loop."""
+    payload = orjson.dumps(make_raw_api_response(stations=100, pollens=25))
+    mock_requests_post.return_value.content = payload
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    threads = []
+
+    def _parse_page(*args):
+        threads.append(threading.current_thread())
+        return parse_page(*args)
+
+    with patch(
+            "custom_components.polen_madrid.coordinator.parse_page", _parse_page):
+        await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert len(coordinator.data) == 2_500
+    assert threads and threading.main_thread() not in threads
+
+
+@pytest.mark.benchmark
+async def test_large_payload_does_not_block_loop(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test event loop stalls while refreshing a ~1 MB payload stay short."""
+    payload = orjson.dumps(make_raw_api_response(stations=100, pollens=25))
+    mock_requests_post.return_value.content = payload
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def _probe() -> None:
+        nonlocal max_lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+    probe = asyncio.ensure_future(_probe())
+    await coordinator.async_refresh()
+    done.set()
+    await probe
+
+    assert coordinator.last_update_success
+    assert max_lag < LOOP_BLOCK_BUDGET, (
+        f"Payload {len(payload) / 1e6:.1f} MB, "
+        f"max loop stall {max_lag * 1000:.1f} ms")
+
+
+def _air_quality_response(value: float) -> MagicMock:
+    """Return a mocked response of an air quality layer."""
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {}
+    response.raw.stream.side_effect = lambda *args, **kwargs: iter([json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [441000, 4474000]},
+                "properties": {
+                    "CD_ESTACION": "28079049", "DS_ESTACION": "Retiro",
+                    "FC_FECHA_MEDICION": "2024-01-01T10:00:00Z",
+                    "NM_VALOR": value,
+                },
+            },
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [460000, 4490000]},
+                "properties": {
+                    "CD_ESTACION": "28005002", "DS_ESTACION": "Alcalá",
+                    "FC_FECHA_MEDICION": "2024-01-01T10:00:00Z",
+                    "NM_VALOR": 99,
+                },
+            },
+        ],
+    }).encode()])
+    return response
+
+
+async def test_air_quality_layer_failure_is_isolated(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a failing air quality layer does not affect the other layers."""
+    pollen_response = mock_requests_post.return_value
+
+    def _post(url, **kwargs):
+        if AIR_QUALITY_TYPE_NAMES["PM2_5"] in url:
+            raise requests.exceptions.ConnectionError("layer down")
+        if AIR_QUALITY_TYPE_NAMES["NO2"] in url:
+            return _air_quality_response(41)
+        return pollen_response
+
+    mock_requests_post.side_effect = _post
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        options={CONF_STATIONS: ["28079016"], CONF_AIR_QUALITY: True},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    # All three layers were requested through the shared session
+    assert mock_requests_post.call_count == 3
+    air_quality = hass.data[DOMAIN][entry.entry_id].air_quality_coordinator
+    assert air_quality.last_update_success
+    assert list(air_quality.layer_errors) == ["PM2_5"]
+
+    assert hass.states.get(
+        "sensor.polen_madrid_retiro_platanus").state == "1"
+    # The nearest air quality station is used
+    no2 = hass.states.get(
+        "sensor.polen_madrid_retiro_nitrogen_dioxide_no2")
+    assert no2.state == "41"
+    assert no2.attributes["air_quality_station_id"] == "28079049"
+    assert hass.states.get(
+        "sensor.polen_madrid_retiro_particulate_matter_2_5mm_pm2_5"
+    ).state == "unavailable"
+
+
+async def test_refresh_requests_are_coalesced(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a burst of refresh requests makes a single network call."""
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    await asyncio.gather(
+        *(coordinator.async_request_refresh() for _ in range(50)))
+
+    assert mock_requests_post.call_count == 1
+    assert coordinator.last_update_success
+    assert len(coordinator.data) == 2
+    assert coordinator.refresh_stats.fetched == 1
+    assert coordinator.refresh_stats.joined == 49
+
+    # Fresh data answers further requests without fetching
+    await coordinator.async_request_refresh()
+    assert mock_requests_post.call_count == 1
+    assert coordinator.refresh_stats.fresh == 1
+
+    # Once older than the minimum age, a request fetches again
+    coordinator.refresh_min_age = timedelta(0)
+    await coordinator.async_request_refresh()
+    assert mock_requests_post.call_count == 2
+
+
+async def test_refresh_requests_join_scheduled_refresh(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test requests made during a refresh they did not start join it."""
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    coordinator.refresh_min_age = timedelta(0)
+
+    # As the first or a scheduled refresh, not a requested one
+    scheduled = hass.async_create_task(coordinator.async_refresh())
+    await asyncio.sleep(0)
+    await asyncio.gather(
+        *(coordinator.async_request_refresh() for _ in range(10)))
+    await scheduled
+
+    assert mock_requests_post.call_count == 1
+    assert coordinator.refresh_stats.joined == 10
+    assert coordinator.refresh_stats.fetched == 0
+
+    # Nothing is in flight any more: a request fetches
+    await coordinator.async_request_refresh()
+    assert mock_requests_post.call_count == 2
+
+
+async def test_scheduled_refresh_joins_requested_refresh(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a refresh started during a requested one does not fetch again."""
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    coordinator.refresh_min_age = timedelta(0)
+
+    requested = hass.async_create_task(coordinator.async_request_refresh())
+    await asyncio.sleep(0)
+    # As the update interval would while the requested refresh runs
+    await coordinator.async_refresh()
+    await requested
+
+    assert mock_requests_post.call_count == 1
+    assert coordinator.last_update_success
+
+
+async def test_shutdown_cancels_requested_refresh(
+        hass: HomeAssistant) -> None:
+    """Test shutting down cancels a requested refresh in flight."""
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    started = asyncio.Event()
+
+    async def _async_fetch_data():
+        started.set()
+        await asyncio.Event().wait()
+
+    coordinator._async_fetch_data = _async_fetch_data
+    requested = hass.async_create_task(coordinator.async_request_refresh())
+    await started.wait()
+    task = coordinator._refresh_task
+
+    await coordinator.async_shutdown()
+    with pytest.raises(asyncio.CancelledError):
+        await requested
+    assert task.cancelled()
+
+
+async def test_refresh_min_age_option(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the refresh window is set from the options."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        options={CONF_STATIONS: ["28079016"], CONF_REFRESH_MIN_AGE: 0},
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    assert coordinator.refresh_min_age == timedelta(0)
+
+    await coordinator.async_request_refresh()
+    assert mock_requests_post.call_count == 2
+
+
+async def test_paged_retrieval(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test a layer larger than a page is fetched in retried, sorted pages."""
+    features = make_raw_api_response(stations=50, pollens=25)["features"]
+    failures = {0: 1, 1000: 1}
+    mock_requests_post.side_effect = paging_server(features, failures=failures)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert len(coordinator.data) == 1_250
+    assert coordinator.data.validation.accepted == 1_250
+    # Three pages, and only the failed one was requested again
+    starts = [
+        dict(parse_qsl(call.kwargs["data"]))["startIndex"]
+        for call in mock_requests_post.call_args_list]
+    assert sorted(starts) == ["0", "0", "1000", "1000", "500"]
+    # Pages are requested in a stable order
+    assert all(
+        dict(parse_qsl(call.kwargs["data"]))["sortBy"]
+        == "NM_ID_CAPTADORES,CD_MATERIAS"
+        for call in mock_requests_post.call_args_list)
+
+
+async def test_paged_retrieval_memory_peak(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response,
+        caplog: pytest.LogCaptureFixture) -> None:
+    """Test the peak of a paged refresh covers parsing the pages."""
+    caplog.set_level(logging.DEBUG, logger="custom_components.polen_madrid")
+    features = make_raw_api_response(stations=50, pollens=25)["features"]
+    mock_requests_post.side_effect = paging_server(features)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    await coordinator.async_refresh()
+
+    memory = coordinator.data.memory
+    pages = coordinator._pages[MADRID_PROVIDER.name].values()
+    assert len(pages) == 3
+    assert memory.payload_bytes == sum(len(payload) for payload, _ in pages)
+    # Decoding and parsing a page allocates more than the page itself
+    assert memory.peak_bytes > max(len(payload) for payload, _ in pages)
+    assert memory.peak_bytes == max(page.peak_bytes for _, page in pages)
+
+
+async def test_paged_retrieval_sizing(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test pages are sized by hits and by the server's feature limit."""
+    features = make_raw_api_response(stations=30, pollens=25)["features"]
+    # A full first page without numberMatched asks for the hits
+    mock_requests_post.side_effect = paging_server(features, report_matched=False)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    await coordinator.async_refresh()
+
+    assert len(coordinator.data) == 750
+    # The first page, the hits request and the second page
+    assert mock_requests_post.call_count == 3
+
+    # A server returning at most 200 features per response
+    mock_requests_post.reset_mock()
+    mock_requests_post.side_effect = paging_server(features, max_features=200)
+    await coordinator.async_refresh()
+
+    assert len(coordinator.data) == 750
+    assert mock_requests_post.call_count == 4
@@ -0,0 +1,108 @@
+"""Tests for the Polen Madrid HTTP API."""
+
+import copy
+import gzip
+import json
+
+import orjson
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+from custom_components.polen_madrid.http_api import GEOJSON_URL
+
+from conftest import MOCK_RAW_API_RESPONSE
+
+
+async def _setup_entry(hass: HomeAssistant):
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return hass.data[DOMAIN][entry.entry_id]
+
+
+async def test_stations_geojson(
+        hass: HomeAssistant, hass_client, mock_requests_post) -> None:
+    """Test the stations are served as WGS84 GeoJSON."""
+    await _setup_entry(hass)
+    client = await hass_client()
+
+    response = await client.get(
+        GEOJSON_URL, headers={"Accept-Encoding": "identity"})
+
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/geo+json"
+    document = await response.json(content_type=None)
+    [feature] = document["features"]
+    longitude, latitude = feature["geometry"]["coordinates"]
+    # Madrid - Retiro
+    assert (round(latitude, 2), round(longitude, 2)) == (40.42, -3.7)
+    properties = feature["properties"]
+    assert properties["location_name"] == "Madrid - Retiro"
+    assert properties["measured_at"] == "2024-01-01T10:00:00+00:00"
+    assert properties["pollens"]["PLT"]["pollen_value"] == 1
+    assert set(properties["pollens"]) == {"CUP", "PLT"}
+
+
+async def test_stations_geojson_cached_with_etag(
+        hass: HomeAssistant, hass_client, mock_requests_post) -> None:
+    """Test the compressed document is built once and revalidated by ETag."""
+    coordinator = await _setup_entry(hass)
+    client = await hass_client()
+
+    response = await client.get(
+        GEOJSON_URL, headers={"Accept-Encoding": "gzip"}, auto_decompress=False)
+    assert response.headers["Content-Encoding"] == "gzip"
+    body = await response.read()
+    assert json.loads(gzip.decompress(body))["type"] == "FeatureCollection"
+    etag = response.headers["ETag"]
+    document = coordinator.geojson_document
+
+    response = await client.get(
+        GEOJSON_URL,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        auto_decompress=False)
+    assert response.status == 304
+    assert coordinator.geojson_document is document
+
+    # The uncompressed representation has its own ETag
+    response = await client.get(
+        GEOJSON_URL,
+        headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+
+    # An update with the same readings keeps the ETag
+    await coordinator.async_refresh()
+    response = await client.get(
+        GEOJSON_URL,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        auto_decompress=False)
+    assert response.status == 304
+
+    raw = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+    raw["features"][0]["properties"]["NM_VALOR"] = 5
+    mock_requests_post.return_value.content = orjson.dumps(raw)
+    await coordinator.async_refresh()
+    response = await client.get(
+        GEOJSON_URL,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        auto_decompress=False)
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+
+
+async def test_stations_geojson_requires_auth(
+        hass: HomeAssistant, hass_client_no_auth, mock_requests_post) -> None:
+    """Test the view is not served without authentication."""
+    await _setup_entry(hass)
+    client = await hass_client_no_auth()
+
+    response = await client.get(GEOJSON_URL)
+
+    assert response.status == 401
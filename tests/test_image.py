@@ -0,0 +1,83 @@
+"""Tests for the Polen Madrid heat map images."""
+
+import time
+
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.const import (
+    CONF_HEAT_MAPS,
+    CONF_STATIONS,
+    DOMAIN,
+)
+from custom_components.polen_madrid.heatmap import (
+    HeatMapGrid,
+    region_polygon,
+    render_heat_map,
+)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Generous for CI; a render takes a few tens of ms on a desktop
+RENDER_BUDGET = 1.0
+
+
+def test_render_heat_map() -> None:
+    """Test a network-wide heat map renders as a PNG of the region."""
+    grid = HeatMapGrid(region_polygon())
+    samples = tuple(
+        (400000 + station * 2000, 4450000 + station * 2500, station % 7)
+        for station in range(30))
+
+    png = render_heat_map(grid, samples, 2, 5)
+
+    assert png.startswith(PNG_SIGNATURE)
+    assert grid.mask.any() and not grid.mask.all()
+
+
+@pytest.mark.benchmark
+def test_render_heat_map_budget() -> None:
+    """Test a network-wide heat map renders within budget."""
+    start = time.perf_counter()
+    grid = HeatMapGrid(region_polygon())
+    grid_time = time.perf_counter() - start
+    samples = tuple(
+        (400000 + station * 2000, 4450000 + station * 2500, station % 7)
+        for station in range(30))
+
+    start = time.perf_counter()
+    render_heat_map(grid, samples, 2, 5)
+    render_time = time.perf_counter() - start
+
+    assert render_time < RENDER_BUDGET, (
+        f"Grid {grid_time * 1000:.1f} ms, render {render_time * 1000:.1f} ms")
+
+
+async def test_heat_map_image_cached(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the image is only re-rendered when its readings change."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        options={CONF_STATIONS: ["28079016"], CONF_HEAT_MAPS: ["PLT"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("image.polen_platanus_mapa")
+    assert state is not None
+    image = next(
+        entity for entity in hass.data["image"].entities
+        if entity.unique_id == f"{DOMAIN}_heat_map_PLT")
+    first = await image.async_image()
+    assert first.startswith(PNG_SIGNATURE)
+
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    assert await image.async_image() is first
+    assert hass.states.get("image.polen_platanus_mapa").state == state.state
+    assert await hass.config_entries.async_unload(entry.entry_id)
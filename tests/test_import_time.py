@@ -0,0 +1,88 @@
+"""Import-time checks for the Polen Madrid integration.
+
+Home Assistant imports every configured integration during startup, so the
+integration package and its config flow must stay cheap to import. These
+tests run the import in a fresh interpreter with `-X importtime`.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PACKAGE = "custom_components.polen_madrid"
+ROOT = Path(__file__).parent.parent
+
+# Modules Home Assistant has already loaded before importing an integration
+PRELOAD = (
+    "import homeassistant.config_entries, homeassistant.helpers.storage, "
+    "homeassistant.helpers.update_coordinator, "
+    "homeassistant.helpers.config_validation"
+)
+
+# Self import time of the integration's own modules, in microseconds
+IMPORT_TIME_BUDGET_US = 100_000
+
+# Modules imported by async_setup or async_setup_entry, not by the package
+DEFERRED_MODULES = (
+    "capture",
+    "changes",
+    "coordinator",
+    "export",
+    "http_api",
+    "long_term_statistics",
+    "memory",
+    "seasons",
+    "services",
+    "websocket_api",
+    "sensor",
+    "calendar",
+)
+
+
+def _import_integration() -> subprocess.CompletedProcess:
+    code = "\n".join((
+        PRELOAD,
+        "import sys",
+        # Make any module-level import of requests fail
+        "sys.modules['requests'] = None",
+        f"import {PACKAGE}",
+        f"import {PACKAGE}.config_flow",
+        f"print('\\n'.join(m for m in sys.modules if m.startswith('{PACKAGE}')))",
+    ))
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def _package_self_time_us(importtime_output: str) -> int:
+    """Sum the self import time of the integration's modules."""
+    total = 0
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if name.strip().startswith(PACKAGE) and self_us.strip().isdigit():
+            total += int(self_us)
+    return total
+
+
+def test_import_does_not_load_platforms_or_requests() -> None:
+    """Test that importing the integration defers heavy modules."""
+    result = _import_integration()
+    loaded = set(result.stdout.split())
+
+    assert PACKAGE in loaded
+    assert loaded.isdisjoint(
+        f"{PACKAGE}.{module}" for module in DEFERRED_MODULES)
+
+
+@pytest.mark.benchmark
+def test_import_time_budget() -> None:
+    """Test the integration's own import time stays within budget."""
+    result = _import_integration()
+    self_time_us = _package_self_time_us(result.stderr)
+
+    assert 0 < self_time_us < IMPORT_TIME_BUDGET_US, (
+        f"{PACKAGE} import time: {self_time_us / 1000:.1f} ms")
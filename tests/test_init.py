@@ -107,7 +107,7 @@ async def test_setup_entry_fails_api_error(hass: HomeAssistant) -> None:
 
     # Patch the coordinator's update method directly to raise UpdateFailed
     with patch(
-        "custom_components.polen_madrid.sensor.PolenMadridDataUpdateCoordinator._async_update_data",
+        "custom_components.polen_madrid.coordinator.PolenMadridDataUpdateCoordinator._async_update_data",
         side_effect=UpdateFailed("Simulated API Error"),
     ):
         # Run setup. We expect ConfigEntryNotReady to be raised internally by
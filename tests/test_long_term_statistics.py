@@ -0,0 +1,67 @@
+"""Tests for the Polen Madrid long-term statistics import."""
+
+import pytest
+from homeassistant.components.recorder import Recorder
+from homeassistant.components.recorder.statistics import (
+    list_statistic_ids,
+    statistics_during_period,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.components.recorder.common import (
+    async_wait_recording_done,
+)
+
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+from custom_components.polen_madrid.long_term_statistics import statistic_id_for
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(recorder_db_url, enable_custom_integrations):
+    """Set up the recorder database before hass is created."""
+    yield
+
+
+async def test_readings_imported_once_per_day(
+        recorder_mock: Recorder, hass: HomeAssistant, mock_requests_post) -> None:
+    """Test one statistics point per reading and day, across re-polls."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    # A re-poll of the same measurement day must not add points
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    await coordinator.async_refresh()
+    await async_wait_recording_done(hass)
+
+    statistic_id = statistic_id_for("28079016", "PLT")
+    assert statistic_id == "polen_madrid:28079016_plt"
+
+    statistic_ids = await recorder_mock.async_add_executor_job(
+        list_statistic_ids, hass)
+    external_ids = {
+        s["statistic_id"] for s in statistic_ids
+        if s["source"] == DOMAIN}
+    assert external_ids == {statistic_id, statistic_id_for("28079016", "CUP")}
+    # Next to the statistics compiled from the sensors' states
+    assert "sensor.polen_madrid_retiro_platanus" in {
+        s["statistic_id"] for s in statistic_ids}
+
+    stats = await recorder_mock.async_add_executor_job(
+        statistics_during_period,
+        hass,
+        dt_util.utc_from_timestamp(0),
+        None,
+        {statistic_id},
+        "day",
+        None,
+        {"mean"},
+    )
+    assert len(stats[statistic_id]) == 1
+    assert stats[statistic_id][0]["mean"] == 1
@@ -0,0 +1,109 @@
+"""Tests for the Polen Madrid memory accounting."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.polen_madrid.coordinator import (
+    PolenMadridDataUpdateCoordinator,
+)
+from custom_components.polen_madrid.memory import (
+    MemoryStats,
+    estimate_records_size,
+    track_peak,
+)
+from custom_components.polen_madrid.ratelimit import (
+    DATA_REQUEST_LIMITER,
+    RequestLimiter,
+)
+
+from conftest import paging_server
+
+# Today's network: ~30 stations x ~25 pollen types
+STATIONS = 30
+POLLENS = 25
+# Peak allocation allowed per byte of raw payload, while it is processed
+PEAK_BUDGET_RATIO = 8
+
+
+async def _async_refresh(
+        hass: HomeAssistant, mock_requests_post, features: list):
+    """Refresh a coordinator from a paged layer of `features`."""
+    # Large layers take more pages than the request budget's burst
+    hass.data[DATA_REQUEST_LIMITER] = RequestLimiter(burst=1_000)
+    mock_requests_post.side_effect = paging_server(features)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+    await coordinator.async_refresh()
+    assert coordinator.last_update_success
+    return coordinator.data
+
+
+async def test_cheap_estimates_without_tracking(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test only the cheap estimates are kept outside debug mode."""
+    features = make_raw_api_response(stations=3, pollens=4)["features"]
+
+    data = await _async_refresh(hass, mock_requests_post, features)
+
+    assert data.memory.payload_bytes > 0
+    assert data.memory.records == 12
+    assert data.memory.estimated_data_bytes > 0
+    assert data.memory.peak_bytes is None
+
+
+def test_estimate_records_size() -> None:
+    """Test the sampled estimate scales with the number of records."""
+    records = [{"station_id": str(index), "pollen_value": index} for index in range(100)]
+
+    assert estimate_records_size([]) == 0
+    assert estimate_records_size(records) > 10 * estimate_records_size(records[:10])
+
+
+def test_track_peak() -> None:
+    """Test the peak of the block is measured relative to its start."""
+    stats = MemoryStats()
+
+    with track_peak(stats, True):
+        buffer = bytearray(1_000_000)
+        del buffer
+
+    assert 1_000_000 <= stats.peak_bytes < 1_100_000
+
+
+def test_track_peak_concurrent_jobs() -> None:
+    """Test concurrent blocks do not reset each other's measurement."""
+
+    def _job(size: int) -> MemoryStats:
+        stats = MemoryStats()
+        with track_peak(stats, True):
+            buffer = bytearray(size)
+            # Let the other jobs start while this one measures
+            time.sleep(0.01)
+            del buffer
+        return stats
+
+    sizes = [1_000_000 * (index + 1) for index in range(8)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(_job, sizes))
+
+    for size, stats in zip(sizes, results):
+        assert size <= stats.peak_bytes < size + 100_000
+
+
+@pytest.mark.parametrize("scale", [10, 100])
+async def test_peak_memory_per_refresh(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response,
+        caplog: pytest.LogCaptureFixture, scale: int) -> None:
+    """Test the peak memory of a refresh stays within budget as data grows."""
+    caplog.set_level(logging.DEBUG, logger="custom_components.polen_madrid")
+    features = make_raw_api_response(
+        stations=STATIONS * scale, pollens=POLLENS)["features"]
+
+    data = await _async_refresh(hass, mock_requests_post, features)
+
+    assert data.memory.records == STATIONS * scale * POLLENS
+    assert 0 < data.memory.peak_bytes < (
+        PEAK_BUDGET_RATIO * data.memory.payload_bytes)
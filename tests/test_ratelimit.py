@@ -0,0 +1,91 @@
+"""Tests for the Polen Madrid request budget."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.polen_madrid import ratelimit
+from custom_components.polen_madrid.api import (
+    PolenMadridApiClient,
+    PolenMadridApiError,
+)
+from custom_components.polen_madrid.ratelimit import (
+    DATA_REQUEST_LIMITER,
+    RequestLimiter,
+    async_get_request_limiter,
+)
+
+
+async def test_limiter_shared_by_clients(hass: HomeAssistant) -> None:
+    """Test every client of the integration uses the same limiter."""
+    limiter = async_get_request_limiter(hass)
+
+    assert async_get_request_limiter(hass) is limiter
+    assert PolenMadridApiClient(hass)._limiter is limiter
+
+
+async def test_over_budget_serves_cache_or_rejects(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test callers over budget get the last payload or an error."""
+    limiter = hass.data[DATA_REQUEST_LIMITER] = RequestLimiter(
+        burst=2, refill_seconds=3600)
+    client = PolenMadridApiClient(hass)
+
+    await client.async_get_payload()
+    await client.async_get_payload()
+    # Budget exhausted: the last payload is served without a request
+    for _ in range(5):
+        assert await client.async_get_payload() is not None
+    assert mock_requests_post.call_count == 2
+    assert limiter.stats.served_from_cache == 5
+
+    # A client without a cached payload cannot wait an hour for a token
+    with pytest.raises(PolenMadridApiError):
+        await PolenMadridApiClient(hass).async_get_payload()
+    assert limiter.stats.queued == 1
+    assert limiter.stats.rejected == 1
+    assert mock_requests_post.call_count == 2
+
+
+async def test_queued_caller_waits_for_refill(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test a caller without cache waits for the next token."""
+    limiter = hass.data[DATA_REQUEST_LIMITER] = RequestLimiter(
+        burst=1, refill_seconds=0.05)
+    await PolenMadridApiClient(hass).async_get_payload()
+
+    await PolenMadridApiClient(hass).async_get_payload()
+
+    assert mock_requests_post.call_count == 2
+    assert limiter.stats.queued == 1
+    assert limiter.stats.rejected == 0
+
+
+async def test_queued_callers_wait_for_their_tokens(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test callers without cache queue for the refill, in order."""
+    limiter = hass.data[DATA_REQUEST_LIMITER] = RequestLimiter(burst=1)
+    await PolenMadridApiClient(hass).async_get_payload()
+    waits = []
+    sleep = asyncio.sleep
+
+    async def _sleep(seconds: float) -> None:
+        waits.append(round(seconds))
+        await sleep(0)
+
+    with patch.object(ratelimit.asyncio, "sleep", _sleep):
+        # The first in line waits a refill period for its token; the next
+        # one would wait two, beyond the queue timeout
+        results = await asyncio.gather(
+            PolenMadridApiClient(hass).async_get_payload(),
+            PolenMadridApiClient(hass).async_get_payload(),
+            return_exceptions=True)
+
+    assert results[0] is not None
+    assert not isinstance(results[0], Exception)
+    assert isinstance(results[1], PolenMadridApiError)
+    assert waits == [60]
+    assert mock_requests_post.call_count == 2
+    assert (limiter.stats.queued, limiter.stats.rejected) == (2, 1)
@@ -1,11 +1,14 @@
 """Tests for the Polen Madrid sensor platform."""
 
+from datetime import datetime, timezone
 from unittest.mock import AsyncMock, patch, MagicMock
 
 import pytest
 import requests  # Import requests for patching
 from homeassistant.config_entries import ConfigEntryState  # Needed for checking state
+from homeassistant.const import STATE_UNAVAILABLE, EntityCategory
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr, entity_registry as er
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 # Remove async_setup_component if only testing entry setup
 # from homeassistant.setup import async_setup_component
@@ -14,9 +17,22 @@ from pytest_homeassistant_custom_component.common import (
     load_fixture,
 )
 
-from custom_components.polen_madrid.const import DOMAIN, CONF_STATIONS, API_URL
-from custom_components.polen_madrid.sensor import (
+from custom_components.polen_madrid.const import (
+    API_PAGE_RETRIES,
+    API_URL,
+    CONF_COMPACT,
+    CONF_STALE_AFTER,
+    CONF_STALE_POLICY,
+    CONF_STATIONS,
+    DOMAIN,
+    STALE_POLICY_UNAVAILABLE,
+)
+from custom_components.polen_madrid.coordinator import (
+    PolenMadridData,
     PolenMadridDataUpdateCoordinator,
+)
+from custom_components.polen_madrid.helpers import parse_measurement_datetime
+from custom_components.polen_madrid.sensor import (
     PolenMadridSensor,
     async_setup_entry,  # Keep this if directly testing platform setup
     get_pollen_level_details,
@@ -209,7 +225,8 @@ async def test_sensor_update_failed(hass: HomeAssistant, mock_requests_post) ->
 
     # Check coordinator state reflects the update failure
     assert coordinator.last_update_success is False
-    mock_requests_post.assert_called_once()  # From the manual refresh
+    # The manual refresh, retried
+    assert mock_requests_post.call_count == API_PAGE_RETRIES + 1
 
     # Sensor state should become unavailable after failed update
     sensor_id = "sensor.polen_madrid_retiro_platanus"
@@ -231,3 +248,243 @@ async def test_sensor_update_failed(hass: HomeAssistant, mock_requests_post) ->
 async def test_sensor_attributes_content(hass: HomeAssistant) -> None:
     """Test detailed attributes of the sensor."""
     # ... existing code ...
+
+
+def test_data_indexes() -> None:
+    """Test the secondary indexes built over the readings."""
+    data = PolenMadridData({
+        ("28079016", "PLT"): {
+            'station_id': "28079016", 'pollen_code': "PLT",
+            'pollen_value': 1, 'medium_threshold': 2, 'high_threshold': 3},
+        ("28079016", "CUP"): {
+            'station_id': "28079016", 'pollen_code': "CUP",
+            'pollen_value': 0, 'medium_threshold': 2, 'high_threshold': 3},
+    })
+
+    assert set(data.by_station) == {"28079016"}
+    assert len(data.by_station["28079016"]) == 2
+    assert [r["pollen_code"] for r in data.by_pollen["PLT"]] == ["PLT"]
+    assert len(data.by_level["Bajo"]) == 2
+    # Indexes share the record objects of the primary map
+    assert data.by_pollen["PLT"][0] is data[("28079016", "PLT")]
+
+    assert data.select(stations=["28079016"], pollen_codes=["CUP"]) == [
+        data[("28079016", "CUP")]]
+    assert data.select(levels=["Medio", "Alto"]) == []
+    assert data.select(stations=["unknown"]) == []
+    assert len(data.select()) == 2
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("2024-01-01T10:00:00Z", datetime(2024, 1, 1, 10, tzinfo=timezone.utc)),
+        # Dates without an offset are local to Madrid
+        ("2024-07-01T10:00:00", datetime(2024, 7, 1, 8, tzinfo=timezone.utc)),
+        (1704103200000, datetime(2024, 1, 1, 10, tzinfo=timezone.utc)),
+        ("not a date", None),
+        (None, None),
+    ],
+)
+def test_parse_measurement_datetime(value, expected) -> None:
+    """Test measurement dates are parsed into aware datetimes."""
+    assert parse_measurement_datetime(value) == expected
+
+
+def test_newest_measurement_index() -> None:
+    """Test the newest measurement is indexed per station."""
+    older = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    newer = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    data = PolenMadridData({
+        ("1", "PLT"): {'station_id': "1", 'pollen_code': "PLT", 'measured_at': newer},
+        ("1", "CUP"): {'station_id': "1", 'pollen_code': "CUP", 'measured_at': older},
+        ("2", "PLT"): {'station_id': "2", 'pollen_code': "PLT", 'measured_at': older},
+        ("3", "PLT"): {'station_id': "3", 'pollen_code': "PLT", 'measured_at': None},
+    })
+
+    assert data.newest_by_station == {"1": newer, "2": older}
+    assert data.newest_measurement == newer
+
+
+async def test_coordinator_data_is_indexed(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the coordinator publishes indexed data."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    assert isinstance(coordinator.data, PolenMadridData)
+    assert set(coordinator.data.by_pollen) == {"PLT", "CUP"}
+
+
+async def test_station_metadata_entities(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test static station metadata lives on the device and diagnostic sensors."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    device = dr.async_get(hass).async_get_device({(DOMAIN, "28079016")})
+    assert device.serial_number == "STN-R"
+
+    station = hass.states.get("sensor.polen_madrid_retiro_estacion")
+    assert station.state == "STN-R"
+    assert station.attributes["pollen_codes"] == ["CUP", "PLT"]
+    entity = er.async_get(hass).async_get("sensor.polen_madrid_retiro_estacion")
+    assert entity.entity_category == EntityCategory.DIAGNOSTIC
+
+    thresholds = hass.states.get("sensor.polen_madrid_retiro_umbrales")
+    assert thresholds.attributes["PLT"] == {"medium": 2, "high": 3}
+
+    # Static attributes of the pollen sensors are excluded from the recorder
+    assert {"coordinates_utm", "altitude", "station_code", "high_threshold"} <= (
+        PolenMadridSensor._unrecorded_attributes)
+    assert "pollen_level" not in PolenMadridSensor._unrecorded_attributes
+    # The state class keeps the statistics recorded so far
+    plt = hass.states.get("sensor.polen_madrid_retiro_platanus")
+    assert plt.attributes["state_class"] == "measurement"
+    assert "pollen_value" in PolenMadridSensor._unrecorded_attributes
+
+
+async def test_compact_mode_and_migration(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test compact mode replaces the per-pollen sensors of a station."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    registry = er.async_get(hass)
+    assert registry.async_get("sensor.polen_madrid_retiro_platanus")
+    # Customisations survive the switches
+    registry.async_update_entity(
+        "sensor.polen_madrid_retiro_platanus", name="Plátano")
+    registry.async_update_entity(
+        "sensor.polen_madrid_retiro_estacion",
+        disabled_by=er.RegistryEntryDisabler.USER)
+
+    hass.config_entries.async_update_entry(
+        entry, options={CONF_STATIONS: ["28079016"], CONF_COMPACT: True})
+    await hass.async_block_till_done()
+
+    sensors = er.async_entries_for_config_entry(registry, entry.entry_id)
+    assert sorted(
+        entity.unique_id for entity in sensors
+        if entity.domain == "sensor" and not entity.disabled
+    ) == [
+        f"{DOMAIN}_28079016_last_measurement",
+        f"{DOMAIN}_28079016_summary",
+        f"{DOMAIN}_table",
+    ]
+    assert hass.states.get("sensor.polen_madrid_retiro_platanus") is None
+    assert registry.async_get(
+        "sensor.polen_madrid_retiro_platanus").disabled_by is (
+            er.RegistryEntryDisabler.INTEGRATION)
+
+    summary = hass.states.get("sensor.polen_madrid_retiro")
+    # PLT is 1 and CUP is 0, both below their medium threshold of 2
+    assert summary.state == "Bajo"
+    assert summary.attributes["readings"]["PLT"]["pollen_value"] == 1
+    assert summary.attributes["readings"]["CUP"]["pollen_level"] == "Bajo"
+
+    # Switching back restores the per-pollen sensors
+    hass.config_entries.async_update_entry(
+        entry, options={CONF_STATIONS: ["28079016"], CONF_COMPACT: False})
+    await hass.async_block_till_done()
+
+    assert registry.async_get("sensor.polen_madrid_retiro").disabled
+    platanus = hass.states.get("sensor.polen_madrid_retiro_platanus")
+    assert platanus.state == "1"
+    assert platanus.name == "Plátano"
+    assert registry.async_get("sensor.polen_madrid_retiro_estacion").disabled_by is (
+        er.RegistryEntryDisabler.USER)
+
+
+async def test_last_measurement_and_staleness(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the last measurement sensor and both staleness policies."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        options={CONF_STATIONS: ["28079016"], CONF_STALE_AFTER: 3},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    last = hass.states.get("sensor.polen_madrid_retiro_ultima_medicion")
+    assert last.state == "2024-01-01T10:00:00+00:00"
+    assert last.attributes["stale"] is True
+    assert hass.data[DOMAIN][entry.entry_id].data[("28079016", "PLT")][
+        "measured_at"] == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+
+    # The mocked readings are years old: flagged by default...
+    platanus = hass.states.get("sensor.polen_madrid_retiro_platanus")
+    assert platanus.state == "1"
+    assert platanus.attributes["stale"] is True
+
+    # ...or unavailable, while the last measurement stays available
+    hass.config_entries.async_update_entry(entry, options={
+        CONF_STATIONS: ["28079016"],
+        CONF_STALE_AFTER: 3,
+        CONF_STALE_POLICY: STALE_POLICY_UNAVAILABLE,
+    })
+    await hass.async_block_till_done()
+    assert hass.states.get("sensor.polen_madrid_retiro_platanus").state == (
+        STATE_UNAVAILABLE)
+    assert hass.states.get(
+        "sensor.polen_madrid_retiro_ultima_medicion").state != STATE_UNAVAILABLE
+
+    # Zero days disables the policy
+    hass.config_entries.async_update_entry(entry, options={
+        CONF_STATIONS: ["28079016"],
+        CONF_STALE_AFTER: 0,
+        CONF_STALE_POLICY: STALE_POLICY_UNAVAILABLE,
+    })
+    await hass.async_block_till_done()
+    platanus = hass.states.get("sensor.polen_madrid_retiro_platanus")
+    assert platanus.state == "1"
+    assert platanus.attributes["stale"] is False
+
+
+async def test_table_sensor(hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the level table is rendered once per content change."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Retiro",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("sensor.polen_madrid_tabla")
+    assert '<td class="level-bajo" title="Bajo (&lt; 2)">1</td>' in (
+        state.attributes["html"])
+    assert state.attributes["markdown"].splitlines()[2] == (
+        "| Madrid - Retiro | 0 Bajo | 1 Bajo |")
+
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    table = next(
+        entity for entity in hass.data["entity_components"]["sensor"].entities
+        if entity.unique_id == f"{DOMAIN}_table")
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    # Same readings: the cached rendering is kept
+    assert table._renderer.renders == 1
+    assert hass.states.get("sensor.polen_madrid_tabla").state == state.state
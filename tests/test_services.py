@@ -0,0 +1,262 @@
+"""Tests for the Polen Madrid services."""
+
+import asyncio
+import copy
+import csv
+import json
+from pathlib import Path
+
+import orjson
+import pytest
+import voluptuous as vol
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import issue_registry as ir
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid.capture import (
+    CAPTURE_DIRECTORY,
+    PayloadRecorder,
+)
+from custom_components.polen_madrid.const import (
+    CONF_STATIONS,
+    DOMAIN,
+    SERVICE_EXPORT,
+    SERVICE_GET_READINGS,
+    SERVICE_PROFILE_NEXT_UPDATE,
+)
+from custom_components.polen_madrid.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+
+from conftest import MOCK_RAW_API_RESPONSE
+
+
+async def _setup_entry(hass: HomeAssistant) -> MockConfigEntry:
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return entry
+
+
+async def _get_readings(hass: HomeAssistant, **service_data) -> dict:
+    return await hass.services.async_call(
+        DOMAIN,
+        SERVICE_GET_READINGS,
+        service_data,
+        blocking=True,
+        return_response=True,
+    )
+
+
+async def test_get_readings_all(hass: HomeAssistant, mock_requests_post) -> None:
+    """Test that all readings are returned from the coordinator data."""
+    await _setup_entry(hass)
+
+    response = await _get_readings(hass)
+
+    assert response["source"] == "coordinator"
+    assert {r["pollen_code"] for r in response["readings"]} == {"PLT", "CUP"}
+    # Served from memory, no additional API call
+    mock_requests_post.assert_called_once()
+
+
+async def test_get_readings_filters(hass: HomeAssistant, mock_requests_post) -> None:
+    """Test pollen code and minimum level filters."""
+    await _setup_entry(hass)
+
+    response = await _get_readings(hass, pollen_codes=["PLT"])
+    assert [r["pollen_code"] for r in response["readings"]] == ["PLT"]
+    assert response["readings"][0]["pollen_level"] == "Bajo"
+
+    response = await _get_readings(hass, min_level="Medio")
+    assert response["readings"] == []
+
+
+async def test_get_readings_nearest(hass: HomeAssistant, mock_requests_post) -> None:
+    """Test selecting the nearest station from WGS84 coordinates."""
+    await _setup_entry(hass)
+
+    # Close to Parque del Retiro
+    response = await _get_readings(
+        hass, latitude=40.4153, longitude=-3.6845, nearest=1)
+
+    assert len(response["readings"]) == 2
+    assert all(r["station_id"] == "28079016" for r in response["readings"])
+    assert response["readings"][0]["distance_km"] < 2
+
+
+async def test_get_readings_unknown_station_fallback(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the rate-limited fallback fetch for unknown stations."""
+    await _setup_entry(hass)
+    mock_requests_post.reset_mock()
+
+    response = await _get_readings(hass, stations=["99999999"])
+    assert response["source"] == "fetch"
+    assert response["readings"] == []
+    mock_requests_post.assert_called_once()
+
+    # A second call within the fallback interval is served from cache
+    await _get_readings(hass, stations=["99999999"])
+    mock_requests_post.assert_called_once()
+
+
+async def test_get_readings_fallback_leaves_coordinator_state(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the fallback fetch changes no caches, diagnostics or issues."""
+    entry = await _setup_entry(hass)
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    data, pages = coordinator.data, dict(coordinator._pages)
+    coordinator.provider_errors = {"other": "down"}
+
+    # The upstream schema changed since the last update
+    raw = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+    for feature in raw["features"]:
+        del feature["properties"]["FC_FECHA_MEDICION"]
+    mock_requests_post.return_value.content = orjson.dumps(raw)
+    response = await _get_readings(hass, stations=["99999999"])
+
+    assert response["source"] == "fetch"
+    assert coordinator.data is data
+    assert coordinator._pages == pages
+    assert coordinator.provider_errors == {"other": "down"}
+    assert not ir.async_get(hass).async_get_issue(DOMAIN, "schema_drift")
+
+    # The next update reports it
+    await coordinator.async_refresh()
+    assert ir.async_get(hass).async_get_issue(DOMAIN, "schema_drift")
+
+
+async def test_get_readings_not_loaded(hass: HomeAssistant) -> None:
+    """Test the service raises when no entry is loaded."""
+    assert await async_setup_component(hass, DOMAIN, {})
+
+    with pytest.raises(ServiceValidationError):
+        await _get_readings(hass)
+
+
+async def test_export_csv_with_columns_and_filters(
+        hass: HomeAssistant, mock_requests_post, tmp_path) -> None:
+    """Test the export streams the selected columns and readings to CSV."""
+    hass.config.config_dir = str(tmp_path)
+    await _setup_entry(hass)
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_EXPORT,
+        {
+            "columns": ["station_id", "pollen_code", "pollen_value"],
+            "stations": ["28079016"],
+            "start_date": "2024-01-01",
+            "filename": "pollen.csv",
+        },
+        blocking=True,
+        return_response=True,
+    )
+
+    path = Path(response["path"])
+    assert path == tmp_path / "polen_madrid_exports" / "pollen.csv"
+    assert response["rows"] == 2
+    with path.open(encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["station_id", "pollen_code", "pollen_value"]
+    assert sorted(rows[1:]) == [["28079016", "CUP", "0"], ["28079016", "PLT", "1"]]
+
+
+async def test_export_includes_captured_history(
+        hass: HomeAssistant, mock_requests_post, tmp_path) -> None:
+    """Test readings of older captures are exported once each."""
+    hass.config.config_dir = str(tmp_path)
+    recorder = PayloadRecorder(tmp_path / CAPTURE_DIRECTORY)
+    older = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+    for feature in older["features"]:
+        feature["properties"]["FC_FECHA_MEDICION"] = "2023-12-31T10:00:00Z"
+    recorder.record("pollen", orjson.dumps(older))
+    # A repeated capture of the current day
+    recorder.record("pollen", orjson.dumps(MOCK_RAW_API_RESPONSE))
+    await _setup_entry(hass)
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_EXPORT,
+        {"format": "ndjson", "end_date": "2023-12-31"},
+        blocking=True,
+        return_response=True,
+    )
+    assert response["rows"] == 2
+
+    response = await hass.services.async_call(
+        DOMAIN, SERVICE_EXPORT, {"format": "ndjson"},
+        blocking=True, return_response=True)
+    lines = Path(response["path"]).read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 4
+    assert json.loads(lines[0])["measurement_date"] == "2023-12-31T10:00:00Z"
+
+
+async def test_export_rejects_paths(
+        hass: HomeAssistant, mock_requests_post) -> None:
+    """Test the file name cannot leave the export directory."""
+    await _setup_entry(hass)
+
+    with pytest.raises(vol.Invalid):
+        await hass.services.async_call(
+            DOMAIN, SERVICE_EXPORT, {"filename": "../secrets.yaml"},
+            blocking=True, return_response=True)
+
+
+async def test_profile_next_update(
+        hass: HomeAssistant, mock_requests_post, tmp_path) -> None:
+    """Test only the next update is profiled, including the executor jobs."""
+    hass.config.config_dir = str(tmp_path)
+    entry = await _setup_entry(hass)
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+
+    summary = await hass.services.async_call(
+        DOMAIN, SERVICE_PROFILE_NEXT_UPDATE, {"top": 200, "refresh": True},
+        blocking=True, return_response=True)
+
+    # Profiling does not get in the way of the update
+    assert coordinator.last_update_success
+    assert Path(summary["stats_file"]).is_file()
+    assert Path(summary["summary_file"]).parent == tmp_path / "polen_madrid_profiles"
+    # The fetch, parsing and merge of the page ran in profiled executor jobs
+    assert summary["executor_jobs"] == 3
+    functions = [entry["function"] for entry in summary["top"]]
+    assert len(functions) == 200
+    assert any("(parse_api_response)" in function for function in functions)
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["profile"] == summary
+
+    # Disarmed after one update
+    await coordinator.async_refresh()
+    assert coordinator.profile_summary is summary
+    assert coordinator.profiler is None and coordinator.client.profiler is None
+
+
+async def test_profile_next_update_joins_refresh_in_flight(
+        hass: HomeAssistant, mock_requests_post, tmp_path) -> None:
+    """Test a refresh in flight is not profiled, the full one after it is."""
+    hass.config.config_dir = str(tmp_path)
+    entry = await _setup_entry(hass)
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    calls = mock_requests_post.call_count
+
+    # As a scheduled refresh would be
+    in_flight = hass.async_create_task(coordinator.async_refresh())
+    await asyncio.sleep(0)
+    summary = await hass.services.async_call(
+        DOMAIN, SERVICE_PROFILE_NEXT_UPDATE, {"top": 20, "refresh": True},
+        blocking=True, return_response=True)
+    await in_flight
+
+    # One fetch for the refresh in flight, then the profiled one
+    assert mock_requests_post.call_count == calls + 2
+    assert summary["executor_jobs"] == 3
+    assert coordinator.profile_summary is summary
@@ -0,0 +1,66 @@
+"""Tests for the Polen Madrid feature validation."""
+
+import copy
+
+import orjson
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import issue_registry as ir
+
+from custom_components.polen_madrid.const import DOMAIN
+from custom_components.polen_madrid.coordinator import (
+    PolenMadridDataUpdateCoordinator,
+    build_data_from_payload,
+)
+from custom_components.polen_madrid.validation import validate_features
+
+
+def test_malformed_features_are_quarantined(make_raw_api_response) -> None:
+    """Test only the malformed features are dropped, counted per reason."""
+    raw = make_raw_api_response(stations=2, pollens=3)
+    features = raw["features"]
+    features[0]["properties"]["NM_VALOR"] = "n/a"
+    features[1]["properties"]["NM_ID_CAPTADORES"] = None
+    features[2]["properties"]["NM_VALOR"] = -5
+    features.append("not a feature")
+
+    valid, report = validate_features(raw)
+
+    assert len(valid) == 3
+    assert report.accepted == 3
+    assert report.rejected == {
+        "type:pollen_value": 1,
+        "missing:station_id": 1,
+        "range:pollen_value": 1,
+        "not_a_feature": 1,
+    }
+    assert len(report.quarantine) == 4
+    assert not report.schema_drift
+
+    data = build_data_from_payload(orjson.dumps(raw))
+    assert len(data) == 3
+    assert data.validation.rejected["type:pollen_value"] == 1
+
+
+async def test_schema_drift_creates_repairs_issue(
+        hass: HomeAssistant, mock_requests_post, make_raw_api_response) -> None:
+    """Test a renamed upstream property is reported as a repairs issue."""
+    raw = make_raw_api_response(stations=1, pollens=2)
+    drifted = copy.deepcopy(raw)
+    for feature in drifted["features"]:
+        feature["properties"]["NM_VALOR_POLEN"] = (
+            feature["properties"].pop("NM_VALOR"))
+    mock_requests_post.return_value.content = orjson.dumps(drifted)
+    coordinator = PolenMadridDataUpdateCoordinator(hass)
+
+    await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert coordinator.data.validation.missing_properties == ["NM_VALOR"]
+    issue = ir.async_get(hass).async_get_issue(DOMAIN, "schema_drift")
+    assert issue is not None
+    assert issue.translation_placeholders["unknown"] == "NM_VALOR_POLEN"
+
+    mock_requests_post.return_value.content = orjson.dumps(raw)
+    await coordinator.async_refresh()
+
+    assert ir.async_get(hass).async_get_issue(DOMAIN, "schema_drift") is None
@@ -0,0 +1,114 @@
+"""Tests for the Polen Madrid websocket API."""
+
+import copy
+from unittest.mock import patch
+
+import orjson
+from homeassistant.core import HomeAssistant
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.polen_madrid import websocket_api
+from custom_components.polen_madrid.const import CONF_STATIONS, DOMAIN
+
+from conftest import MOCK_RAW_API_RESPONSE
+
+
+async def test_subscribe_snapshot_and_shared_deltas(
+        hass: HomeAssistant, hass_ws_client, mock_requests_post) -> None:
+    """Test subscribers get a snapshot, then only the changed readings."""
+    assert await async_setup_component(hass, "websocket_api", {})
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+
+    clients = [await hass_ws_client(hass), await hass_ws_client(hass)]
+    for client in clients:
+        await client.send_json_auto_id({"type": "polen_madrid/subscribe"})
+        assert (await client.receive_json())["success"]
+        snapshot = (await client.receive_json())["event"]
+        assert snapshot["type"] == "snapshot"
+        assert len(snapshot["readings"]) == 2
+
+    raw = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+    raw["features"][0]["properties"]["NM_VALOR"] = 5
+    mock_requests_post.return_value.content = orjson.dumps(raw)
+    with patch.object(
+            websocket_api, "serialize_reading",
+            wraps=websocket_api.serialize_reading) as serialize:
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+    # Only the changed reading is serialized, once for both subscribers
+    assert serialize.call_count == 1
+
+    for client in clients:
+        message = await client.receive_json()
+        assert message["event"] == {
+            "type": "delta",
+            "changed": [message["event"]["changed"][0]],
+            "removed": [],
+        }
+        reading = message["event"]["changed"][0]
+        assert (reading["pollen_code"], reading["pollen_value"]) == ("PLT", 5)
+        assert reading["pollen_level"] == "Alto"
+    assert len(coordinator.delta_publisher._subscribers) == 2
+
+
+async def test_subscribe_without_entry(
+        hass: HomeAssistant, hass_ws_client) -> None:
+    """Test subscribing before the integration is set up fails cleanly."""
+    assert await async_setup_component(hass, "websocket_api", {})
+    assert await async_setup_component(hass, DOMAIN, {})
+    client = await hass_ws_client(hass)
+
+    await client.send_json_auto_id({"type": "polen_madrid/subscribe"})
+    message = await client.receive_json()
+
+    assert not message["success"]
+    assert message["error"]["code"] == "not_loaded"
+
+
+async def test_subscriptions_closed_on_reload(
+        hass: HomeAssistant, hass_ws_client, mock_requests_post) -> None:
+    """Test subscriptions end when the entry reloads and can be renewed."""
+    assert await async_setup_component(hass, "websocket_api", {})
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={CONF_STATIONS: ["28079016"]},
+        title="Polen Madrid Test",
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id({"type": "polen_madrid/subscribe"})
+    subscription = (await client.receive_json())["id"]
+    await client.receive_json()
+
+    assert await hass.config_entries.async_reload(entry.entry_id)
+    await hass.async_block_till_done()
+
+    message = await client.receive_json()
+    assert message["id"] == subscription
+    assert message["event"] == {"type": "closed"}
+
+    # A new subscription follows the new coordinator
+    await client.send_json_auto_id({"type": "polen_madrid/subscribe"})
+    assert (await client.receive_json())["success"]
+    await client.receive_json()
+    raw = copy.deepcopy(MOCK_RAW_API_RESPONSE)
+    del raw["features"][1]
+    mock_requests_post.return_value.content = orjson.dumps(raw)
+    await hass.data[DOMAIN][entry.entry_id].async_refresh()
+    await hass.async_block_till_done()
+
+    message = await client.receive_json()
+    assert message["id"] == subscription + 1
+    assert message["event"] == {
+        "type": "delta", "changed": [], "removed": [["28079016", "CUP"]]}